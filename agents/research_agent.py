@@ -1,5 +1,6 @@
 from crewai import Agent
 from textwrap import dedent
+from research_tools import create_research_tools
 
 def create_research_agent(llm):
     return Agent(
@@ -10,5 +11,7 @@ def create_research_agent(llm):
             Your expertise lies in gathering, analyzing, and summarizing complex information
             from various sources. You have a talent for identifying key trends and insights.
         """),
+        # Web search and page reading (RESEARCH_TOOLS=off researches from the model alone)
+        tools=create_research_tools(),
         llm=llm
     ) 
\ No newline at end of file
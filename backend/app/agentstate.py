@@ -0,0 +1,219 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .eventlog import DEFAULT_JOB
+
+# Agent states; "activity" keeps the task an active agent is on (Researching, Writing, ...)
+WAITING = "Waiting"
+ACTIVE = "Active"
+DONE = "Done"
+ERROR = "Error"
+CANCELLED = "Cancelled"
+
+# Job states
+RUNNING = "Running"
+
+# Allowed agent transitions. Done -> Active lets an agent pick up another task;
+# an errored or cancelled agent stays so until the job is restarted.
+TRANSITIONS = {
+    WAITING: {ACTIVE, DONE, ERROR, CANCELLED},
+    ACTIVE: {ACTIVE, DONE, ERROR, CANCELLED},
+    DONE: {ACTIVE},
+    ERROR: set(),
+    CANCELLED: set(),
+}
+
+
+# Terminal statuses as producers spell them, in any case
+_TERMINAL = {"completed": DONE, "done": DONE, "error": ERROR, "cancelled": CANCELLED}
+
+
+def raw_status(message: Dict[str, Any]) -> Optional[str]:
+    """Status carried by a raw event: the monitor's agent_state, else status/task."""
+    agent_state = message.get("agent_state") or {}
+    status = agent_state.get("status") or message.get("status") or message.get("task")
+    return _TERMINAL.get(status.lower(), status) if isinstance(status, str) else status
+
+
+class JobState:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.status = WAITING
+        self.output = ""
+        self.updated = None
+        self.agents: Dict[str, Dict[str, Any]] = {}
+        # Context budget per stage: budget and tokens before/after compression
+        self.context: Dict[str, Dict[str, int]] = {}
+
+    def agent(self, name: str) -> Dict[str, Any]:
+        return self.agents.setdefault(
+            name, {"status": WAITING, "activity": None, "output": "", "updated": None, "model": None}
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "output": self.output,
+            "updated": self.updated,
+            "agents": {name: dict(state) for name, state in self.agents.items()},
+            "context": {stage: dict(counts) for stage, counts in self.context.items()},
+        }
+
+
+class AgentStateStore:
+    """Authoritative per-job agent state, built from the raw event stream.
+
+    ``apply`` folds every event into the state machine and remembers what
+    changed; ``take_diff`` returns all changes since the previous call as one
+    message. Publishing diffs on a fixed tick bounds the traffic to state
+    clients no matter how many raw events the crew produces.
+    """
+
+    def __init__(self, max_jobs: int = 20):
+        self.max_jobs = max_jobs
+        self.offset = 0
+        self._jobs: "OrderedDict[str, JobState]" = OrderedDict()
+        self._dirty_jobs = set()
+        self._dirty_agents: Dict[str, set] = {}
+        self._dirty_context: Dict[str, set] = {}
+        self._deltas: Dict[str, Dict[str, list]] = {}
+
+    def _job(self, job_id: str) -> JobState:
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._jobs[job_id] = JobState(job_id)
+            while len(self._jobs) > self.max_jobs:
+                evicted, _ = self._jobs.popitem(last=False)
+                self._dirty_jobs.discard(evicted)
+                self._dirty_agents.pop(evicted, None)
+                self._dirty_context.pop(evicted, None)
+                self._deltas.pop(evicted, None)
+        return job
+
+    def _touch(self, job: JobState, agent: Optional[str] = None):
+        if agent is None:
+            self._dirty_jobs.add(job.job_id)
+        else:
+            self._dirty_agents.setdefault(job.job_id, set()).add(agent)
+
+    def apply(self, message: Dict[str, Any]) -> bool:
+        """Fold one raw event into the state. Returns True if anything changed."""
+        self.offset = max(self.offset, message.get("offset", 0))
+        if message.get("type") == "context":
+            return self._apply_context(message)
+        agent = message.get("agent")
+        if not agent or message.get("type") in ("ack", "batch", "replay"):
+            return False
+        job = self._job(message.get("job_id") or DEFAULT_JOB)
+        timestamp = message.get("timestamp") or datetime.now().isoformat()
+
+        if message.get("type") == "delta":
+            self._deltas.setdefault(job.job_id, {}).setdefault(agent, []).append(message.get("delta", ""))
+            return True
+
+        status = raw_status(message)
+        if agent == "System":
+            return self._apply_system(job, status, message.get("output", ""), timestamp)
+        if status is None or status == "Connection":
+            return False
+
+        state = job.agent(agent)
+        target = status if status in (DONE, ERROR, WAITING, CANCELLED) else ACTIVE
+        if target != state["status"] and target not in TRANSITIONS[state["status"]]:
+            return False
+        state["status"] = target
+        state["activity"] = status if target == ACTIVE else None
+        state["output"] = message.get("output", state["output"])
+        # Model serving (or, during a cascade, about to serve) the agent's task
+        state["model"] = message.get("model") or state["model"]
+        state["updated"] = timestamp
+        job.updated = timestamp
+        if job.status == WAITING:
+            job.status = RUNNING
+            self._touch(job)
+        self._touch(job, agent)
+        return True
+
+    def _apply_context(self, message: Dict[str, Any]) -> bool:
+        stage = message.get("stage")
+        if not stage:
+            return False
+        job = self._job(message.get("job_id") or DEFAULT_JOB)
+        job.context[stage] = {
+            "budget": message.get("budget"),
+            "tokens_before": message.get("tokens_before"),
+            "tokens_after": message.get("tokens_after"),
+        }
+        self._dirty_context.setdefault(job.job_id, set()).add(stage)
+        return True
+
+    def _apply_system(self, job: JobState, status: Optional[str], output: str, timestamp: str) -> bool:
+        if status == "Starting":
+            job.status = RUNNING
+            for name, state in job.agents.items():
+                state.update(status=WAITING, activity=None, output="", updated=timestamp, model=None)
+                self._touch(job, name)
+            self._jobs.move_to_end(job.job_id)
+        elif status == DONE:
+            job.status = DONE
+        elif status in (ERROR, CANCELLED):
+            job.status = status
+            for name, state in job.agents.items():
+                if state["status"] == ACTIVE:
+                    state.update(status=status, activity=None, updated=timestamp)
+                    self._touch(job, name)
+        else:
+            return False
+        job.output = output
+        job.updated = timestamp
+        self._touch(job)
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Full state of the retained jobs, most recently started last."""
+        return {
+            "type": "snapshot",
+            "offset": self.offset,
+            "timestamp": datetime.now().isoformat(),
+            "jobs": [job.to_dict() for job in self._jobs.values()],
+        }
+
+    def take_diff(self) -> Optional[Dict[str, Any]]:
+        """Changes since the last call as one message, or None if nothing changed.
+
+        Each changed agent is sent with its current state (intermediate states
+        within a tick are coalesced away). Text streamed since the last diff is
+        sent under ``delta``; job ``output`` is only included when the job
+        itself changed, and ``context`` only lists stages reported since.
+        """
+        job_ids = self._dirty_jobs | set(self._dirty_agents) | set(self._deltas) | set(self._dirty_context)
+        if not job_ids:
+            return None
+        jobs = {}
+        for job_id in job_ids:
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            entry: Dict[str, Any] = {"status": job.status}
+            if job_id in self._dirty_jobs:
+                entry.update(output=job.output, updated=job.updated)
+            agents = {name: dict(job.agent(name)) for name in self._dirty_agents.get(job_id, ())}
+            for name, chunks in self._deltas.get(job_id, {}).items():
+                agents.setdefault(name, {})["delta"] = "".join(chunks)
+            if agents:
+                entry["agents"] = agents
+            if job_id in self._dirty_context:
+                entry["context"] = {stage: dict(job.context[stage]) for stage in self._dirty_context[job_id]}
+            jobs[job_id] = entry
+        self._dirty_jobs.clear()
+        self._dirty_agents.clear()
+        self._dirty_context.clear()
+        self._deltas.clear()
+        return {
+            "type": "diff",
+            "offset": self.offset,
+            "timestamp": datetime.now().isoformat(),
+            "jobs": jobs,
+        }
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; only the local broker works there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Called with (offset, message); offset is None when the event log should assign one
+Deliver = Callable[[Optional[int], Dict[str, Any]], Awaitable[None]]
+
+_HEADER = struct.Struct(">I")
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Any:
+    header = await reader.readexactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    return json.loads(await reader.readexactly(length))
+
+
+def _frame(payload: Any) -> bytes:
+    data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(len(data)) + data
+
+
+class Broker:
+    """Delivers every published message to every backend worker, in the same order."""
+
+    async def start(self, deliver: Deliver, start_offset: int = 0):
+        raise NotImplementedError
+
+    async def publish(self, message: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class LocalBroker(Broker):
+    """Single-process broker: publishing is a direct call.
+
+    Given ``deliver`` up front, publishing works before ``start`` too.
+    """
+
+    def __init__(self, deliver: Optional[Deliver] = None):
+        self._deliver = deliver
+
+    async def start(self, deliver: Deliver, start_offset: int = 0):
+        self._deliver = deliver
+
+    async def publish(self, message: Dict[str, Any]):
+        if self._deliver is None:
+            raise RuntimeError("LocalBroker has no deliver callback; pass one or call start() first")
+        await self._deliver(None, message)
+
+
+class SocketHub:
+    """Sequencer that the workers connect to over a Unix socket.
+
+    Every frame a worker sends is stamped with the next offset and written to
+    all connected workers, the sender included, so every worker sees the same
+    events in the same order with the same offsets.
+
+    The hub does not wait for a slow worker, which would stall all of them.
+    A worker whose unsent frames exceed ``max_buffer`` bytes is disconnected
+    instead; it reconnects and misses the frames in between.
+    """
+
+    def __init__(self, path: str, start_offset: int = 0, max_buffer: int = 4 * 1024 * 1024):
+        self.path = path
+        self.offset = start_offset
+        self.max_buffer = max_buffer
+        self._subscribers: Set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info("Broker hub listening on %s from offset %s", self.path, self.offset)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._subscribers.add(writer)
+        try:
+            while True:
+                message = await _read_frame(reader)
+                if message.get("type") == "hello":
+                    # Workers report the newest offset they know so restarts never reuse one
+                    self.offset = max(self.offset, message.get("offset", 0))
+                    continue
+                self.offset += 1
+                frame = _frame([self.offset, message])
+                for subscriber in list(self._subscribers):
+                    try:
+                        subscriber.write(frame)
+                        lagging = subscriber.transport.get_write_buffer_size() > self.max_buffer
+                    except Exception:
+                        lagging = True
+                    if lagging:
+                        logger.warning("Disconnecting a broker subscriber that fell %s bytes behind",
+                                       self.max_buffer)
+                        self._subscribers.discard(subscriber)
+                        subscriber.close()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for subscriber in list(self._subscribers):
+            subscriber.close()
+
+
+class SocketBroker(Broker):
+    """Multi-process broker over a local Unix socket.
+
+    One worker, whichever takes the lock file first, also runs the
+    ``SocketHub``. All workers, including that one, connect to it as
+    subscribers. If the hub's worker exits, the others race for the lock and
+    one of them takes over. Messages published during the handover are lost.
+    """
+
+    def __init__(self, path: str, reconnect_interval: float = 0.5, max_buffer: int = 4 * 1024 * 1024):
+        if fcntl is None:
+            raise RuntimeError("The socket broker needs a Unix platform")
+        self.path = path
+        self.reconnect_interval = reconnect_interval
+        self.max_buffer = max_buffer
+        self.hub: Optional[SocketHub] = None
+        self._lock_file = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connected = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._offset = 0
+
+    async def start(self, deliver: Deliver, start_offset: int = 0):
+        self._deliver = deliver
+        self._offset = start_offset
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            logger.error("Broker at %s not reachable yet; publishing will wait for it", self.path)
+
+    async def _try_become_hub(self):
+        if self.hub is not None:
+            return
+        lock_file = open(self.path + ".lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+        self._lock_file = lock_file
+        self.hub = SocketHub(self.path, self._offset, self.max_buffer)
+        await self.hub.start()
+
+    async def _run(self):
+        while True:
+            await self._try_become_hub()
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (OSError, ConnectionError):
+                await asyncio.sleep(self.reconnect_interval)
+                continue
+            writer.write(_frame({"type": "hello", "offset": self._offset}))
+            self._writer = writer
+            self._connected.set()
+            logger.info("Connected to broker hub at %s", self.path)
+            try:
+                while True:
+                    offset, message = await _read_frame(reader)
+                    self._offset = offset
+                    try:
+                        await self._deliver(offset, message)
+                    except Exception as e:
+                        logger.error("Failed to deliver broker message %s: %s", offset, e)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                logger.warning("Lost connection to broker hub, reconnecting")
+            finally:
+                self._connected.clear()
+                self._writer = None
+                writer.close()
+
+    async def publish(self, message: Dict[str, Any]):
+        await self._connected.wait()
+        try:
+            self._writer.write(_frame(message))
+            await self._writer.drain()
+        except (ConnectionError, AttributeError):
+            # The hub went away or dropped this worker mid-write; like a handover, the message is
+            # lost, and later publishes wait for the reconnect
+            self._connected.clear()
+            logger.warning("Broker connection lost while publishing; message dropped")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        if self.hub is not None:
+            await self.hub.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+
+def create_broker(deliver: Optional[Deliver] = None) -> Broker:
+    """Broker selected by BROKER (local or socket), BROKER_SOCKET and BROKER_MAX_BUFFER_KB.
+
+    ``deliver`` lets the local broker deliver before ``start``; the socket
+    broker needs its connection and still only delivers once started.
+    """
+    kind = os.environ.get("BROKER", "local")
+    if kind == "local":
+        return LocalBroker(deliver)
+    if kind == "socket":
+        return SocketBroker(
+            os.environ.get("BROKER_SOCKET", "/tmp/crewai-monitor-broker.sock"),
+            max_buffer=int(os.environ.get("BROKER_MAX_BUFFER_KB", "4096")) * 1024
+        )
+    raise ValueError(f"Unknown broker: {kind}")
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .jobs import COMPLETED, QUEUED, RUNNING, Job
+
+# How a request was matched to an existing job
+EXACT = "exact"
+SIMILAR = "similar"
+
+_NON_WORD = re.compile(r"[\W_]+")
+_MERSENNE = (1 << 61) - 1
+
+
+def normalize_topic(topic: str) -> str:
+    """Case, punctuation and whitespace insensitive form of a topic."""
+    text = unicodedata.normalize("NFKC", topic).casefold()
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def request_key(topic: str, config: Dict[str, Any]) -> str:
+    """Identity of a request: the normalized topic plus the pipeline configuration."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_topic(topic).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def shingles(text: str, size: int = 4) -> Set[str]:
+    """Character n-grams of the normalized text; short texts are one shingle."""
+    text = normalize_topic(text)
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures whose agreement estimates the Jaccard similarity of shingle sets."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [
+            (rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(num_perm)
+        ]
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+            for s in shingles(text)
+        ]
+        return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in self._perms)
+
+    @staticmethod
+    def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class NearDuplicateIndex:
+    """Locality-sensitive index of MinHash signatures.
+
+    Signatures are split into ``bands`` and bucketed per band, so a lookup
+    only compares against entries that agree on at least one whole band.
+    Candidates are then kept if their estimated similarity reaches
+    ``threshold``.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.rows = num_perm // bands
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[str]] = {}
+        self._signatures: Dict[str, Tuple[str, Tuple[int, ...]]] = {}
+
+    def _bands(self, scope: str, signature: Tuple[int, ...]):
+        for start in range(0, len(signature), self.rows):
+            yield scope, start, signature[start:start + self.rows]
+
+    def add(self, key: str, text: str, scope: str = ""):
+        """Index ``text`` under ``key``; only entries with the same ``scope`` match each other."""
+        signature = self.hasher.signature(text)
+        self._signatures[key] = (scope, signature)
+        for band in self._bands(scope, signature):
+            self._buckets.setdefault(band, set()).add(key)
+
+    def remove(self, key: str):
+        entry = self._signatures.pop(key, None)
+        if entry is None:
+            return
+        for band in self._bands(*entry):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def query(self, text: str, scope: str = "") -> List[Tuple[str, float]]:
+        """Keys similar to ``text``, most similar first."""
+        signature = self.hasher.signature(text)
+        candidates = set()
+        for band in self._bands(scope, signature):
+            candidates |= self._buckets.get(band, set())
+        matches = [
+            (key, MinHasher.similarity(signature, self._signatures[key][1])) for key in candidates
+        ]
+        return sorted(
+            [(key, score) for key, score in matches if score >= self.threshold],
+            key=lambda match: -match[1],
+        )
+
+
+class JobDeduplicator:
+    """Maps incoming requests onto queued, running or recently completed jobs.
+
+    Identical requests (same normalized topic and pipeline config) share one
+    job. With ``similarity`` above 0, topics whose estimated shingle
+    similarity reaches it are matched too, within the same config. Completed
+    jobs are reused for ``result_ttl`` seconds; failed jobs never are.
+    ``lookup`` resolves job ids against the scheduler, so jobs it has pruned
+    are forgotten here as well.
+    """
+
+    def __init__(self, lookup: Callable[[str], Optional[Job]], similarity: float = 0.0,
+                 result_ttl: float = 0.0):
+        self.lookup = lookup
+        self.result_ttl = result_ttl
+        self.index = NearDuplicateIndex(threshold=similarity) if similarity > 0 else None
+        self._jobs: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _usable(self, job: Optional[Job]) -> bool:
+        if job is None:
+            return False
+        if job.state in (QUEUED, RUNNING):
+            return True
+        return (
+            job.state == COMPLETED and job.finished_at is not None
+            and time.time() - job.finished_at.timestamp() <= self.result_ttl
+        )
+
+    def _live_job(self, key: str) -> Optional[Job]:
+        job_id = self._jobs.get(key)
+        if job_id is None:
+            return None
+        job = self.lookup(job_id)
+        if self._usable(job):
+            return job
+        self._forget(key)
+        return None
+
+    def _forget(self, key: str):
+        self._jobs.pop(key, None)
+        if self.index is not None:
+            self.index.remove(key)
+
+    def find(self, topic: str, config: Dict[str, Any]) -> Optional[Tuple[Job, str]]:
+        """The job a request should attach to and how it matched, or None."""
+        with self._lock:
+            job = self._live_job(request_key(topic, config))
+            if job is not None:
+                return job, EXACT
+            if self.index is None:
+                return None
+            scope = json.dumps(config, sort_keys=True)
+            for key, _ in self.index.query(topic, scope):
+                job = self._live_job(key)
+                if job is not None:
+                    return job, SIMILAR
+            return None
+
+    def add(self, job: Job, config: Dict[str, Any]):
+        """Make ``job`` the one later requests for its topic and config attach to."""
+        key = request_key(job.topic, config)
+        with self._lock:
+            # Drop jobs that can no longer be reused so the index stays small
+            for stale in [k for k, job_id in self._jobs.items() if not self._usable(self.lookup(job_id))]:
+                self._forget(stale)
+            self._forget(key)
+            self._jobs[key] = job.id
+            if self.index is not None:
+                self.index.add(key, job.topic, json.dumps(config, sort_keys=True))
@@ -0,0 +1,399 @@
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # no shared-directory writer election on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Events that are not tied to a job (connection notices, external producers)
+DEFAULT_JOB = "_global"
+
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def _compact(event: Dict[str, Any]) -> str:
+    return json.dumps(event, separators=(",", ":"), ensure_ascii=False)
+
+
+class SegmentWriter:
+    """Background thread that does the event log's disk I/O.
+
+    Appends only queue a write, so the event loop that broadcasts events
+    never waits on the disk. The thread drains whatever has queued up and
+    flushes each file it touched once per batch.
+    """
+
+    def __init__(self):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation: Callable[[], Optional["JobLog"]]):
+        """Queue a file operation; it returns the log to flush, if any."""
+        self._queue.put(operation)
+
+    def sync(self, timeout: Optional[float] = None):
+        """Wait until everything queued so far is written."""
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            touched = set()
+            for operation in batch:
+                if operation is None:
+                    self._flush(touched)
+                    return
+                if isinstance(operation, threading.Event):
+                    # A sync: everything before it must be readable from disk
+                    self._flush(touched)
+                    touched.clear()
+                    operation.set()
+                    continue
+                try:
+                    log = operation()
+                except OSError as e:
+                    logger.error("Failed to persist event log: %s", e)
+                    continue
+                if isinstance(log, JobLog):
+                    touched.add(log)
+            self._flush(touched)
+
+    @staticmethod
+    def _flush(logs):
+        for log in logs:
+            try:
+                log.flush()
+            except OSError as e:
+                logger.error("Failed to flush event log of job %s: %s", log.job_id, e)
+
+
+class JobLog:
+    """Append-only event log of one job: a bounded in-memory ring over disk segments.
+
+    Segments are JSON Lines files named after the offset of their first event.
+    Every event is written through to the current segment (by ``writer`` when
+    given, else on append), so the ring is only a read cache for clients that
+    are a little behind. A
+    read-only log (another worker owns the directory) only fills its ring and
+    reads segments that the writer produced.
+    """
+
+    def __init__(self, job_id: str, root: Optional[Path], ring_size: int, segment_bytes: int,
+                 writable: bool = True, writer: Optional[SegmentWriter] = None, recover: bool = True):
+        self.job_id = job_id
+        self.writable = writable
+        self.writer = writer
+        self.root = root / _SAFE_NAME.sub("_", job_id) if root else None
+        self.ring: deque = deque(maxlen=ring_size)
+        self.segment_bytes = segment_bytes
+        self.count = 0
+        self.last_offset = 0
+        self._segments: List[int] = []
+        self._file = None
+        self._file_size = 0
+        if self.root is not None and recover:
+            self._recover()
+
+    def _segment_path(self, first_offset: int) -> Path:
+        return self.root / f"{first_offset:012d}.jsonl"
+
+    def _scan_segments(self):
+        if self.root.is_dir():
+            self._segments = sorted(int(p.stem) for p in self.root.glob("*.jsonl") if p.stem.isdigit())
+
+    def _recover(self):
+        self._scan_segments()
+        if not self._segments:
+            return
+        # The event count only matters for "is the ring the full history"; history on disk is not
+        self.count = self.ring.maxlen + 1
+        lines = self._segment_path(self._segments[-1]).read_text(encoding="utf-8").splitlines()
+        for line in reversed(lines):
+            try:
+                self.last_offset = json.loads(line)["offset"]
+                break
+            except (ValueError, KeyError):
+                # A torn final line from a crash; everything before it is intact
+                continue
+
+    def append(self, event: Dict[str, Any]):
+        self.ring.append(event)
+        self.count += 1
+        self.last_offset = event["offset"]
+        if self.root is None or not self.writable:
+            return
+        if self.writer is None:
+            self._write(event)
+            self.flush()
+        else:
+            self.writer.submit(lambda: self._write(event))
+
+    def _write(self, event: Dict[str, Any]) -> "JobLog":
+        if self._file is None or self._file_size >= self.segment_bytes:
+            self._rotate(event["offset"])
+        line = _compact(event) + "\n"
+        self._file.write(line)
+        self._file_size += len(line)
+        return self
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def _rotate(self, first_offset: int):
+        if self._file is not None:
+            self._file.close()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._segments.append(first_offset)
+        self._file = open(self._segment_path(first_offset), "a", encoding="utf-8")
+        self._file_size = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read(self, after: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Events with an offset greater than ``after``, oldest first."""
+        events = self.cached(after)
+        if events is None:
+            events = self.read_disk(after, list(self.ring))
+        return events[:limit] if limit else events
+
+    def cached(self, after: int) -> Optional[List[Dict[str, Any]]]:
+        """Events after ``after`` from the ring, or None if some of them are only on disk."""
+        if self.ring and (self.count == len(self.ring) or self.ring[0]["offset"] <= after + 1):
+            return [e for e in self.ring if e["offset"] > after]
+        if self.root is None:
+            # Memory-only log: older events are gone
+            return [e for e in self.ring if e["offset"] > after]
+        return None
+
+    def read_disk(self, after: int, ring: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Events after ``after`` from the segments, completed from ``ring``, a copy of the
+        ring taken while appends were held off. Needs no lock; may wait for the writer."""
+        if not self.writable:
+            self._scan_segments()
+        elif self.writer is not None:
+            # Queued events are not on disk yet
+            self.writer.sync()
+        events = self._read_segments(after)
+        last = events[-1]["offset"] if events else after
+        return events + [e for e in ring if e["offset"] > last]
+
+    def _read_segments(self, after: int) -> List[Dict[str, Any]]:
+        # Skip segments that end before ``after``: those whose successor starts at or before it
+        segments = list(self._segments)
+        start = 0
+        for i in range(1, len(segments)):
+            if segments[i] <= after + 1:
+                start = i
+        events = []
+        for first_offset in segments[start:]:
+            try:
+                f = open(self._segment_path(first_offset), encoding="utf-8")
+            except OSError:
+                # Gone: the job was evicted while it was being read
+                continue
+            with f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if event["offset"] > after:
+                        events.append(event)
+        return events
+
+
+class EventLog:
+    """Durable log of every broadcast event, grouped by job.
+
+    Each event is stamped with an ``offset`` that increases monotonically
+    across all jobs, so a reconnecting dashboard can resume with the last
+    offset it saw. ``root=None`` keeps only the in-memory rings.
+
+    Disk writes happen on a ``SegmentWriter`` thread. Several backend
+    workers may share one directory. Only the worker holding
+    the directory's writer lock writes segments; the others keep their rings
+    and read from disk, and take over if the writer goes away.
+    """
+
+    # How often a read-only log retries to become the writer
+    WRITER_RETRY_INTERVAL = 5.0
+
+    def __init__(self, root: Optional[str] = None, ring_size: int = 1000,
+                 segment_bytes: int = 1024 * 1024, max_jobs: int = 200):
+        self.root = Path(root) if root else None
+        self.ring_size = ring_size
+        self.segment_bytes = segment_bytes
+        self.max_jobs = max_jobs
+        self.offset = 0
+        self._jobs: "OrderedDict[str, JobLog]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.writable = True
+        self._writer_lock = None
+        self._writer_retry = 0.0
+        self.writer: Optional[SegmentWriter] = None
+        self._removing = set()
+        if self.root is not None:
+            self.writer = SegmentWriter()
+            self.root.mkdir(parents=True, exist_ok=True)
+            self.writable = self._acquire_writer()
+            self._recover()
+
+    @classmethod
+    def from_env(cls) -> "EventLog":
+        """Configure from EVENT_LOG, EVENT_LOG_DIR, EVENT_LOG_RING_SIZE, EVENT_LOG_SEGMENT_KB
+        and EVENT_LOG_MAX_JOBS. ``EVENT_LOG=memory`` disables the disk segments."""
+        durable = os.environ.get("EVENT_LOG", "disk") != "memory"
+        return cls(
+            root=os.environ.get("EVENT_LOG_DIR", ".cache/events") if durable else None,
+            ring_size=int(os.environ.get("EVENT_LOG_RING_SIZE", "1000")),
+            segment_bytes=int(os.environ.get("EVENT_LOG_SEGMENT_KB", "1024")) * 1024,
+            max_jobs=int(os.environ.get("EVENT_LOG_MAX_JOBS", "200")),
+        )
+
+    def _acquire_writer(self) -> bool:
+        if fcntl is None:
+            return True
+        self._writer_retry = time.monotonic() + self.WRITER_RETRY_INTERVAL
+        lock_file = open(self.root / ".writer.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._writer_lock = lock_file
+        return True
+
+    def _check_writer(self):
+        """Take over writing once the previous writer has released the directory."""
+        if self.writable or self.root is None or time.monotonic() < self._writer_retry:
+            return
+        if self._acquire_writer():
+            logger.info("Event log writer lock acquired")
+            self.writable = True
+            for log in self._jobs.values():
+                log.writable = True
+                log._scan_segments()
+
+    def _recover(self):
+        directories = sorted(
+            (p for p in self.root.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime
+        )
+        for directory in directories:
+            log = JobLog(directory.name, self.root, self.ring_size, self.segment_bytes, self.writable,
+                         self.writer)
+            self._jobs[directory.name] = log
+            self.offset = max(self.offset, log.last_offset)
+        if self._jobs:
+            logger.info("Recovered event log for %s jobs up to offset %s", len(self._jobs), self.offset)
+
+    def _job(self, job_id: str) -> JobLog:
+        log = self._jobs.get(job_id)
+        if log is None:
+            # An evicted job's directory is still being removed; its history is gone, so start
+            # afresh instead of waiting (the writer removes it before the new log's first write)
+            log = JobLog(job_id, self.root, self.ring_size, self.segment_bytes, self.writable, self.writer,
+                         recover=job_id not in self._removing)
+            self._jobs[job_id] = log
+            self._evict()
+        else:
+            self._jobs.move_to_end(job_id)
+        return log
+
+    def _evict(self):
+        while len(self._jobs) > self.max_jobs:
+            _, log = self._jobs.popitem(last=False)
+            if self.writer is not None:
+                # After the log's queued writes, like every other file operation
+                self._removing.add(log.job_id)
+                self.writer.submit(lambda log=log, remove=self.writable: self._remove(log, remove))
+            else:
+                log.close()
+
+    def _remove(self, log: JobLog, remove: bool):
+        log.close()
+        if remove and log.root is not None:
+            shutil.rmtree(log.root, ignore_errors=True)
+        self._removing.discard(log.job_id)
+
+    def append(self, event: Dict[str, Any], offset: Optional[int] = None) -> Dict[str, Any]:
+        """Store an event and return the stored copy.
+
+        The offset is the next local one unless a broker already assigned it.
+        """
+        with self._lock:
+            self._check_writer()
+            self.offset = self.offset + 1 if offset is None else max(self.offset, offset)
+            event = {**event, "offset": offset or self.offset}
+            try:
+                self._job(event.get("job_id") or DEFAULT_JOB).append(event)
+            except OSError as e:
+                logger.error("Failed to persist event %s: %s", self.offset, e)
+            return event
+
+    def read(self, after: int = 0, job_id: Optional[str] = None,
+             limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Events after an offset, for one job or merged across all jobs in offset order.
+
+        Only the ring lookups hold the lock. Disk reads happen after it is
+        released, so a long replay never holds up ``append`` on the event loop.
+        """
+        with self._lock:
+            if job_id is not None:
+                logs = [self._jobs[job_id]] if job_id in self._jobs else []
+            else:
+                logs = [log for log in self._jobs.values() if log.last_offset > after]
+            reads = []
+            for log in logs:
+                cached = log.cached(after)
+                reads.append((log, cached, None if cached is not None else list(log.ring)))
+        events = []
+        for log, cached, ring in reads:
+            events.extend(cached if cached is not None else log.read_disk(after, ring))
+        if job_id is None:
+            events.sort(key=lambda e: e["offset"])
+        return events[:limit] if limit else events
+
+    def jobs(self) -> List[str]:
+        with self._lock:
+            return list(self._jobs)
+
+    def close(self):
+        with self._lock:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            for log in self._jobs.values():
+                log.close()
+            if self._writer_lock is not None:
+                self._writer_lock.close()
+                self._writer_lock = None
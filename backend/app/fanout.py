@@ -0,0 +1,190 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+import crew_metrics
+from wire_format import JSON, WireDecoder, WireEncoder
+
+logger = logging.getLogger(__name__)
+
+# What to do when a client's send queue is full
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+DISCONNECT = "disconnect"
+POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+# What a client subscribes to: every raw event, or state snapshots and diffs
+RAW = "raw"
+STATE = "state"
+MODES = (RAW, STATE)
+
+# Most messages packed into one frame for clients on a compact wire format
+MAX_FRAME_MESSAGES = 64
+
+
+def coalesce_key(message: Dict[str, Any]) -> Optional[Tuple[Any, Any]]:
+    """Messages with the same key supersede each other in a full queue.
+
+    Streaming deltas, replay frames and state diffs are incremental, so they
+    never replace another message.
+    """
+    if message.get("type") in ("delta", "replay", "diff"):
+        return None
+    return message.get("type"), message.get("agent")
+
+
+class ClientConnection:
+    """A dashboard client with its own bounded send queue and writer task."""
+
+    def __init__(self, websocket: WebSocket, registry: "ConnectionRegistry", mode: str = RAW,
+                 wire_format: Optional[str] = None):
+        self.websocket = websocket
+        self.registry = registry
+        self.mode = mode
+        # Negotiated subprotocol; None is plain JSON, one message per frame
+        self.encoder = WireEncoder(wire_format)
+        self.decoder = WireDecoder(wire_format)
+        self.queue: deque = deque()
+        self.dropped = 0
+        # A state client that lost a diff needs a fresh snapshot
+        self.stale = False
+        # Jobs this client is watching; a job nobody watches any more may be cancelled
+        self.jobs: Set[str] = set()
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, message: Dict[str, Any]) -> bool:
+        """Queue a message without waiting. Returns False if something was dropped."""
+        if self.closed:
+            return False
+        if len(self.queue) < self.registry.queue_size:
+            self.queue.append(message)
+            self._wakeup.set()
+            return True
+
+        policy = self.registry.policy
+        if policy == DISCONNECT:
+            logger.warning("Disconnecting slow WebSocket client")
+            asyncio.create_task(self.close())
+            return False
+        key = coalesce_key(message) if policy == COALESCE else None
+        if key is not None:
+            for i in range(len(self.queue) - 1, -1, -1):
+                if coalesce_key(self.queue[i]) == key:
+                    self.queue[i] = message
+                    self.dropped += 1
+                    crew_metrics.WS_MESSAGES_DROPPED.inc()
+                    self._wakeup.set()
+                    return False
+        self.queue.popleft()
+        self.queue.append(message)
+        self.stale = self.mode == STATE
+        self.dropped += 1
+        crew_metrics.WS_MESSAGES_DROPPED.inc()
+        self._wakeup.set()
+        return False
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        self.registry.unregister(self)
+        self._wakeup.set()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _write_loop(self):
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                # Compact formats carry everything queued so far in one frame
+                count = 1 if self.encoder.format == JSON else MAX_FRAME_MESSAGES
+                messages = [self.queue.popleft() for _ in range(min(count, len(self.queue)))]
+                data = self.encoder.encode(messages)
+                send = self.websocket.send_bytes if self.encoder.binary else self.websocket.send_text
+                await asyncio.wait_for(send(data), timeout=self.registry.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info("WebSocket writer stopped: %s", e)
+            await self.close(code=1011)
+        finally:
+            self.closed = True
+            self.registry.unregister(self)
+
+    async def stop(self):
+        """Stop the writer task; used when the receive side sees a disconnect."""
+        self.closed = True
+        self.registry.unregister(self)
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+class ConnectionRegistry:
+    """Set of connected clients that can be modified while a broadcast runs.
+
+    ``broadcast`` only enqueues into each client's queue, so it never awaits a
+    socket and one slow browser cannot delay delivery to the others.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 256,
+        policy: str = DROP_OLDEST,
+        send_timeout: float = 10.0,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy: {policy}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self._clients: Dict[int, ClientConnection] = {}
+
+    def __len__(self):
+        return len(self._clients)
+
+    def register(self, websocket: WebSocket, mode: str = RAW,
+                 wire_format: Optional[str] = None) -> ClientConnection:
+        if mode not in MODES:
+            raise ValueError(f"Unknown subscription mode: {mode}")
+        client = ClientConnection(websocket, self, mode, wire_format)
+        self._clients[id(client)] = client
+        client.start()
+        return client
+
+    def unregister(self, client: ClientConnection):
+        self._clients.pop(id(client), None)
+
+    def clients(self, mode: Optional[str] = None) -> List[ClientConnection]:
+        return [c for c in self._clients.values() if mode is None or c.mode == mode]
+
+    def watchers(self, job_id: str) -> int:
+        """Number of connected clients watching ``job_id``."""
+        return sum(1 for client in self._clients.values() if job_id in client.jobs)
+
+    def broadcast(self, message: Dict[str, Any], mode: Optional[str] = None) -> int:
+        """Queue a message for every client (of one mode). Returns the number of clients reached."""
+        clients = self.clients(mode)
+        for client in clients:
+            client.send(message)
+        return len(clients)
+
+    @property
+    def dropped(self) -> int:
+        return sum(client.dropped for client in self._clients.values())
@@ -0,0 +1,194 @@
+import asyncio
+import itertools
+import logging
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the pending queue is at capacity."""
+
+
+@dataclass
+class Job:
+    topic: str
+    priority: int = 0
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    state: str = QUEUED
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[str] = None
+    error: Optional[str] = None
+    # Later requests for the same topic that were attached to this job
+    attached: int = 0
+    # Why the job was asked to stop; a running job ends as cancelled once its crew gives up
+    cancel_reason: Optional[str] = None
+    # Run under the sampling profiler; the artifact is served at /jobs/{id}/profile
+    profile: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        def iso(value):
+            return value.isoformat() if value else None
+
+        return {
+            "id": self.id,
+            "topic": self.topic,
+            "priority": self.priority,
+            "state": self.state,
+            "created_at": iso(self.created_at),
+            "started_at": iso(self.started_at),
+            "finished_at": iso(self.finished_at),
+            "result": self.result,
+            "error": self.error,
+            "attached": self.attached,
+            "profile": self.profile,
+        }
+
+
+class JobScheduler:
+    """Priority queue of crew jobs drained by a fixed number of workers.
+
+    ``handler`` is awaited once per job. It receives the job and the
+    scheduler's executor and is expected to run the blocking pipeline there,
+    so the pool size is the hard cap on concurrent LLM pipelines.
+    Higher ``priority`` runs first; equal priorities run in FIFO order.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Job, Executor], Awaitable[Any]],
+        workers: int = 2,
+        executor: str = "thread",
+        max_queue: int = 100,
+        history_size: int = 200,
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor type: {executor}")
+        self.handler = handler
+        self.workers = workers
+        self.executor_kind = executor
+        self.max_queue = max_queue
+        self.history_size = history_size
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._counter = itertools.count()
+        self._executor: Optional[Executor] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def pending(self) -> int:
+        # Cancelled jobs stay in the queue until a worker skips them, so count states
+        return sum(1 for job in self.jobs.values() if job.state == QUEUED)
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.state == RUNNING)
+
+    def start(self):
+        if self._tasks:
+            return
+        if self.executor_kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="crew-job"
+            )
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        logger.info("Job scheduler started with %s %s workers", self.workers, self.executor_kind)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, topic: str, priority: int = 0, profile: bool = False) -> Job:
+        if self._queue is None:
+            raise RuntimeError("Job scheduler is not running")
+        if self.pending >= self.max_queue:
+            raise QueueFull(f"Job queue is full ({self.max_queue} pending)")
+        job = Job(topic=topic, priority=priority, profile=profile)
+        self.jobs[job.id] = job
+        self._queue.put_nowait((-priority, next(self._counter), job))
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str, reason: str = "Cancelled") -> Optional[Job]:
+        """Cancel a job. A queued job is finished at once and never runs; a running
+        job is only marked here, stopping it is up to the caller's crew."""
+        job = self.jobs.get(job_id)
+        if job is None or job.state in FINISHED_STATES:
+            return job
+        job.cancel_reason = reason
+        if job.state == QUEUED:
+            job.state = CANCELLED
+            job.error = reason
+            job.finished_at = datetime.now()
+        return job
+
+    def list(self) -> List[Job]:
+        return list(self.jobs.values())
+
+    def _prune(self):
+        finished = [job.id for job in self.jobs.values() if job.state in FINISHED_STATES]
+        for job_id in finished[: max(0, len(finished) - self.history_size)]:
+            del self.jobs[job_id]
+
+    async def _worker(self, index: int):
+        while True:
+            _, _, job = await self._queue.get()
+            if job.state == CANCELLED:
+                self._queue.task_done()
+                continue
+            job.state = RUNNING
+            job.started_at = datetime.now()
+            try:
+                result = await self.handler(job, self._executor)
+                job.result = None if result is None else str(result)
+                if job.cancel_reason is not None:
+                    # The crew could not be stopped (a process worker) and finished anyway
+                    logger.info("Job %s cancelled: %s", job.id, job.cancel_reason)
+                    job.error = job.cancel_reason
+                    job.state = CANCELLED
+                else:
+                    job.state = COMPLETED
+            except asyncio.CancelledError:
+                job.state = FAILED
+                job.error = "Scheduler stopped"
+                raise
+            except Exception as e:
+                if job.cancel_reason is not None:
+                    logger.info("Job %s cancelled: %s", job.id, job.cancel_reason)
+                    job.error = job.cancel_reason
+                    job.state = CANCELLED
+                else:
+                    logger.error("Job %s failed: %s", job.id, e)
+                    job.error = str(e)
+                    job.state = FAILED
+            finally:
+                job.finished_at = datetime.now()
+                self._queue.task_done()
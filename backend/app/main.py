@@ -1,9 +1,8 @@
-from fastapi import FastAPI, WebSocket, HTTPException
+from fastapi import FastAPI, WebSocket, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel
 from starlette.websockets import WebSocketDisconnect
-import json
-from typing import List
 import asyncio
 from datetime import datetime
 import sys
@@ -14,7 +13,18 @@ import logging
 # Add the project root to Python path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from content_creation_crew import main as run_crewai
+from content_creation_crew import main as run_crewai, get_runtime, pipeline_config
+import cancellation
+import crew_metrics
+import profiling
+import telemetry
+import wire_format
+from .agentstate import AgentStateStore
+from .broker import LocalBroker, create_broker
+from .dedupe import JobDeduplicator
+from .eventlog import EventLog
+from .fanout import RAW, STATE, ConnectionRegistry
+from .jobs import FINISHED_STATES, QUEUED, RUNNING, JobScheduler, QueueFull
 
 app = FastAPI()
 
@@ -27,207 +37,398 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store active WebSocket connections
-active_connections: List[WebSocket] = []
+# Store active WebSocket connections, each with its own bounded send queue
+active_connections = ConnectionRegistry(
+    queue_size=int(os.environ.get("WS_SEND_QUEUE_SIZE", "256")),
+    policy=os.environ.get("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+)
+
+# Every broadcast event is numbered and kept so reconnecting dashboards can catch up
+event_log = EventLog.from_env()
+
+# Events per replay frame sent to a resuming client
+REPLAY_CHUNK = 500
+
+# Authoritative agent state per job; state clients get a snapshot, then a diff per tick
+agent_states = AgentStateStore(max_jobs=int(os.environ.get("STATE_MAX_JOBS", "20")))
+STATE_TICK_INTERVAL = float(os.environ.get("STATE_TICK_INTERVAL", "0.25"))
 
 logger = logging.getLogger(__name__)
 
+async def deliver_message(offset, message: dict):
+    """Broker callback: record a message, fold it into the agent state and send it to raw clients."""
+    event = event_log.append(message, offset)
+    agent_states.apply(event)
+    active_connections.broadcast(event, mode=RAW)
+
+# Carries every broadcast to all backend workers (BROKER=local for a single process)
+broker = create_broker(deliver_message)
+
+# Seconds a job may go unwatched after its last viewer disconnects before it is
+# cancelled (0, the default, disables it). Viewers are only known per worker, so this
+# needs BROKER=local.
+CANCEL_ORPHANED_AFTER = float(os.environ.get("CANCEL_ORPHANED_AFTER", "0"))
+if CANCEL_ORPHANED_AFTER > 0 and not isinstance(broker, LocalBroker):
+    logger.warning("CANCEL_ORPHANED_AFTER needs BROKER=local; orphaned jobs will not be cancelled")
+    CANCEL_ORPHANED_AFTER = 0
+
 async def broadcast_message(message: dict):
-    """Broadcast message to all connected clients."""
-    for connection in active_connections:
+    """Publish a message to every worker through the broker."""
+    await broker.publish(message)
+
+async def publish_state_diffs():
+    """Send accumulated state changes to state clients once per tick."""
+    while True:
+        await asyncio.sleep(STATE_TICK_INTERVAL)
         try:
-            await connection.send_json(message)
-        except:
-            active_connections.remove(connection)
+            diff = agent_states.take_diff()
+            if diff:
+                active_connections.broadcast(diff, mode=STATE)
+            for client in active_connections.clients(STATE):
+                if client.stale:
+                    client.stale = False
+                    client.send(agent_states.snapshot())
+        except Exception as e:
+            logger.error("Failed to publish state diff: %s", e)
+
+async def replay_events(client, after: int = 0, job_id: str = None):
+    """Send logged events to one client as replay frames (one queue slot per frame)."""
+    events = await asyncio.to_thread(event_log.read, after, job_id)
+    for start in range(0, len(events), REPLAY_CHUNK):
+        client.send({"type": "replay", "events": events[start:start + REPLAY_CHUNK]})
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, after: int = None, job_id: str = None,
+                             mode: str = RAW):
+    """Dashboards resume with ``?after=<last offset>`` or load a job with ``?job_id=``.
+
+    ``?mode=state`` subscribes to an agent-state snapshot followed by coalesced
+    diffs instead of every raw event. Clients that offer a compact wire format
+    as a subprotocol get it for both directions; everyone else speaks JSON.
+    """
     try:
-        await websocket.accept()
-        active_connections.append(websocket)
+        protocol = wire_format.negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=protocol)
+        if mode not in (RAW, STATE):
+            await websocket.close(code=1008)
+            return
+        client = active_connections.register(websocket, mode, protocol)
         logger.info("New WebSocket connection established")
         
         try:
             # Send initial connection confirmation
-            await websocket.send_json({
+            client.send({
                 "timestamp": datetime.now().isoformat(),
                 "agent": "System",
                 "task": "Connection",
-                "output": "WebSocket connection established"
+                "output": "WebSocket connection established",
+                "log_offset": event_log.offset
             })
+            if mode == STATE:
+                client.send(agent_states.snapshot())
+            if job_id is not None:
+                client.jobs.add(job_id)
+            if after is not None or job_id is not None:
+                await replay_events(client, after or 0, job_id)
             
             # Keep connection alive and handle messages
             while True:
                 try:
-                    data = await websocket.receive_text()
-                    # Broadcast received message to all clients
-                    await broadcast_message(json.loads(data))
+                    frame = await websocket.receive()
+                    if frame["type"] == "websocket.disconnect":
+                        break
+                    data = frame.get("text")
+                    # Monitor transports micro-batch events into one frame
+                    messages = client.decoder.decode(data if data is not None else frame.get("bytes"))
+                    events = []
+                    for item in messages:
+                        if item.get("type") == "resume":
+                            await replay_events(client, item.get("after", 0), item.get("job_id"))
+                        elif item.get("type") == "watch":
+                            # Dashboards say which job they show, so it can stop when nobody does
+                            client.jobs.add(item.get("job_id"))
+                        else:
+                            events.append(item)
+                    if not events:
+                        continue
+                    # Broadcast received messages to all clients
+                    for item in events:
+                        await broadcast_message(item)
                     # Send acknowledgment
-                    await websocket.send_json({
+                    client.send({
                         "type": "ack",
                         "timestamp": datetime.now().isoformat()
                     })
                 except WebSocketDisconnect:
                     break
                 except Exception as e:
-                    logger.error(f"Error processing message: {str(e)}")
+                    logger.error("Error processing message: %s", e)
                     break
         finally:
-            if websocket in active_connections:
-                active_connections.remove(websocket)
+            await client.stop()
+            for watched in client.jobs:
+                if CANCEL_ORPHANED_AFTER > 0 and active_connections.watchers(watched) == 0:
+                    asyncio.create_task(cancel_if_orphaned(watched))
             logger.info("WebSocket connection closed")
     except Exception as e:
-        logger.error(f"Error in websocket_endpoint: {str(e)}")
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+        logger.error("Error in websocket_endpoint: %s", e)
         raise
 
 class StartRequest(BaseModel):
     topic: str
+    priority: int = 0
+    # False always starts a fresh run instead of attaching to a matching job
+    dedupe: bool = True
+    # Sample the run's stacks; profiled runs are never attached to another job
+    profile: bool = False
 
-@app.post("/start")
-async def start_crewai(request: StartRequest):
-    try:
-        # Run CrewAI in a separate thread to not block
-        asyncio.create_task(run_crewai_task(request.topic))
-        return {"status": "started"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def run_crewai_task(topic: str, executor=None, job_id: str = None, profile: bool = False):
+    """Run one content creation pipeline on the given executor."""
+    # Initial status
+    await broadcast_message({
+        "timestamp": datetime.now().isoformat(),
+        "agent": "System",
+        "task": "Starting",
+        "output": f"Beginning content creation for topic: {topic}",
+        "type": "status",
+        "job_id": job_id
+    })
 
-async def run_crewai_task(topic: str):
+    # Agent-level status updates are emitted by crewai_monitor from inside the crew.
+    # The job's cancel token exists before the crew starts, so an early cancel still counts.
+    # A process worker cannot see a token created here, so it gets none (see cancel_job).
+    if job_id is not None and scheduler.executor_kind == "thread":
+        cancellation.register(job_id)
     try:
-        # Initial status
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(executor, run_crewai_job, topic, job_id, profile)
+    except cancellation.JobCancelled as e:
         await broadcast_message({
             "timestamp": datetime.now().isoformat(),
             "agent": "System",
-            "task": "Starting",
-            "output": f"Beginning content creation for topic: {topic}",
-            "type": "status"
+            "task": "Cancelled",
+            "output": f"Content creation cancelled: {e.reason}",
+            "type": "status",
+            "status": "Cancelled",
+            "job_id": job_id
         })
+        raise
+    except Exception as e:
+        error_msg = f"Error in content creation: {str(e)}"
+        await broadcast_message({
+            "timestamp": datetime.now().isoformat(),
+            "agent": "System",
+            "task": "Error",
+            "output": error_msg,
+            "type": "status",
+            "status": "Error",
+            "job_id": job_id
+        })
+        raise
+    finally:
+        if job_id is not None:
+            cancellation.release(job_id)
 
-        # Create a queue for status updates
-        status_queue = asyncio.Queue()
-
-        # Callback functions for task status updates
-        def on_research_start():
-            status_queue.put_nowait({
-                "timestamp": datetime.now().isoformat(),
-                "agent": "Research Agent",
-                "task": "Researching",
-                "output": f"Starting research on topic: {topic}",
-                "type": "status"
-            })
-
-        def on_research_complete(result):
-            status_queue.put_nowait({
-                "timestamp": datetime.now().isoformat(),
-                "agent": "Research Agent",
-                "task": "Completed",
-                "output": "Research phase completed",
-                "type": "status"
-            })
+    job = scheduler.get(job_id) if job_id is not None else None
+    if job is not None and job.cancel_reason is not None:
+        # A process worker ran to the end despite the cancel; the scheduler ends it as cancelled
+        await broadcast_message({
+            "timestamp": datetime.now().isoformat(),
+            "agent": "System",
+            "task": "Cancelled",
+            "output": f"Content creation cancelled: {job.cancel_reason}",
+            "type": "status",
+            "status": "Cancelled",
+            "job_id": job_id
+        })
+        return result
 
-        def on_writing_start():
-            status_queue.put_nowait({
-                "timestamp": datetime.now().isoformat(),
-                "agent": "Writer Agent",
-                "task": "Writing",
-                "output": "Starting content creation",
-                "type": "status"
-            })
+    # Final system status
+    await broadcast_message({
+        "timestamp": datetime.now().isoformat(),
+        "agent": "System",
+        "task": "Completed",
+        "output": "Content creation process finished successfully",
+        "type": "status",
+        "job_id": job_id
+    })
+    return result
 
-        def on_writing_complete(result):
-            status_queue.put_nowait({
-                "timestamp": datetime.now().isoformat(),
-                "agent": "Writer Agent",
-                "task": "Completed",
-                "output": "Writing phase completed",
-                "type": "status"
-            })
+def run_crewai_job(topic: str, job_id: str = None, profile: bool = False) -> str:
+    """Executor entry point; returns plain text so process pools can pickle it."""
+    # Imports, LLM client, agents and monitor patches are built once per process
+    return str(run_crewai(topic, runtime=get_runtime(), job_id=job_id, profile=profile))
 
-        def on_editing_start():
-            status_queue.put_nowait({
-                "timestamp": datetime.now().isoformat(),
-                "agent": "Editor Agent",
-                "task": "Editing",
-                "output": "Starting content optimization",
-                "type": "status"
-            })
+scheduler = JobScheduler(
+    lambda job, executor: run_crewai_task(job.topic, executor, job.id, job.profile),
+    workers=int(os.environ.get("CREW_WORKERS", "2")),
+    executor=os.environ.get("CREW_EXECUTOR", "thread"),
+    max_queue=int(os.environ.get("CREW_QUEUE_SIZE", "100"))
+)
 
-        def on_editing_complete(result):
-            status_queue.put_nowait({
-                "timestamp": datetime.now().isoformat(),
-                "agent": "Editor Agent",
-                "task": "Completed",
-                "output": "Content optimization completed",
-                "type": "status"
-            })
+# Identical (or, with JOB_DEDUPE_SIMILARITY, near-identical) topics share one job
+deduplicator = JobDeduplicator(
+    scheduler.get,
+    similarity=float(os.environ.get("JOB_DEDUPE_SIMILARITY", "0")),
+    result_ttl=float(os.environ.get("JOB_DEDUPE_RESULT_TTL", "0"))
+) if os.environ.get("JOB_DEDUPE", "on") != "off" else None
 
-        # Start status monitoring task
-        async def monitor_status():
-            while True:
-                try:
-                    message = await status_queue.get()
-                    await broadcast_message(message)
-                    status_queue.task_done()
-                except Exception as e:
-                    logger.error(f"Error in status monitoring: {str(e)}")
-                    break
+@app.on_event("startup")
+async def start_scheduler():
+    await broker.start(deliver_message, start_offset=event_log.offset)
+    scheduler.start()
+    app.state.state_publisher = asyncio.create_task(publish_state_diffs())
+    # Warm the crew runtime so the first job does not pay for imports and setup
+    try:
+        await asyncio.to_thread(get_runtime)
+    except Exception as e:
+        logger.error("Failed to warm crew runtime: %s", e)
 
-        # Start the monitoring task
-        monitor_task = asyncio.create_task(monitor_status())
+@app.on_event("shutdown")
+async def stop_scheduler():
+    app.state.state_publisher.cancel()
+    await scheduler.stop()
+    await broker.close()
+    event_log.close()
 
-        # Run CrewAI with callbacks
-        try:
-            result = await asyncio.to_thread(
-                run_crewai, 
-                topic,
-                on_research_start=on_research_start,
-                on_research_complete=on_research_complete,
-                on_writing_start=on_writing_start,
-                on_writing_complete=on_writing_complete,
-                on_editing_start=on_editing_start,
-                on_editing_complete=on_editing_complete
-            )
-
-            # Final system status
-            await broadcast_message({
-                "timestamp": datetime.now().isoformat(),
-                "agent": "System",
-                "task": "Completed",
-                "output": "Content creation process finished successfully",
-                "type": "status"
-            })
+@app.post("/start")
+async def start_crewai(request: StartRequest):
+    config = pipeline_config()
+    if deduplicator is not None and request.dedupe and not request.profile:
+        match = deduplicator.find(request.topic, config)
+        if match is not None:
+            job, kind = match
+            job.attached += 1
+            crew_metrics.JOBS_DEDUPLICATED.inc(match=kind)
+            logger.info("Attached request for '%s' to job %s (%s match)", request.topic, job.id, kind)
+            return {
+                "status": "attached",
+                "job_id": job.id,
+                "state": job.state,
+                "match": kind,
+                "pending": scheduler.pending
+            }
+    try:
+        job = scheduler.submit(request.topic, priority=request.priority, profile=request.profile)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if deduplicator is not None:
+        deduplicator.add(job, config)
+    return {"status": "queued", "job_id": job.id, "pending": scheduler.pending}
 
-            # Cancel the monitoring task
-            monitor_task.cancel()
-            return result
+@app.get("/jobs")
+async def list_jobs():
+    return {
+        "running": scheduler.running,
+        "pending": scheduler.pending,
+        "jobs": [job.to_dict() for job in scheduler.list()]
+    }
 
-        except Exception as e:
-            error_msg = f"Error in content creation: {str(e)}"
-            await broadcast_message({
-                "timestamp": datetime.now().isoformat(),
-                "agent": "System",
-                "task": "Error",
-                "output": error_msg,
-                "type": "status",
-                "status": "error"
-            })
-            # Cancel the monitoring task
-            monitor_task.cancel()
-            raise e
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
-    except Exception as e:
-        error_msg = f"Error in content creation: {str(e)}"
+async def cancel_job(job_id: str, reason: str, kind: str):
+    """Cancel a queued or running job; a running crew stops at its next LLM call or task."""
+    job = scheduler.get(job_id)
+    if job is None or job.state in FINISHED_STATES:
+        return job
+    was_queued = job.state == QUEUED
+    scheduler.cancel(job_id, reason)
+    crew_metrics.JOBS_CANCELLED.inc(reason=kind)
+    if was_queued:
+        # The job never started, so nothing else will tell the dashboards
         await broadcast_message({
             "timestamp": datetime.now().isoformat(),
             "agent": "System",
-            "task": "Error",
-            "output": error_msg,
+            "task": "Cancelled",
+            "output": f"Content creation cancelled: {reason}",
             "type": "status",
-            "status": "error"
+            "status": "Cancelled",
+            "job_id": job_id
         })
+    elif not cancellation.cancel(job_id, reason):
+        logger.warning("Job %s runs in another process; it stops at its deadline (needs CREW_EXECUTOR=thread)",
+                       job_id)
+    return job
+
+async def cancel_if_orphaned(job_id: str):
+    """Cancel ``job_id`` if it is still unwatched once the grace period is over."""
+    await asyncio.sleep(CANCEL_ORPHANED_AFTER)
+    job = scheduler.get(job_id)
+    if job is None or job.state not in (QUEUED, RUNNING) or active_connections.watchers(job_id) > 0:
+        return
+    logger.info("Cancelling job %s: no viewer for %gs", job_id, CANCEL_ORPHANED_AFTER)
+    await cancel_job(job_id, "All viewers disconnected", "orphaned")
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job_request(job_id: str):
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.state in FINISHED_STATES:
+        raise HTTPException(status_code=409, detail=f"Job already {job.state}")
+    await cancel_job(job_id, "Cancelled by request", "request")
+    # A running job reports "cancelling" until its crew has actually stopped
+    return {
+        "status": "cancelling" if job.state == RUNNING else job.state,
+        "job_id": job.id,
+        "state": job.state
+    }
+
+@app.get("/jobs/{job_id}/profile")
+async def get_job_profile(job_id: str, format: str = Query("collapsed", pattern="^(collapsed|summary)$")):
+    """A profiled job's collapsed stacks (flamegraph.pl / speedscope input) or its summary."""
+    path = profiling.artifact_path(job_id, "collapsed" if format == "collapsed" else "json")
+    if path is None:
+        job = scheduler.get(job_id)
+        detail = "Profile not ready" if job is not None and job.profile else "Profile not found"
+        raise HTTPException(status_code=404, detail=detail)
+    content = await asyncio.to_thread(path.read_bytes)
+    media_type = "text/plain" if format == "collapsed" else "application/json"
+    return Response(content=content, media_type=media_type)
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, after: int = Query(0, ge=0), limit: int = Query(None, ge=1)):
+    """A job's event history from the log, including jobs that finished long ago."""
+    events = await asyncio.to_thread(event_log.read, after, job_id, limit)
+    if not events and scheduler.get(job_id) is None and job_id not in event_log.jobs():
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job_id,
+        "events": events,
+        "last_offset": events[-1]["offset"] if events else after
+    }
+
+@app.get("/state")
+async def get_state():
+    """Current agent-state snapshot of the retained jobs."""
+    return agent_states.snapshot()
+
+@app.get("/debug/events")
+async def get_debug_events(job_id: str = None, after: int = Query(0, ge=0),
+                           limit: int = Query(500, ge=1, le=5000)):
+    """Recent debug events from this process's telemetry ring (crews in thread workers included)."""
+    events = telemetry.recent(limit, job_id, after)
+    return {
+        "ring_size": telemetry.ring.size,
+        "events": events,
+        "last_seq": events[-1]["seq"] if events else after
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for task latency, LLM usage, drops, jobs and clients."""
+    crew_metrics.ACTIVE_JOBS.set(scheduler.running)
+    crew_metrics.QUEUED_JOBS.set(scheduler.pending)
+    crew_metrics.WEBSOCKET_CLIENTS.set(len(active_connections))
+    return Response(content=crew_metrics.render(), media_type=crew_metrics.CONTENT_TYPE)
 
 @app.get("/")
 async def root():
-    return {"status": "running"} 
\ No newline at end of file
+    return {"status": "running"}
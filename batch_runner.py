@@ -0,0 +1,109 @@
+import csv
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def load_topics(path: str) -> List[str]:
+    """Read topics from a JSONL file (``{"topic": ...}`` or plain strings) or a CSV file.
+
+    CSV files use a ``topic`` column when there is a header with one, and the
+    first column otherwise.
+    """
+    topics = []
+    if Path(path).suffix.lower() == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        if rows and "topic" in [cell.strip().lower() for cell in rows[0]]:
+            column = [cell.strip().lower() for cell in rows[0]].index("topic")
+            rows = rows[1:]
+        else:
+            column = 0
+        topics = [row[column].strip() for row in rows if len(row) > column and row[column].strip()]
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                topic = record.get("topic") if isinstance(record, dict) else record
+                if topic:
+                    topics.append(str(topic))
+    return topics
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(records: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+    latencies = [r["latency_s"] for r in records if r["status"] == "ok"]
+    succeeded = len(latencies)
+    return {
+        "topics": len(records),
+        "succeeded": succeeded,
+        "failed": len(records) - succeeded,
+        "wall_time_s": round(wall_time, 2),
+        "throughput_per_min": round(succeeded / wall_time * 60, 2) if wall_time else 0.0,
+        "latency_p50_s": round(percentile(latencies, 50), 2),
+        "latency_p95_s": round(percentile(latencies, 95), 2),
+        "latency_max_s": round(max(latencies), 2) if latencies else 0.0,
+    }
+
+
+def run_batch(topics_path: str, output_path: str, concurrency: int = 4,
+              rpm: float = 60) -> Dict[str, Any]:
+    """Run one crew per topic, ``concurrency`` at a time, sharing one warm runtime.
+
+    Each result is appended to ``output_path`` as soon as its crew finishes.
+    Returns (and prints) a throughput and latency summary.
+    """
+    from content_creation_crew import CrewRuntime, main
+    from llm_gateway import get_gateway
+
+    topics = load_topics(topics_path)
+    logger.info("Running %s topics with concurrency %s", len(topics), concurrency)
+
+    # One connection pool and request budget (the gateway's) for every crew in the batch
+    get_gateway().set_limits(rpm=rpm)
+    runtime = CrewRuntime()
+
+    def run_one(topic: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        record = {"topic": topic, "started_at": datetime.now().isoformat()}
+        try:
+            record["output"] = str(main(topic, runtime=runtime))
+            record["status"] = "ok"
+        except Exception as e:
+            record["error"] = str(e)
+            record["status"] = "error"
+        record["latency_s"] = round(time.monotonic() - started, 3)
+        return record
+
+    records = []
+    started = time.monotonic()
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-crew") as pool:
+        futures = [pool.submit(run_one, topic) for topic in topics]
+        for future in as_completed(futures):
+            record = future.result()
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            records.append(record)
+            logger.info("[%s/%s] %s in %ss: %s", len(records), len(topics), record['status'],
+                        record['latency_s'], record['topic'])
+
+    summary = summarize(records, time.monotonic() - started)
+    print(json.dumps(summary, indent=2))
+    return summary
@@ -0,0 +1,220 @@
+"""End-to-end pipeline benchmark against the local stub LLM server.
+
+Measures what this project adds on top of model latency: pipeline wall-clock
+time, per-stage overhead (task time minus time spent waiting on the LLM),
+monitor emission cost, backend jobs/sec at several concurrency levels and
+memory per job. Results are written as JSON so runs can be compared.
+
+    python benchmarks/pipeline_bench.py --runs 3 --concurrency 1,2,4,8 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "backend"))
+
+from stub_llm_server import StubLLMServer  # noqa: E402
+
+TOPIC = "The Future of AI in Healthcare"
+
+
+def configure_environment(stub: StubLLMServer):
+    """Point the crew at the stub and turn off anything that would skip LLM calls."""
+    os.environ["OPENAI_API_BASE"] = stub.base_url
+    os.environ["OPENROUTER_API_KEY"] = "stub"
+    os.environ["LLM_CACHE_MODE"] = "off"
+    os.environ["CHECKPOINTS"] = "off"
+    os.environ["RESEARCH_MODE"] = "single"
+
+
+def make_llm_timer():
+    """Callback handler that sums LLM wait time per agent."""
+    from langchain_core.callbacks import BaseCallbackHandler
+    import crewai_monitor
+
+    class LLMTimer(BaseCallbackHandler):
+        def __init__(self):
+            self.started = {}
+            self.totals: Dict[str, float] = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self.started[run_id] = (time.monotonic(), crewai_monitor.current_agent.get() or "System")
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self.on_chat_model_start(serialized, prompts, run_id=run_id, **kwargs)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            started, agent = self.started.pop(run_id, (None, None))
+            if started is not None:
+                self.totals[agent] = self.totals.get(agent, 0.0) + time.monotonic() - started
+
+        on_llm_error = on_llm_end
+
+    return LLMTimer()
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "runs": len(values),
+        "mean": round(statistics.mean(values), 4),
+        "p50": round(ordered[len(ordered) // 2], 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def bench_pipeline(runtime, runs: int) -> Dict[str, Any]:
+    import crew_metrics
+    from content_creation_crew import main
+
+    timer = make_llm_timer()
+    runtime.llm.callbacks = list(runtime.llm.callbacks or []) + [timer]
+    agents = ["Research Agent", "Writer Agent", "Editor Agent"]
+    before = {agent: crew_metrics.TASK_DURATION.totals(agent=agent) for agent in agents}
+
+    wall = []
+    for _ in range(runs):
+        started = time.monotonic()
+        main(TOPIC, runtime=runtime)
+        wall.append(time.monotonic() - started)
+
+    stages = {}
+    for agent in agents:
+        count, total = crew_metrics.TASK_DURATION.totals(agent=agent)
+        count -= before[agent][0]
+        total -= before[agent][1]
+        llm_time = timer.totals.get(agent, 0.0)
+        stages[agent] = {
+            "task_s": round(total / max(count, 1), 4),
+            "llm_wait_s": round(llm_time / max(count, 1), 4),
+            "overhead_s": round((total - llm_time) / max(count, 1), 4),
+        }
+    runtime.llm.callbacks.remove(timer)
+    return {"wall_s": summarize(wall), "stages": stages}
+
+
+def bench_monitor_emit(events: int) -> Dict[str, Any]:
+    """Cost of one status emission on the agent thread (queueing only, no network)."""
+    import crewai_monitor
+
+    message = {"agent": "Writer Agent", "task": "Writing", "output": "Starting writing task",
+               "status": "Writing"}
+    started = time.perf_counter()
+    for _ in range(events):
+        crewai_monitor.emit(message)
+    elapsed = time.perf_counter() - started
+    return {"events": events, "per_event_us": round(elapsed / events * 1e6, 2)}
+
+
+def bench_jobs(levels: List[int], jobs_per_level: int) -> List[Dict[str, Any]]:
+    """Backend run_crewai_task throughput at several executor sizes."""
+    from app.main import broker, deliver_message, event_log, run_crewai_task
+
+    results = []
+    for concurrency in levels:
+        async def run_all():
+            # As in the backend's startup hook, so broadcasts reach the event log and state
+            await broker.start(deliver_message, start_offset=event_log.offset)
+            try:
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    await asyncio.gather(*[
+                        run_crewai_task(f"{TOPIC} #{i}", executor) for i in range(jobs_per_level)
+                    ])
+            finally:
+                await broker.close()
+
+        started = time.monotonic()
+        asyncio.run(run_all())
+        elapsed = time.monotonic() - started
+        results.append({
+            "concurrency": concurrency,
+            "jobs": jobs_per_level,
+            "wall_s": round(elapsed, 3),
+            "jobs_per_s": round(jobs_per_level / elapsed, 3),
+        })
+    return results
+
+
+def bench_memory(runtime) -> Dict[str, Any]:
+    from content_creation_crew import main
+
+    tracemalloc.start()
+    main(TOPIC, runtime=runtime)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"peak_kb": round(peak / 1024, 1), "retained_kb": round(current / 1024, 1)}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args) -> Dict[str, Any]:
+    stub = StubLLMServer(latency=args.latency, token_rate=args.token_rate,
+                         completion_tokens=args.completion_tokens,
+                         failure_rate=args.failure_rate).start()
+    configure_environment(stub)
+
+    import crewai_monitor
+    from content_creation_crew import get_runtime
+
+    # Monitor events are queued against an unreachable backend unless one is given
+    crewai_monitor.config["ws_url"] = args.ws_url
+    runtime = get_runtime()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "stub": {"latency_s": args.latency, "token_rate": args.token_rate,
+                     "completion_tokens": args.completion_tokens,
+                     "failure_rate": args.failure_rate},
+        },
+        "pipeline": bench_pipeline(runtime, args.runs),
+        "monitor_emit": bench_monitor_emit(args.emit_events),
+        "throughput": bench_jobs([int(c) for c in args.concurrency.split(",")], args.jobs),
+        "memory": bench_memory(runtime),
+        "stub_stats": stub.stats,
+    }
+    stub.stop()
+    crewai_monitor.shutdown(timeout=1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the content pipeline against a stub LLM")
+    parser.add_argument("--runs", type=int, default=3, help="Sequential pipeline runs to time")
+    parser.add_argument("--jobs", type=int, default=8, help="Jobs per concurrency level")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma-separated executor sizes")
+    parser.add_argument("--emit-events", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--token-rate", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--ws-url", default="ws://127.0.0.1:9/ws",
+                        help="Monitor endpoint; the default discards events")
+    parser.add_argument("--output", help="Write results JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
@@ -0,0 +1,176 @@
+"""Local OpenAI-compatible chat completions server for benchmarks.
+
+Serves ``POST /v1/chat/completions`` (streaming and non-streaming) with a
+configurable time to first token, token rate and injected failures, so the
+pipeline can be measured without network or model latency noise.
+
+    python benchmarks/stub_llm_server.py --port 8100 --latency 0.2 --token-rate 200
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+WORDS = ("the model considers the topic and returns a plausible paragraph about "
+         "applications trends impact and challenges with some statistics").split()
+
+
+class StubLLMServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 token_rate: float = 0.0, completion_tokens: int = 200,
+                 failure_rate: float = 0.0, failure_status: int = 500):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.completion_tokens = completion_tokens
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.stats = {"requests": 0, "failures": 0, "busy_s": 0.0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": 0, "failures": 0, "busy_s": 0.0}
+
+    def _record(self, started: float, failed: bool):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["failures"] += int(failed)
+            self.stats["busy_s"] += time.monotonic() - started
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                started = time.monotonic()
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+                if server.failure_rate and random.random() < server.failure_rate:
+                    headers = {"Retry-After": "1"} if server.failure_status == 429 else {}
+                    self._send_json(server.failure_status,
+                                    {"error": {"message": "Injected failure", "type": "stub"}},
+                                    headers)
+                    server._record(started, failed=True)
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                if body.get("stream"):
+                    self._stream(body)
+                else:
+                    self._complete(body)
+                server._record(started, failed=False)
+
+            def _tokens(self):
+                return [WORDS[i % len(WORDS)] + " " for i in range(server.completion_tokens)]
+
+            def _usage(self, body: Dict[str, Any]) -> Dict[str, int]:
+                prompt = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+                return {"prompt_tokens": prompt, "completion_tokens": server.completion_tokens,
+                        "total_tokens": prompt + server.completion_tokens}
+
+            def _complete(self, body):
+                tokens = self._tokens()
+                if server.token_rate:
+                    time.sleep(len(tokens) / server.token_rate)
+                self._send_json(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "".join(tokens)}}],
+                    "usage": self._usage(body),
+                })
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+                model = body.get("model", "stub")
+
+                def event(delta, finish_reason=None):
+                    return {"id": chunk_id, "object": "chat.completion.chunk",
+                            "created": int(time.time()), "model": model,
+                            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+                self._write_chunk(event({"role": "assistant", "content": ""}))
+                for token in self._tokens():
+                    if server.token_rate:
+                        time.sleep(1 / server.token_rate)
+                    self._write_chunk(event({"content": token}))
+                self._write_chunk(event({}, "stop"))
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    usage = {**event({}), "choices": [], "usage": self._usage(body)}
+                    self._write_chunk(usage)
+                self._write_raw(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, payload):
+                self._write_raw(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+            def _write_raw(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Tokens per second (0 = instant)")
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--failure-status", type=int, default=500)
+    args = parser.parse_args()
+
+    stub = StubLLMServer(args.host, args.port, args.latency, args.token_rate,
+                         args.completion_tokens, args.failure_rate, args.failure_status)
+    print(f"Stub LLM server listening on {stub.base_url}")
+    try:
+        stub._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
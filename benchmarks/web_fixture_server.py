@@ -0,0 +1,135 @@
+"""Local search engine and web pages for running the research tool offline.
+
+Serves a SearxNG-compatible ``GET /search?q=...&format=json`` whose results
+point at generated ``/page/<n>`` HTML documents. The pages carry navigation,
+scripts and footers around an ``<article>``, and every page sends an ETag and
+answers ``If-None-Match`` with 304. A configurable latency per page shows the
+effect of concurrent fetching.
+
+    python benchmarks/web_fixture_server.py --port 8200 --latency 0.3
+    SEARCH_URL=http://127.0.0.1:8200/search python content_creation_crew.py
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PARAGRAPH = ("Recent studies on {topic} report adoption growing by {n}% a year, with most "
+             "organisations citing cost, accuracy and regulation as the deciding factors. ")
+
+
+class WebFixtureServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 results: int = 5, paragraphs: int = 40):
+        self.latency = latency
+        self.results = results
+        self.paragraphs = paragraphs
+        self.stats = {"searches": 0, "pages": 0, "not_modified": 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def search_url(self) -> str:
+        return f"{self.base_url}/search"
+
+    def start(self) -> "WebFixtureServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def page(self, number: int) -> str:
+        topic = f"subject {number}"
+        body = "".join(
+            f"<p>{PARAGRAPH.format(topic=topic, n=(number * 7 + i) % 90 + 5)}</p>\n"
+            for i in range(self.paragraphs)
+        )
+        return (
+            f"<html><head><title>Report {number}</title><script>var tracking = 1;</script>"
+            f"<style>p {{ margin: 0 }}</style></head><body>"
+            f"<nav><a href='/'>Home</a> | <a href='/about'>About this very long navigation menu</a></nav>"
+            f"<header>Site header with a long slogan that is not part of the article text</header>"
+            f"<article><h1>Report {number}</h1>\n{body}</article>"
+            f"<footer>Copyright and a long list of links that should never reach the agent</footer>"
+            f"</body></html>"
+        )
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/search":
+                    server._count("searches")
+                    query = parse_qs(url.query).get("q", [""])[0]
+                    offset = int(hashlib.sha256(query.encode("utf-8")).hexdigest(), 16) % 3
+                    results = [
+                        {"url": f"{server.base_url}/page/{offset + i}", "title": f"Report {offset + i}",
+                         "content": f"Snippet {offset + i} about {query}"}
+                        for i in range(server.results)
+                    ]
+                    self._send(200, json.dumps({"query": query, "results": results}), "application/json")
+                elif url.path.startswith("/page/"):
+                    time.sleep(server.latency)
+                    html = server.page(int(url.path.rsplit("/", 1)[-1]))
+                    etag = '"' + hashlib.sha256(html.encode("utf-8")).hexdigest()[:16] + '"'
+                    if self.headers.get("If-None-Match") == etag:
+                        server._count("not_modified")
+                        self._send(304, "", None, {"ETag": etag})
+                        return
+                    server._count("pages")
+                    self._send(200, html, "text/html; charset=utf-8", {"ETag": etag})
+                else:
+                    self._send(404, "Not found", "text/plain")
+
+            def _send(self, status, text, content_type, headers=None):
+                data = text.encode("utf-8")
+                self.send_response(status)
+                if content_type:
+                    self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline search engine and pages for the research tool")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each page responds")
+    parser.add_argument("--results", type=int, default=5, help="Results per search")
+    args = parser.parse_args()
+
+    fixture = WebFixtureServer(args.host, args.port, args.latency, args.results)
+    print(f"Web fixture server listening on {fixture.base_url} (SEARCH_URL={fixture.search_url})")
+    try:
+        fixture._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
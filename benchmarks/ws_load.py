@@ -0,0 +1,320 @@
+"""Load generator for the backend ``/ws`` endpoint.
+
+Opens N dashboard clients and M producers, drives a fixed event rate through
+the broadcast path and reports end-to-end delivery latency (producer send to
+viewer receive), delivered messages/sec, server CPU/RSS and dropped
+connections. Either point it at a running backend or let it spawn one:
+
+    python benchmarks/ws_load.py --spawn --viewers 200 --producers 4 --rate 500 --duration 30
+    python benchmarks/ws_load.py --url ws://localhost:8000/ws --server-pid 12345
+
+CPU/RSS sampling reads ``/proc`` and is only available on Linux with a known
+server PID (``--spawn`` or ``--server-pid``).
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from batch_runner import percentile  # noqa: E402
+from wire_format import JSON, WireDecoder, WireEncoder  # noqa: E402
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+class ProcessSampler:
+    """Samples CPU% and RSS of a process from /proc while the load runs."""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.cpu: List[float] = []
+        self.rss_mb: List[float] = []
+
+    def available(self) -> bool:
+        return self.pid is not None and Path(f"/proc/{self.pid}/stat").exists()
+
+    def _cpu_seconds(self) -> float:
+        fields = Path(f"/proc/{self.pid}/stat").read_text().rsplit(")", 1)[1].split()
+        # utime and stime are fields 14 and 15 of the full line
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+    def _rss(self) -> float:
+        match = re.search(r"VmRSS:\s+(\d+) kB", Path(f"/proc/{self.pid}/status").read_text())
+        return int(match.group(1)) / 1024 if match else 0.0
+
+    async def run(self, stop: asyncio.Event):
+        if not self.available():
+            return
+        last_cpu, last_time = self._cpu_seconds(), time.monotonic()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                cpu, now = self._cpu_seconds(), time.monotonic()
+                self.cpu.append((cpu - last_cpu) / (now - last_time) * 100)
+                self.rss_mb.append(self._rss())
+                last_cpu, last_time = cpu, now
+            except (OSError, ValueError):
+                return
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.cpu:
+            return {"available": False}
+        return {
+            "available": True,
+            "cpu_pct_mean": round(sum(self.cpu) / len(self.cpu), 1),
+            "cpu_pct_max": round(max(self.cpu), 1),
+            "rss_mb_max": round(max(self.rss_mb), 1),
+            "rss_mb_end": round(self.rss_mb[-1], 1),
+        }
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.sent = 0
+        self.received = 0
+        self.bytes_received = 0
+        self.acks = 0
+        self.connect_failures = 0
+        self.dropped_connections = 0
+
+
+def connect(url: str, fmt: str):
+    return websockets.connect(url, max_size=None, subprotocols=[fmt] if fmt != JSON else None)
+
+
+async def viewer(url: str, fmt: str, stats: LoadStats, ready: asyncio.Event, stop: asyncio.Event):
+    """A dashboard client: records latency for every benchmark event it receives."""
+    try:
+        websocket = await connect(url, fmt)
+    except Exception:
+        stats.connect_failures += 1
+        return
+    decoder = WireDecoder(websocket.subprotocol)
+    ready.set()
+    try:
+        while not stop.is_set():
+            try:
+                data = await asyncio.wait_for(websocket.recv(), timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            stats.bytes_received += len(data)
+            for message in decoder.decode(data):
+                sent_at = message.get("bench_sent")
+                if sent_at is not None:
+                    stats.latencies.append(time.perf_counter() - sent_at)
+                    stats.received += 1
+    except websockets.ConnectionClosed:
+        if not stop.is_set():
+            stats.dropped_connections += 1
+    finally:
+        await websocket.close()
+
+
+async def producer(url: str, fmt: str, index: int, rate: float, batch: int, stats: LoadStats,
+                   stop: asyncio.Event):
+    """Sends monitor-shaped events at ``rate`` per second, ``batch`` per frame."""
+    try:
+        websocket = await connect(url, fmt)
+    except Exception:
+        stats.connect_failures += 1
+        return
+    encoder = WireEncoder(websocket.subprotocol)
+    decoder = WireDecoder(websocket.subprotocol)
+
+    async def drain():
+        # Producers are registered clients too: they receive acks and broadcasts
+        try:
+            async for data in websocket:
+                stats.acks += sum(1 for m in decoder.decode(data) if m.get("type") == "ack")
+        except websockets.ConnectionClosed:
+            if not stop.is_set():
+                stats.dropped_connections += 1
+
+    reader = asyncio.create_task(drain())
+    interval = batch / rate
+    next_send = time.perf_counter()
+    seq = 0
+    try:
+        while not stop.is_set():
+            messages = []
+            for _ in range(batch):
+                seq += 1
+                messages.append({
+                    "type": "status",
+                    "agent": f"Bench Producer {index}",
+                    "task": "Benchmark",
+                    "output": f"event {seq}",
+                    "status": "Working",
+                    "bench_sent": time.perf_counter(),
+                })
+            try:
+                await websocket.send(encoder.encode(messages))
+            except websockets.ConnectionClosed:
+                break
+            stats.sent += batch
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+    finally:
+        reader.cancel()
+        await websocket.close()
+
+
+def scrape_metric(url: str, name: str) -> Optional[float]:
+    """Read one unlabelled value from the backend's /metrics endpoint."""
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            text = response.read().decode("utf-8")
+    except OSError:
+        return None
+    match = re.search(rf"^{re.escape(name)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def metrics_url(ws_url: str) -> str:
+    return re.sub(r"^ws", "http", ws_url).rsplit("/ws", 1)[0] + "/metrics"
+
+
+async def run_load(args) -> Dict[str, Any]:
+    stats = LoadStats()
+    stop = asyncio.Event()
+    stop_producing = asyncio.Event()
+    sampler = ProcessSampler(args.server_pid)
+    drops_before = scrape_metric(metrics_url(args.url), "crew_ws_messages_dropped_total")
+
+    # Connect viewers in waves so the accept backlog is not the thing being measured
+    viewers = []
+    for start in range(0, args.viewers, 100):
+        wave = []
+        for _ in range(start, min(start + 100, args.viewers)):
+            ready = asyncio.Event()
+            viewers.append(asyncio.create_task(viewer(args.url, args.wire_format, stats, ready, stop)))
+            wave.append(ready)
+        await asyncio.wait([asyncio.create_task(r.wait()) for r in wave], timeout=10)
+    connected = args.viewers - stats.connect_failures
+
+    sampler_task = asyncio.create_task(sampler.run(stop))
+    per_producer = args.rate / args.producers
+    producers = [
+        asyncio.create_task(producer(args.url, args.wire_format, i, per_producer, args.batch, stats, stop_producing))
+        for i in range(args.producers)
+    ]
+    started = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    stop_producing.set()
+    elapsed = time.perf_counter() - started
+    # Let in-flight messages arrive before the viewers stop reading
+    await asyncio.sleep(args.drain)
+    stop.set()
+    await asyncio.gather(*producers, *viewers, sampler_task, return_exceptions=True)
+
+    drops_after = scrape_metric(metrics_url(args.url), "crew_ws_messages_dropped_total")
+    expected = stats.sent * connected
+    latencies_ms = [value * 1000 for value in stats.latencies]
+    return {
+        "config": {
+            "url": args.url, "viewers": args.viewers, "producers": args.producers,
+            "rate": args.rate, "batch": args.batch, "duration_s": args.duration,
+            "wire_format": args.wire_format,
+        },
+        "events_sent": stats.sent,
+        "events_per_s": round(stats.sent / elapsed, 1),
+        "deliveries": stats.received,
+        "deliveries_expected": expected,
+        "delivery_ratio": round(stats.received / expected, 4) if expected else 0.0,
+        "deliveries_per_s": round(stats.received / elapsed, 1),
+        "bytes_per_delivery": round(stats.bytes_received / stats.received, 1) if stats.received else 0.0,
+        "acks": stats.acks,
+        "latency_ms": {
+            "p50": round(percentile(latencies_ms, 50), 2),
+            "p95": round(percentile(latencies_ms, 95), 2),
+            "p99": round(percentile(latencies_ms, 99), 2),
+            "max": round(max(latencies_ms), 2) if latencies_ms else 0.0,
+        },
+        "connect_failures": stats.connect_failures,
+        "dropped_connections": stats.dropped_connections,
+        "server_messages_dropped": (
+            drops_after - drops_before
+            if drops_before is not None and drops_after is not None else None
+        ),
+        "server": sampler.summary(),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(port: int) -> subprocess.Popen:
+    """Start the backend with uvicorn and wait until it answers."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT / "backend",
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Backend exited during startup")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Backend did not start within 60s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the backend /ws broadcast path")
+    parser.add_argument("--url", default="ws://localhost:8000/ws")
+    parser.add_argument("--spawn", action="store_true", help="Start a backend on a free port")
+    parser.add_argument("--server-pid", type=int, help="Backend PID for CPU/RSS sampling")
+    parser.add_argument("--viewers", type=int, default=50, help="Dashboard clients")
+    parser.add_argument("--producers", type=int, default=1, help="Event producers")
+    parser.add_argument("--rate", type=float, default=100, help="Total events per second")
+    parser.add_argument("--batch", type=int, default=1, help="Events per producer frame")
+    parser.add_argument("--wire-format", default=JSON,
+                        help="json, crew-compact-json.v1 or crew-msgpack.v1")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load")
+    parser.add_argument("--drain", type=float, default=2, help="Seconds to wait for stragglers")
+    parser.add_argument("--output", help="Write results JSON to this file")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        port = free_port()
+        server = spawn_server(port)
+        args.url = f"ws://127.0.0.1:{port}/ws"
+        args.server_pid = server.pid
+    try:
+        results = asyncio.run(run_load(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
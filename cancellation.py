@@ -0,0 +1,227 @@
+"""Cooperative cancellation and deadlines for crew runs.
+
+Every backend job gets a ``CancelToken``, registered under its job id and
+carried in a contextvar into the thread that runs the crew. Each task runs
+under a child token that also has the task's deadline. The token is checked
+before and after each task. The LLM gateway also waits on it, so a
+cancelled or overdue job gives up its pending HTTP request, concurrency slot
+and rate-limit reservation straight away instead of when the crew finishes.
+
+Cancellation is cooperative. Code that holds no token (CLI runs, batch mode
+without deadlines) behaves exactly as before.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised inside a run whose job was cancelled or ran past a deadline."""
+
+    def __init__(self, reason: str = "Cancelled"):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """Thread-safe cancellation flag with an optional deadline (``time.monotonic()`` based).
+
+    A token created with ``parent`` is cancelled together with its parent,
+    and its deadline never extends past the parent's.
+    """
+
+    def __init__(self, deadline: Optional[float] = None, parent: Optional["CancelToken"] = None,
+                 label: str = "Job"):
+        self.label = label
+        self.parent = parent
+        self.reason: Optional[str] = None
+        self._deadline = deadline
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+        self._detach = parent.add_callback(self.cancel) if parent is not None else None
+
+    @property
+    def deadline(self) -> Optional[float]:
+        deadlines = [d for d in (self._deadline, self.parent.deadline if self.parent else None) if d]
+        return min(deadlines) if deadlines else None
+
+    def set_timeout(self, seconds: Optional[float]):
+        """Give the token a deadline ``seconds`` from now (0 or None removes it)."""
+        self._deadline = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline, or None without one."""
+        deadline = self.deadline
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        deadline = self.deadline
+        if deadline is not None and time.monotonic() >= deadline:
+            own = self._deadline is not None and self._deadline == deadline
+            self.cancel(f"{self.label if own else 'Job'} deadline exceeded")
+            return True
+        return False
+
+    def cancel(self, reason: str = "Cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(reason)
+            except Exception as e:
+                logger.error("Cancel callback failed: %s", e)
+
+    def add_callback(self, callback: Callable[[str], None]) -> Callable[[], None]:
+        """Call ``callback(reason)`` on cancellation (at once if already cancelled).
+        Returns a function that removes it again."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+
+                def remove():
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+
+                return remove
+        callback(self.reason)
+        return lambda: None
+
+    def detach(self):
+        """Stop following the parent; used when a child scope ends."""
+        if self._detach is not None:
+            self._detach()
+            self._detach = None
+
+    def check(self):
+        """Raise ``JobCancelled`` if the token was cancelled or its deadline has passed."""
+        if self.cancelled:
+            raise JobCancelled(self.reason)
+
+    def wait(self, seconds: float):
+        """Sleep up to ``seconds``, returning early with ``JobCancelled`` on cancellation or deadline."""
+        remaining = self.remaining()
+        timeout = seconds if remaining is None else min(seconds, remaining)
+        self._event.wait(max(0.0, timeout))
+        self.check()
+
+    def wait_for(self, future):
+        """Result of a ``concurrent.futures.Future``; raises ``JobCancelled`` instead of waiting
+        past cancellation or the deadline (the future itself keeps running)."""
+        done = threading.Event()
+        future.add_done_callback(lambda _: done.set())
+        remove = self.add_callback(lambda _: done.set())
+        try:
+            done.wait(self.remaining())
+        finally:
+            remove()
+        if not future.done():
+            self.check()
+            # Woken without being cancelled: only a deadline can do that, so check again
+            raise JobCancelled(self.reason or f"{self.label} deadline exceeded")
+        return future.result()
+
+
+# Token of the job (or task) executing in the current thread / async context
+current_token = contextvars.ContextVar("cancellation_current_token", default=None)
+
+_jobs: Dict[str, CancelToken] = {}
+_jobs_lock = threading.Lock()
+
+
+def register(job_id: str, timeout: Optional[float] = None) -> CancelToken:
+    """The token of ``job_id``, created on first use; ``timeout`` (seconds) sets its deadline."""
+    with _jobs_lock:
+        token = _jobs.get(job_id)
+        if token is None:
+            token = _jobs[job_id] = CancelToken(label="Job")
+    if timeout is not None:
+        token.set_timeout(timeout)
+    return token
+
+
+def release(job_id: str):
+    with _jobs_lock:
+        _jobs.pop(job_id, None)
+
+
+def cancel(job_id: str, reason: str = "Cancelled") -> bool:
+    """Cancel a job running in this process. Returns False if it has no token here."""
+    with _jobs_lock:
+        token = _jobs.get(job_id)
+    if token is None:
+        return False
+    logger.info("Cancelling job %s: %s", job_id, reason)
+    token.cancel(reason)
+    return True
+
+
+def check():
+    """Raise ``JobCancelled`` if the current context's token is cancelled."""
+    token = current_token.get()
+    if token is not None:
+        token.check()
+
+
+def sleep(seconds: float):
+    """``time.sleep`` that wakes up and raises when the current token is cancelled."""
+    token = current_token.get()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.wait(seconds)
+
+
+@contextmanager
+def scope(token: Optional[CancelToken]):
+    """Make ``token`` the current token for the block.
+
+    Errors raised because of a cancellation often reach here wrapped by the
+    LLM client or the agent (a connection error, say). Once the token is
+    cancelled they are re-raised as ``JobCancelled``.
+    """
+    reset = current_token.set(token)
+    try:
+        yield token
+    except JobCancelled:
+        raise
+    except Exception as e:
+        if token is not None and token.cancelled:
+            raise JobCancelled(token.reason) from e
+        raise
+    finally:
+        current_token.reset(reset)
+
+
+@contextmanager
+def deadline(seconds: Optional[float], label: str = "Task"):
+    """Run the block under a child of the current token that expires after ``seconds``.
+
+    Without a current token and without ``seconds`` this is a no-op.
+    """
+    parent = current_token.get()
+    if not seconds and parent is None:
+        yield None
+        return
+    token = CancelToken(time.monotonic() + seconds if seconds else None, parent, label)
+    try:
+        with scope(token):
+            token.check()
+            yield token
+            # Agents may swallow the error of an aborted call and carry on; do not let them
+            token.check()
+    finally:
+        token.detach()
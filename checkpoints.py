@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def output_text(output: Any) -> str:
+    """Plain text of a crewai TaskOutput across crewai versions."""
+    for attr in ("raw", "raw_output", "exported_output"):
+        value = getattr(output, attr, None)
+        if isinstance(value, str):
+            return value
+    return str(output)
+
+
+def agent_fingerprint(agent) -> dict:
+    llm = getattr(agent, "llm", None)
+    return {
+        "role": getattr(agent, "role", None),
+        "goal": getattr(agent, "goal", None),
+        "backstory": getattr(agent, "backstory", None),
+        "model": getattr(llm, "model_name", None) or getattr(llm, "model", None),
+    }
+
+
+def task_fingerprint(task) -> dict:
+    return {
+        "description": str(getattr(task, "description", "")),
+        "expected_output": str(getattr(task, "expected_output", "")),
+        "agent": agent_fingerprint(task.agent),
+    }
+
+
+class CheckpointStore:
+    """Per-stage task outputs stored as sharded JSON files.
+
+    Stage keys are chained: each one hashes the previous stage's key with the
+    task definition and agent config, so changing any upstream stage (or the
+    topic, which is part of the research task) invalidates everything after it.
+    """
+
+    def __init__(self, root: str = ".cache/checkpoints", research_ttl: float = 86400,
+                 resume_ttl: float = 86400):
+        self.root = Path(root)
+        self.research_ttl = research_ttl
+        self.resume_ttl = resume_ttl
+
+    @classmethod
+    def from_env(cls) -> Optional["CheckpointStore"]:
+        if os.environ.get("CHECKPOINTS", "on") == "off":
+            return None
+        return cls(
+            root=os.environ.get("CHECKPOINT_DIR", ".cache/checkpoints"),
+            research_ttl=float(os.environ.get("CHECKPOINT_RESEARCH_TTL", "86400")),
+            resume_ttl=float(os.environ.get("CHECKPOINT_RESUME_TTL", "86400")),
+        )
+
+    def stage_keys(self, tasks: List[Any]) -> List[str]:
+        keys = []
+        previous = ""
+        for task in tasks:
+            payload = json.dumps([previous, task_fingerprint(task)], sort_keys=True)
+            previous = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+            keys.append(previous)
+        return keys
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def load(self, key: str, max_age: Optional[float] = None) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if max_age is not None and time.time() - record["created_at"] > max_age:
+            return None
+        return record["output"]
+
+    def save(self, key: str, output: str, stage: str):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"stage": stage, "created_at": time.time(), "output": output}, f)
+        os.replace(tmp, path)
+
+    def discard(self, key: str):
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def completed_prefix(self, keys: List[str]) -> List[str]:
+        """Outputs of the leading stages that can be reused, in order.
+
+        The first stage (research) is reused for ``research_ttl`` by any run;
+        later stages only exist while a run that produced them has not yet
+        finished, and are reused for ``resume_ttl`` to resume that run.
+        """
+        outputs = []
+        for index, key in enumerate(keys):
+            max_age = self.research_ttl if index == 0 else self.resume_ttl
+            output = self.load(key, max_age=max_age)
+            if output is None:
+                break
+            outputs.append(output)
+        return outputs
+
+    def attach(self, task, key: str, stage: str):
+        """Save the task's output as a checkpoint as soon as it completes."""
+        previous_callback = getattr(task, "callback", None)
+
+        def save_checkpoint(output):
+            try:
+                self.save(key, output_text(output), stage)
+                logger.info("Saved %s checkpoint %s", stage, key[:12])
+            except OSError as e:
+                logger.error("Failed to save %s checkpoint: %s", stage, e)
+            if previous_callback is not None:
+                previous_callback(output)
+
+        task.callback = save_checkpoint
@@ -1,102 +1,306 @@
 from dotenv import load_dotenv
 import os
 import logging
+import threading
 import asyncio
 import json
 from datetime import datetime
+import cancellation
 import crewai_monitor
+import model_routing
+import profiling
+import telemetry
+from checkpoints import CheckpointStore, output_text
+from parallel_research import parallel_research_enabled, run_parallel_research
+from pipelined_writing import pipelined_writing_enabled, run_pipelined_writing
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Configure logging: records are queued and written by a background thread (LOG_LEVEL, LOG_QUEUE)
+telemetry.configure_logging()
 logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
 load_dotenv()
 
-def main(topic: str = "The Future of AI in Healthcare"):
-    try:
+# Default model of every stage; MODEL_ROUTES / MODEL_<STAGE> route stages elsewhere
+MODEL = "openai/gpt-4-turbo"
+
+def pipeline_config() -> dict:
+    """Settings that change what a run produces for a topic; equal configs give equivalent results."""
+    return {
+        "models": model_routing.ModelRouter.from_env(MODEL, create_llm).config(),
+        "research_mode": os.environ.get("RESEARCH_MODE", "single"),
+        "research_merge": os.environ.get("RESEARCH_MERGE", "concat"),
+        "research_tools": os.environ.get("RESEARCH_TOOLS", "on"),
+        "writing_mode": os.environ.get("WRITING_MODE", "sequential"),
+        "writing_stitch": os.environ.get("WRITING_STITCH", "llm"),
+        "context_budget": os.environ.get("CONTEXT_BUDGET", "on"),
+        "context_budget_writing": os.environ.get("CONTEXT_BUDGET_WRITING"),
+        "context_budget_editing": os.environ.get("CONTEXT_BUDGET_EDITING"),
+    }
+
+def create_llm(model: str = MODEL):
+    """Configure the LLM to use OpenRouter, with the local response cache.
+
+    Requests go through the process-wide LLM gateway (connection pool, rate
+    limits, concurrency caps and retries), so every client built here shares them.
+    """
+    from langchain_openai import ChatOpenAI
+    from llm_cache import get_llm_cache
+    from llm_gateway import get_gateway
+    from llm_metrics import LLMMetricsHandler
+    from llm_streaming import MonitorStreamHandler
+
+    callbacks = [LLMMetricsHandler(model)]
+    extra = {}
+    # Stream tokens to the dashboard as they are generated
+    if os.environ.get("LLM_STREAMING", "on") != "off":
+        extra["streaming"] = True
+        # Usage in the final chunk lets the gateway settle its token budget
+        extra["stream_usage"] = True
+        callbacks.append(MonitorStreamHandler())
+    return ChatOpenAI(
+        model=model,
+        openai_api_key=os.environ["OPENROUTER_API_KEY"],
+        openai_api_base=os.environ["OPENAI_API_BASE"],
+        default_headers={
+            "HTTP-Referer": "https://github.com/crewai",
+            "X-Title": "CrewAI Demo"
+        },
+        cache=get_llm_cache(),
+        callbacks=callbacks,
+        **get_gateway().client_kwargs(),
+        **extra
+    )
+
+class CrewRuntime:
+    """Everything a run needs that does not depend on the topic, built once.
+
+    Holds the imported crewai/agent/task modules, the model router with one
+    LLM client per routed model, and prebuilt agent templates. ``run`` then
+    only builds the tasks for a topic and kicks off the crew.
+    """
+
+    def __init__(self, llm=None):
         logger.info("Initializing CrewAI content creation pipeline...")
         
-        # Log CrewAI import
-        logger.info("Importing CrewAI components...")
+        # Setup steps go to the debug ring (GET /debug/events, or the log with LOG_LEVEL=DEBUG)
+        telemetry.debug("runtime", step="import_crewai")
         from crewai import Task, Crew
-        logger.info(f"CrewAI Task class available: {Task}")
+        telemetry.debug("runtime", step="crewai_imported", task_class=Task)
+        # Model cascades run beneath the monitor, so patch them in first
+        model_routing.patch_task(Task)
         
-        # Initialize monitoring with topic BEFORE importing CrewAI components
-        logger.info("Initializing monitoring system...")
-        crewai_monitor.init(topic=topic)
-        logger.info("Monitoring system initialized")
+        # Initialize monitoring BEFORE importing CrewAI components; patching happens once
+        telemetry.debug("runtime", step="init_monitor")
+        crewai_monitor.init(
+            stream_flush_interval=float(os.environ.get("MONITOR_STREAM_FLUSH_INTERVAL", "0.25")),
+            wire_format=os.environ.get("MONITOR_WIRE_FORMAT", "json"),
+            compression=os.environ.get("MONITOR_WS_COMPRESSION", "deflate")
+        )
         
         # Now import remaining components
-        logger.info("Importing remaining CrewAI components...")
-        from langchain_openai import ChatOpenAI
+        telemetry.debug("runtime", step="import_components")
+        from llm_cache import get_llm_cache
         from agents.research_agent import create_research_agent
         from agents.writer_agent import create_writer_agent
         from agents.editor_agent import create_editor_agent
-        from tasks.content_tasks import (
-            create_research_task,
-            create_writing_task,
-            create_editing_task
-        )
-        logger.info("All components imported successfully")
+        from tasks import content_tasks
+        telemetry.debug("runtime", step="components_imported")
         
-        # Configure the LLM to use OpenRouter
-        llm = ChatOpenAI(
-            model="openai/gpt-4-turbo",
-            openai_api_key=os.environ["OPENROUTER_API_KEY"],
-            openai_api_base=os.environ["OPENAI_API_BASE"],
-            model_kwargs={
-                "headers": {
-                    "HTTP-Referer": "https://github.com/crewai",
-                    "X-Title": "CrewAI Demo"
-                }
-            }
-        )
-        logger.info("LLM configured successfully")
+        self.Crew = Crew
+        self.tasks = content_tasks
+        # Every task runs under the deadline of its type (TASK_DEADLINES in content_tasks)
+        crewai_monitor.config["task_deadline"] = content_tasks.task_deadline
+        self.agent_factories = [create_research_agent, create_writer_agent, create_editor_agent]
+        
+        # Route each stage to its models, unless the caller pins one client for all of them
+        self.llm_cache = get_llm_cache()
+        if llm is not None:
+            model = getattr(llm, "model_name", None) or MODEL
+            self.router = model_routing.ModelRouter(
+                {stage: model_routing.Route([model]) for stage in model_routing.STAGES}, lambda _: llm
+            )
+        else:
+            self.router = model_routing.ModelRouter.from_env(MODEL, create_llm)
+        # Parallel research sub-crews use the research stage's first model
+        self.llm = self.router.llm(self.router.routes["research"].models[0])
+        logger.info("LLM routes configured: %s", {s: r.models for s, r in self.router.routes.items()})
+
+        # Create agent templates
+        self.agent_templates = [
+            self.router.create_agent(stage, factory)
+            for stage, factory in zip(model_routing.STAGES, self.agent_factories)
+        ]
+        telemetry.debug("runtime", step="agents_created")
 
-        # Create agents
-        logger.info("Creating agents...")
-        research_agent = create_research_agent(llm)
-        writer_agent = create_writer_agent(llm)
-        editor_agent = create_editor_agent(llm)
-        logger.info("Agents created successfully")
+    def create_agents(self):
+        """Fresh agents for one run, copied from the templates so runs share no state."""
+        agents = []
+        for stage, template, factory in zip(model_routing.STAGES, self.agent_templates, self.agent_factories):
+            copy = getattr(template, "copy", None)
+            agents.append(copy() if callable(copy) else self.router.create_agent(stage, factory))
+        return agents
+
+    def run(self, topic: str):
+        """Build the tasks for one topic and run the crew."""
+        research_agent, writer_agent, editor_agent = self.create_agents()
 
         # Create tasks with the specified topic
-        logger.info("Creating tasks...")
-        research_task = create_research_task(research_agent, topic)
-        writing_task = create_writing_task(writer_agent)
-        editing_task = create_editing_task(editor_agent)
-        logger.info("Tasks created successfully")
+        job_id = crewai_monitor.current_job.get()
+        research_task = self.tasks.create_research_task(research_agent, topic)
+        writing_task = self.tasks.create_writing_task(writer_agent)
+        editing_task = self.tasks.create_editing_task(editor_agent)
+        telemetry.debug("run", job_id=job_id, step="tasks_created", topic=topic)
 
-        # Create the crew
-        logger.info("Initializing crew...")
-        content_crew = Crew(
-            agents=[research_agent, writer_agent, editor_agent],
-            tasks=[research_task, writing_task, editing_task],
-            verbose=True
-        )
+        agents = [research_agent, writer_agent, editor_agent]
+        tasks = [research_task, writing_task, editing_task]
+        stages = ["research", "writing", "editing"]
 
-        logger.info("Crew initialized successfully")
+        # Resume from the last completed stage, reusing fresh research across runs
+        checkpoints = CheckpointStore.from_env()
+        keys = checkpoints.stage_keys(tasks) if checkpoints is not None else []
+        completed = []
+        if checkpoints is not None:
+            # The final stage is the result itself and is never checkpointed
+            completed = checkpoints.completed_prefix(keys[:-1])
 
+        # One monitored run covers parallel research, the crew and the pipelined mode;
+        # stages reused from checkpoints are reported as Done when it starts
+        completed_token = crewai_monitor.completed_agents.set(
+            tuple(crewai_monitor.get_task_info(task)[0] for task in tasks[:len(completed)])
+        )
         try:
-            # Execute the crew tasks
-            result = content_crew.kickoff()
-            return result
+            with crewai_monitor.monitored_run():
+                # Optionally research each focus area concurrently instead of in one long call
+                if not completed and parallel_research_enabled():
+                    completed = [run_parallel_research(topic, self.llm)]
+                    if checkpoints is not None:
+                        checkpoints.save(keys[0], completed[0], "research")
+
+                # Pipelined mode writes and edits section by section instead of the last two stages
+                if pipelined_writing_enabled() and len(completed) < 2:
+                    return self.run_pipelined(topic, research_task, writer_agent, completed, checkpoints, keys)
 
+                return self.run_crew(agents, tasks, stages, completed, checkpoints, keys)
         except Exception as e:
-            error_msg = f"Error during task execution: {str(e)}"
-            logger.error(error_msg)
+            logger.error("Error during task execution: %s", e)
             raise
+        finally:
+            crewai_monitor.completed_agents.reset(completed_token)
+
+    def run_crew(self, agents, tasks, stages, completed, checkpoints, keys):
+        """Run the stages not completed yet as one crew."""
+        job_id = crewai_monitor.current_job.get()
+        writer_agent, editor_agent = agents[1], agents[2]
+        if completed:
+            logger.info("Skipping completed stages: %s", stages[:len(completed)])
+            # Hand the last completed output to the first stage that still has to run
+            if len(completed) == 1:
+                tasks[1] = self.tasks.create_writing_task(writer_agent, completed[-1])
+            else:
+                tasks[2] = self.tasks.create_editing_task(editor_agent, completed[-1])
+        # Trim each stage's output to the next stage's context budget; checkpoints,
+        # attached after, wrap this callback and so still save the full output
+        for index in range(len(completed), len(tasks) - 1):
+            self.tasks.attach_context_budget(tasks[index], stages[index + 1])
+        if checkpoints is not None:
+            for index in range(len(completed), len(tasks) - 1):
+                checkpoints.attach(tasks[index], keys[index], stages[index])
+
+        # Create the crew
+        content_crew = self.Crew(
+            agents=agents[len(completed):],
+            tasks=tasks[len(completed):],
+            verbose=True
+        )
+        telemetry.debug("run", job_id=job_id, step="crew_created", stages=stages[len(completed):])
+
+        # Execute the crew tasks
+        result = content_crew.kickoff()
+        if checkpoints is not None:
+            # Intermediate stages are only kept to resume a failed run
+            for key in keys[1:-1]:
+                checkpoints.discard(key)
+        if self.llm_cache is not None:
+            telemetry.debug("run", job_id=job_id, step="finished", llm_cache=self.llm_cache.get_stats())
+        return result
+
+    def run_pipelined(self, topic: str, research_task, writer_agent, completed, checkpoints, keys):
+        """Research (unless reused), then write and edit section by section."""
+        if completed:
+            research = completed[0]
+        else:
+            if checkpoints is not None:
+                checkpoints.attach(research_task, keys[0], "research")
+            research_crew = self.Crew(agents=[research_task.agent], tasks=[research_task], verbose=True)
+            research = output_text(research_crew.kickoff())
+        research = self.tasks.budget_context(research, "writing")
+        return run_pipelined_writing(
+            topic, research, writer_agent,
+            lambda: self.router.create_agent("editing", self.agent_factories[2])
+        )
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+def get_runtime() -> CrewRuntime:
+    """Process-wide runtime, built on first use."""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = CrewRuntime()
+        return _runtime
+
+def main(topic: str = "The Future of AI in Healthcare", llm=None, runtime=None, job_id=None,
+         profile: bool = False):
+    try:
+        # Callers that run many topics (backend, batch mode) pass a warm runtime
+        if runtime is None:
+            runtime = CrewRuntime(llm=llm)
+        token = crewai_monitor.current_topic.set(topic)
+        job_token = crewai_monitor.current_job.set(job_id)
+        router_token = model_routing.current_router.set(runtime.router)
+        # Backend jobs can be cancelled by id; every run stops at the job deadline
+        deadline = runtime.tasks.job_deadline()
+        if job_id is not None:
+            cancel_token = cancellation.register(job_id, deadline)
+        else:
+            cancel_token = cancellation.CancelToken()
+            cancel_token.set_timeout(deadline)
+        try:
+            # Profiling samples the crew kickoffs and tasks of this run only
+            with cancellation.scope(cancel_token), profiling.profile(job_id, enabled=profile):
+                return runtime.run(topic)
+        finally:
+            if job_id is not None:
+                cancellation.release(job_id)
+            model_routing.current_router.reset(router_token)
+            crewai_monitor.current_job.reset(job_token)
+            crewai_monitor.current_topic.reset(token)
 
     except Exception as e:
-        error_msg = f"Error in content creation pipeline: {str(e)}"
-        logger.error(error_msg)
+        logger.error("Error in content creation pipeline: %s", e)
         raise
 
 if __name__ == "__main__":
-    import sys
-    topic = sys.argv[1] if len(sys.argv) > 1 else "The Future of AI in Healthcare"
-    main(topic) 
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate blog content with a CrewAI crew")
+    parser.add_argument("topic", nargs="?", default="The Future of AI in Healthcare")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="JSONL or CSV file of topics to generate concurrently")
+    parser.add_argument("--output", metavar="FILE", default="batch_results.jsonl",
+                        help="JSONL file that batch results are appended to")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Number of crews to run at once in batch mode")
+    parser.add_argument("--rpm", type=float, default=60,
+                        help="Global LLM request limit per minute in batch mode")
+    parser.add_argument("--profile", action="store_true",
+                        help="Sample the run's stacks and write a collapsed-stack profile to PROFILE_DIR")
+    args = parser.parse_args()
+
+    if args.batch:
+        from batch_runner import run_batch
+        run_batch(args.batch, args.output, concurrency=args.concurrency, rpm=args.rpm)
+    else:
+        main(args.topic, profile=args.profile)
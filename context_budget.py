@@ -0,0 +1,162 @@
+"""Token budgets for the context one pipeline stage hands to the next.
+
+The research summary is passed to the writer and the draft to the editor. A
+stage's budget caps how many tokens of that context it receives. Anything
+longer is compressed extractively: headings are kept, and each section keeps
+its highest-scoring sentences in their original order. Sentences score by
+how central their terms are to the whole text, with a bonus for numbers, so
+key points and statistics survive. No LLM call is involved.
+"""
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import crew_metrics
+import crewai_monitor
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a word-piece estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Default budgets: research handed to the writer is trimmed, the draft the editor
+# must reproduce is not (0 means unlimited)
+DEFAULT_BUDGETS = {"writing": 3000, "editing": 0}
+
+_HEADING = re.compile(r"^\s*(#{1,6}\s|\*\*[^*]+\*\*\s*$|[A-Z][^.!?]{0,80}:\s*$)")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+_WORD = re.compile(r"[a-z][a-z0-9'-]+")
+_PIECE = re.compile(r"\w+|[^\w\s]")
+_NUMBER = re.compile(r"\d")
+_STOPWORDS = frozenset("""
+    a about also an and are as at be been but by can could for from has have how in into is it
+    its may more most not of on or our such than that the their them these they this those to
+    was we were what when which while will with would you your
+""".split())
+
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and tiktoken is not None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # The encoding file is downloaded on first use; offline hosts estimate instead
+            _encoding_failed = True
+            logger.warning("tiktoken encoding unavailable, estimating token counts: %s", e)
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in ``text``: exact with tiktoken, else about one per four characters of each word."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(piece) / 4) for piece in _PIECE.findall(text))
+
+
+def split_sections(text: str) -> List[Tuple[Optional[str], List[str]]]:
+    """Markdown-ish sections as (heading, units); units are sentences and list items."""
+    sections: List[Tuple[Optional[str], List[str]]] = [(None, [])]
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if _HEADING.match(line):
+            sections.append((line.rstrip(), []))
+        elif line.lstrip().startswith(("-", "*", "+")) or re.match(r"\s*\d+[.)]\s", line):
+            sections[-1][1].append(line.rstrip())
+        else:
+            sections[-1][1].extend(s.strip() for s in _SENTENCE_END.split(line.strip()) if s.strip())
+    return [section for section in sections if section[0] or section[1]]
+
+
+def _terms(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+
+def compress(text: str, budget: int) -> str:
+    """Extract the most informative sentences of ``text`` that fit in ``budget`` tokens."""
+    if budget <= 0 or count_tokens(text) <= budget:
+        return text
+    sections = split_sections(text)
+    frequencies = Counter(term for _, units in sections for unit in units for term in _terms(unit))
+    if not frequencies:
+        return text[: budget * 4]
+
+    # Every section's heading goes in first, so what is kept stays organised by section
+    used = sum(count_tokens(heading) + 1 for heading, _ in sections if heading)
+    candidates = []
+    for s, (_, units) in enumerate(sections):
+        for u, unit in enumerate(units):
+            terms = _terms(unit)
+            score = sum(frequencies[term] for term in set(terms)) / math.sqrt(len(terms) + 1)
+            if _NUMBER.search(unit):
+                score *= 1.5
+            if u == 0:
+                # Opening sentences usually state the section's point
+                score *= 1.25
+            candidates.append((score, s, u, count_tokens(unit) + 1))
+
+    kept = set()
+    for score, s, u, cost in sorted(candidates, key=lambda c: -c[0]):
+        if used + cost <= budget:
+            kept.add((s, u))
+            used += cost
+    if not kept:
+        return text[: budget * 4]
+
+    lines = []
+    for s, (heading, units) in enumerate(sections):
+        selected = [unit for u, unit in enumerate(units) if (s, u) in kept]
+        if not selected:
+            continue
+        if heading:
+            lines.append(heading)
+        lines.extend(selected)
+    return "\n".join(lines)
+
+
+class ContextBudget:
+    """Per-stage token budgets for the context passed between pipeline stages."""
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None):
+        self.budgets = dict(DEFAULT_BUDGETS if budgets is None else budgets)
+
+    @classmethod
+    def from_env(cls) -> Optional["ContextBudget"]:
+        """Budgets from CONTEXT_BUDGET_WRITING and CONTEXT_BUDGET_EDITING; CONTEXT_BUDGET=off disables."""
+        if os.environ.get("CONTEXT_BUDGET", "on") == "off":
+            return None
+        return cls({
+            stage: int(os.environ.get(f"CONTEXT_BUDGET_{stage.upper()}", str(default)))
+            for stage, default in DEFAULT_BUDGETS.items()
+        })
+
+    def apply(self, stage: str, text: str) -> str:
+        """Fit the context for ``stage`` into its budget and report the token counts."""
+        budget = self.budgets.get(stage, 0)
+        if budget <= 0 or not text:
+            return text
+        before = count_tokens(text)
+        result = compress(text, budget)
+        after = count_tokens(result) if result is not text else before
+        crew_metrics.CONTEXT_TOKENS.inc(before, stage=stage, kind="before")
+        crew_metrics.CONTEXT_TOKENS.inc(after, stage=stage, kind="after")
+        if after < before:
+            logger.info("Compressed %s context from %s to %s tokens (budget %s)", stage, before, after, budget)
+        crewai_monitor.emit_event({
+            "type": "context",
+            "stage": stage,
+            "budget": budget,
+            "tokens_before": before,
+            "tokens_after": after
+        })
+        return result
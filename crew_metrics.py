@@ -0,0 +1,163 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+# Prometheus text exposition format content type
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+_registry: List["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        lines = super().render()
+        with self._lock:
+            values = self._values or ({(): 0} if not self.label_names else {})
+            for key, value in sorted(values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets: Sequence[float] = ()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], Dict[str, object]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.setdefault(
+                key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            )
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def totals(self, **labels) -> Tuple[int, float]:
+        """Observation count and sum for one label set."""
+        series = self._values.get(self._key(labels))
+        return (series["count"], series["sum"]) if series else (0, 0.0)
+
+    def render(self):
+        lines = super().render()
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    labels = _format_labels(self.label_names, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {series['sum']}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+TASK_DURATION = Histogram(
+    "crew_task_duration_seconds", "Duration of crew task executions.",
+    labels=("agent",), buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600),
+)
+TASK_ERRORS = Counter("crew_task_errors_total", "Crew task executions that raised.", labels=("agent",))
+LLM_CALLS = Counter("crew_llm_calls_total", "LLM requests made.", labels=("model",))
+LLM_TOKENS = Counter("crew_llm_tokens_total", "LLM tokens used.", labels=("model", "kind"))
+LLM_RETRIES = Counter(
+    "crew_llm_retries_total", "LLM requests retried by the gateway.", labels=("model", "reason")
+)
+LLM_THROTTLE_SECONDS = Counter(
+    "crew_llm_throttle_seconds_total", "Time LLM requests waited for rate limits.", labels=("model",)
+)
+CONTEXT_TOKENS = Counter(
+    "crew_context_tokens_total", "Tokens of context handed between stages, before and after budgeting.",
+    labels=("stage", "kind")
+)
+MODEL_ESCALATIONS = Counter(
+    "crew_model_escalations_total", "Tasks re-run on the next model of their cascade.", labels=("stage", "reason")
+)
+RESEARCH_FETCHES = Counter(
+    "crew_research_fetches_total", "Web research page loads by result.", labels=("result",)
+)
+LLM_CACHE_HITS = Counter("crew_llm_cache_hits_total", "LLM response cache hits.")
+LLM_CACHE_MISSES = Counter("crew_llm_cache_misses_total", "LLM response cache misses.")
+MONITOR_EVENTS_DROPPED = Counter(
+    "crew_monitor_events_dropped_total", "Monitor events dropped because the send queue was full."
+)
+WS_MESSAGES_DROPPED = Counter(
+    "crew_ws_messages_dropped_total", "Dashboard messages dropped or coalesced for slow clients."
+)
+JOBS_DEDUPLICATED = Counter(
+    "crew_jobs_deduplicated_total", "Start requests attached to an existing job.", labels=("match",)
+)
+JOBS_CANCELLED = Counter(
+    "crew_jobs_cancelled_total", "Jobs cancelled before finishing, by trigger.", labels=("reason",)
+)
+ACTIVE_JOBS = Gauge("crew_active_jobs", "Jobs currently running.")
+QUEUED_JOBS = Gauge("crew_queued_jobs", "Jobs waiting for a worker.")
+WEBSOCKET_CLIENTS = Gauge("crew_websocket_clients", "Connected WebSocket clients.")
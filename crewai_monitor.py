@@ -1,13 +1,22 @@
 import logging
-import asyncio
-import websockets
-import json
+import atexit
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from functools import wraps
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 import sys
 from types import MethodType
 
+import cancellation
+import crew_metrics
+import profiling
+import telemetry
+from monitor_transport import MonitorTransport
+
 logger = logging.getLogger(__name__)
 
 # Global configuration
@@ -15,25 +24,78 @@ config = {
     "ws_url": "ws://161.35.192.142:8000/ws",
     "initialized": False,
     "topic": None,
-    "websocket": None
+    "transport": None,
+    # Transport tuning: bounded queue size and micro-batching window
+    "queue_size": 1000,
+    "batch_size": 50,
+    "batch_interval": 0.05,
+    # Preferred wire format (json, crew-compact-json.v1 or crew-msgpack.v1) and
+    # WebSocket compression ("deflate" or None)
+    "wire_format": "json",
+    "compression": "deflate",
+    # Streamed LLM tokens are coalesced into one delta message per interval
+    "stream_flush_interval": 0.25,
+    # Deadline in seconds for a task of the given type (0 = none); set by the runtime
+    "task_deadline": lambda task_type: 0
 }
 
-async def send_status_update(message):
-    """Send status update to WebSocket server."""
-    if not config["initialized"]:
-        return
-    
-    # Log incoming message before any modification
-    logger.info(f"STATUS DEBUG - Original message: {json.dumps(message, indent=2)}")
-    
+# Agent whose task is executing in the current thread / async context
+current_agent = contextvars.ContextVar("crewai_monitor_current_agent", default=None)
+
+# Topic of the run executing in the current thread / async context
+current_topic = contextvars.ContextVar("crewai_monitor_current_topic", default=None)
+
+# Backend job the current run belongs to; stamped on events so they can be logged per job
+current_job = contextvars.ContextVar("crewai_monitor_current_job", default=None)
+
+# Set while running sub-crews of a larger pipeline; their kickoff is not a run of its own
+sub_crew = contextvars.ContextVar("crewai_monitor_sub_crew", default=False)
+
+# Model that served the task executing in the current context (set by model routing)
+served_model = contextvars.ContextVar("crewai_monitor_served_model", default=None)
+
+# Set inside a monitored run; crews kicked off within it do not report a run of their own
+run_active = contextvars.ContextVar("crewai_monitor_run_active", default=False)
+
+# Agents whose stage reports itself (see ``monitored_stage``); their tasks send no status of their own
+reported_stages = contextvars.ContextVar("crewai_monitor_reported_stages", default=frozenset())
+
+# Agents whose stage was already satisfied before kickoff (checkpoints, parallel research)
+completed_agents = contextvars.ContextVar("crewai_monitor_completed_agents", default=())
+
+# Task execution whose streamed tokens are buffered in the current context
+current_stream = contextvars.ContextVar("crewai_monitor_current_stream", default=None)
+_stream_ids = itertools.count(1)
+
+# Buffers of streamed tokens waiting to be flushed, keyed by (job id, agent, stream id)
+_streams: Dict[Tuple[Optional[str], str, Optional[int]], Dict[str, Any]] = {}
+_streams_lock = threading.Lock()
+
+def get_transport() -> MonitorTransport:
+    """Return the shared transport, creating and starting it on first use."""
+    transport = config["transport"]
+    if transport is None or transport.ws_url != config["ws_url"]:
+        if transport is not None:
+            transport.close()
+        transport = MonitorTransport(
+            config["ws_url"],
+            max_queue=config["queue_size"],
+            batch_size=config["batch_size"],
+            batch_interval=config["batch_interval"],
+            wire_format=config["wire_format"],
+            compression=config["compression"]
+        )
+        transport.start()
+        config["transport"] = transport
+    return transport
+
+def build_status_message(message):
+    """Normalize a raw status message into the format the UI expects."""
     # Get the status from the explicit status field or task field
     status = message.get("status", message.get("task"))
     if status == "Completed":
         status = "Done"  # Use "Done" for completed tasks in UI
     
-    # Track status transition
-    logger.info(f"STATUS DEBUG - Status normalized from '{message.get('task')}' to '{status}'")
-    
     # Get the original task type for active status
     agent_name = message.get("agent")
     
@@ -42,6 +104,7 @@ async def send_status_update(message):
         **message,
         "timestamp": datetime.now().isoformat(),
         "type": "status",
+        "job_id": message.get("job_id") or current_job.get(),
         "task": status,  # Use normalized status
         "agent_state": {
             "name": agent_name,
@@ -50,21 +113,105 @@ async def send_status_update(message):
         }
     }
     
-    logger.info(f"STATUS DEBUG - Final message to send: {json.dumps(enhanced_message, indent=2)}")
-        
+    # Kept in the debug ring (original status in "task" vs the normalized one); rendered only when read
+    telemetry.debug("status", job_id=enhanced_message["job_id"], original_task=message.get("task"),
+                    message=enhanced_message)
+    return enhanced_message
+
+def emit(message):
+    """Queue a status update for the background sender without blocking."""
+    if not config["initialized"]:
+        return
     try:
-        async with websockets.connect(config["ws_url"]) as websocket:
-            await websocket.send(json.dumps(enhanced_message))
-            logger.info(f"STATUS DEBUG - Successfully sent message for agent {agent_name} with status {status}")
+        get_transport().emit(build_status_message(message))
     except Exception as e:
-        logger.error(f"Failed to send status update: {str(e)}")
+        logger.error("Failed to send status update: %s", e)
 
-def sync_send_status(message):
-    """Synchronous wrapper for send_status_update."""
+def emit_event(message):
+    """Queue a non-status event (stamped with the current job) for the dashboard."""
+    if not config["initialized"]:
+        return
     try:
-        asyncio.run(send_status_update(message))
+        get_transport().emit({
+            **message,
+            "agent": message.get("agent") or current_agent.get() or "System",
+            "job_id": message.get("job_id") or current_job.get(),
+            "timestamp": datetime.now().isoformat()
+        })
     except Exception as e:
-        logger.error(f"Failed to send status update: {str(e)}")
+        logger.error("Failed to send event: %s", e)
+
+async def send_status_update(message):
+    """Send status update to WebSocket server."""
+    emit(message)
+
+def sync_send_status(message):
+    """Synchronous wrapper for send_status_update."""
+    emit(message)
+
+def _stream_key(agent_name: Optional[str] = None):
+    """Buffer key of the current task execution: (job id, agent, stream id)."""
+    return (current_job.get(), agent_name or current_agent.get() or "System", current_stream.get())
+
+def _take_delta(stream):
+    """Drain a token buffer into a delta message. Caller holds the lock."""
+    if not stream["buffer"]:
+        return None
+    stream["seq"] += 1
+    stream["last_flush"] = time.monotonic()
+    delta = {
+        "type": "delta",
+        "agent": stream["agent"],
+        "delta": "".join(stream["buffer"]),
+        "seq": stream["seq"],
+        "job_id": stream["job_id"],
+        "timestamp": datetime.now().isoformat()
+    }
+    stream["buffer"] = []
+    return delta
+
+def stream_token(token: str):
+    """Buffer a streamed LLM token and emit a delta once the flush interval has passed."""
+    if not config["initialized"] or not token:
+        return
+    key = _stream_key()
+    with _streams_lock:
+        stream = _streams.get(key)
+        if stream is None:
+            # The job is recorded now; the flush may run in another context
+            stream = _streams[key] = {
+                "job_id": key[0], "agent": key[1], "buffer": [], "seq": 0, "last_flush": time.monotonic()
+            }
+        stream["buffer"].append(token)
+        if time.monotonic() - stream["last_flush"] < config["stream_flush_interval"]:
+            return
+        delta = _take_delta(stream)
+    if delta:
+        get_transport().emit(delta)
+
+def flush_stream(agent_name: Optional[str] = None, close: bool = False):
+    """Emit whatever is left in the current task's token buffer (the current agent by default).
+
+    ``close`` also drops the buffer; the task wrappers pass it when the task ends.
+    """
+    if not config["initialized"]:
+        return
+    key = _stream_key(agent_name)
+    with _streams_lock:
+        stream = _streams.pop(key, None) if close else _streams.get(key)
+        delta = _take_delta(stream) if stream else None
+    if delta:
+        get_transport().emit(delta)
+
+def shutdown(timeout: float = 5.0):
+    """Flush pending status updates and close the monitor connection."""
+    transport = config["transport"]
+    if transport is None:
+        return
+    transport.close(timeout)
+    config["transport"] = None
+
+atexit.register(shutdown)
 
 def get_task_info(task):
     """Extract task and agent information."""
@@ -92,13 +239,121 @@ def get_task_info(task):
     else:
         task_type = "Processing"
     
-    logger.info(f"TASK DEBUG - Agent '{agent_name}' (role: '{agent_role}') resolved task type: '{task_type}'")
+    telemetry.debug("task_info", job_id=current_job.get(), agent=agent_name, role=agent_role,
+                    task_type=task_type)
     return agent_name, task_type
 
+@contextmanager
+def monitored_run():
+    """Report one pipeline run: Starting, stages reused from before, then Completed or Error.
+
+    Crew kickoffs report themselves this way; pipelines made of several crews
+    wrap them in one ``monitored_run`` so the run is reported once.
+    """
+    if not config["initialized"] or run_active.get():
+        yield
+        return
+
+    # Send start status
+    sync_send_status({
+        "agent": "System",
+        "task": "Starting",
+        "output": f"Beginning content creation for topic: {current_topic.get() or config['topic']}"
+    })
+    
+    # Stages completed outside this crew would otherwise look reset by "Starting"
+    for agent_name in completed_agents.get():
+        sync_send_status({
+            "agent": agent_name,
+            "task": "Done",
+            "output": "Reused completed output",
+            "status": "Done"
+        })
+    
+    token = run_active.set(True)
+    try:
+        yield
+    except cancellation.JobCancelled as e:
+        sync_send_status({
+            "agent": "System",
+            "task": "Cancelled",
+            "output": f"Content creation cancelled: {e.reason}"
+        })
+        raise
+    except Exception as e:
+        # Send error status
+        sync_send_status({
+            "agent": "System",
+            "task": "Error",
+            "output": f"Error in content creation: {str(e)}"
+        })
+        # What led up to the failure, from the debug ring
+        telemetry.dump(str(e), job_id=current_job.get())
+        raise
+    finally:
+        run_active.reset(token)
+    
+    # Send completion status
+    sync_send_status({
+        "agent": "System",
+        "task": "Completed",
+        "output": "Content creation process finished successfully"
+    })
+
+@contextmanager
+def monitored_stage(agent_name: str, task_type: str):
+    """Report several tasks of one agent as a single stage: one start, then Done, Cancelled or Error.
+
+    The tasks still run under their deadlines and stream their tokens, but
+    their own start/Done statuses would flip the agent's card once per task.
+    Stages of different agents may overlap and end in any order.
+    """
+    if not config["initialized"] or agent_name in reported_stages.get():
+        yield
+        return
+    sync_send_status({
+        "agent": agent_name,
+        "task": task_type,
+        "output": f"Starting {task_type.lower()} task",
+        "status": task_type
+    })
+    reported_stages.set(reported_stages.get() | {agent_name})
+    try:
+        yield
+    except cancellation.JobCancelled as e:
+        sync_send_status({
+            "agent": agent_name,
+            "task": "Cancelled",
+            "output": f"Cancelled {task_type.lower()} task: {e.reason}",
+            "status": "Cancelled"
+        })
+        raise
+    except Exception as e:
+        sync_send_status({
+            "agent": agent_name,
+            "task": "Error",
+            "output": f"Error in {task_type.lower()} task: {str(e)}",
+            "status": "Error"
+        })
+        raise
+    finally:
+        # Not reset(): another agent's stage may have started since and still be running
+        reported_stages.set(reported_stages.get() - {agent_name})
+    sync_send_status({
+        "agent": agent_name,
+        "task": "Done",
+        "output": f"Completed {task_type.lower()} task",
+        "status": "Done"
+    })
+
 def patch_crewai():
     """Patch CrewAI classes with monitoring capabilities."""
     from crewai import Task, Crew
     
+    # Patch only once per process; re-patching would stack monitoring wrappers
+    if getattr(Task.execute_sync, "_crewai_monitor_patched", False):
+        return Task, Crew
+    
     logger.info("Patching CrewAI Task methods...")
     
     # Store original methods
@@ -112,40 +367,71 @@ def patch_crewai():
             return await original_execute_async(self, *args, **kwargs)
             
         agent_name, task_type = get_task_info(self)
-        logger.info(f"EXECUTION DEBUG - Starting async execution for {agent_name}")
+        # Tasks of a stage that reports itself send no status of their own
+        report = agent_name not in reported_stages.get()
+        telemetry.debug("execute_async", job_id=current_job.get(), agent=agent_name, phase="start")
         
         # Send start status
-        sync_send_status({
-            "agent": agent_name,
-            "task": task_type,
-            "output": f"Starting {task_type.lower()} task",
-            "status": task_type  # Add explicit status field
-        })
+        if report:
+            emit({
+                "agent": agent_name,
+                "task": task_type,
+                "output": f"Starting {task_type.lower()} task",
+                "status": task_type  # Add explicit status field
+            })
         
+        agent_token = current_agent.set(agent_name)
+        stream_id_token = current_stream.set(next(_stream_ids))
+        model_token = served_model.set(None)
+        started = time.monotonic()
         try:
-            # Execute the task
-            result = await original_execute_async(self, *args, **kwargs)
+            # Execute the task under its deadline; cancelling the job aborts its LLM calls.
+            # Profiled runs tag this thread's samples with the task
+            with cancellation.deadline(config["task_deadline"](task_type), f"{task_type} task"), \
+                    profiling.track(f"{agent_name} / {task_type}"):
+                result = await original_execute_async(self, *args, **kwargs)
+            flush_stream(agent_name, close=True)
             
-            logger.info(f"EXECUTION DEBUG - Completed async execution for {agent_name}")
+            telemetry.debug("execute_async", job_id=current_job.get(), agent=agent_name, phase="done")
             # Send completion status
-            sync_send_status({
-                "agent": agent_name,
-                "task": "Done",  # Send Done directly instead of Completed
-                "output": f"Completed {task_type.lower()} task",
-                "status": "Done"  # Add explicit status field
-            })
+            if report:
+                emit({
+                    "agent": agent_name,
+                    "task": "Done",  # Send Done directly instead of Completed
+                    "output": f"Completed {task_type.lower()} task",
+                    "status": "Done",  # Add explicit status field
+                    "model": served_model.get()
+                })
             
             return result
+        except cancellation.JobCancelled as e:
+            flush_stream(agent_name, close=True)
+            if report:
+                emit({
+                    "agent": agent_name,
+                    "task": "Cancelled",
+                    "output": f"Cancelled {task_type.lower()} task: {e.reason}",
+                    "status": "Cancelled"
+                })
+            raise
         except Exception as e:
-            logger.error(f"EXECUTION DEBUG - Error in async execution for {agent_name}: {str(e)}")
+            flush_stream(agent_name, close=True)
+            crew_metrics.TASK_ERRORS.inc(agent=agent_name)
+            logger.error("EXECUTION DEBUG - Error in async execution for %s: %s", agent_name, e)
             # Send error status
-            sync_send_status({
-                "agent": agent_name,
-                "task": "Error",
-                "output": f"Error in {task_type.lower()} task: {str(e)}",
-                "status": "Error"  # Add explicit status field
-            })
+            if report:
+                emit({
+                    "agent": agent_name,
+                    "task": "Error",
+                    "output": f"Error in {task_type.lower()} task: {str(e)}",
+                    "status": "Error"  # Add explicit status field
+                })
             raise
+        finally:
+            crew_metrics.TASK_DURATION.observe(time.monotonic() - started, agent=agent_name)
+            served_model.reset(model_token)
+            current_stream.reset(stream_id_token)
+            current_agent.reset(agent_token)
     
     def monitored_execute_sync(self, *args, **kwargs):
         """Monitored version of sync task execution."""
@@ -153,71 +439,81 @@ def patch_crewai():
             return original_execute_sync(self, *args, **kwargs)
             
         agent_name, task_type = get_task_info(self)
+        # Tasks of a stage that reports itself send no status of their own
+        report = agent_name not in reported_stages.get()
         
         # Send start status
-        sync_send_status({
-            "agent": agent_name,
-            "task": task_type,
-            "output": f"Starting {task_type.lower()} task",
-            "status": task_type  # Add explicit status field
-        })
-        
-        try:
-            # Execute the task
-            result = original_execute_sync(self, *args, **kwargs)
-            
-            # Send completion status
-            sync_send_status({
-                "agent": agent_name,
-                "task": "Done",  # Send Done directly instead of Completed
-                "output": f"Completed {task_type.lower()} task",
-                "status": "Done"  # Add explicit status field
-            })
-            
-            return result
-        except Exception as e:
-            # Send error status
+        if report:
             sync_send_status({
                 "agent": agent_name,
-                "task": "Error",
-                "output": f"Error in {task_type.lower()} task: {str(e)}",
-                "status": "Error"  # Add explicit status field
+                "task": task_type,
+                "output": f"Starting {task_type.lower()} task",
+                "status": task_type  # Add explicit status field
             })
-            raise
-    
-    def monitored_crew_kickoff(self, *args, **kwargs):
-        """Monitored version of Crew kickoff."""
-        if not config["initialized"]:
-            return original_crew_kickoff(self, *args, **kwargs)
-            
-        # Send start status
-        sync_send_status({
-            "agent": "System",
-            "task": "Starting",
-            "output": f"Beginning content creation for topic: {config['topic']}"
-        })
         
+        agent_token = current_agent.set(agent_name)
+        stream_id_token = current_stream.set(next(_stream_ids))
+        model_token = served_model.set(None)
+        started = time.monotonic()
         try:
-            # Execute the crew tasks
-            result = original_crew_kickoff(self, *args, **kwargs)
+            # Execute the task under its deadline; cancelling the job aborts its LLM calls.
+            # Profiled runs tag this thread's samples with the task
+            with cancellation.deadline(config["task_deadline"](task_type), f"{task_type} task"), \
+                    profiling.track(f"{agent_name} / {task_type}"):
+                result = original_execute_sync(self, *args, **kwargs)
+            flush_stream(agent_name, close=True)
             
             # Send completion status
-            sync_send_status({
-                "agent": "System",
-                "task": "Completed",
-                "output": "Content creation process finished successfully"
-            })
+            if report:
+                sync_send_status({
+                    "agent": agent_name,
+                    "task": "Done",  # Send Done directly instead of Completed
+                    "output": f"Completed {task_type.lower()} task",
+                    "status": "Done",  # Add explicit status field
+                    "model": served_model.get()
+                })
             
             return result
+        except cancellation.JobCancelled as e:
+            flush_stream(agent_name, close=True)
+            if report:
+                sync_send_status({
+                    "agent": agent_name,
+                    "task": "Cancelled",
+                    "output": f"Cancelled {task_type.lower()} task: {e.reason}",
+                    "status": "Cancelled"
+                })
+            raise
         except Exception as e:
+            flush_stream(agent_name, close=True)
+            crew_metrics.TASK_ERRORS.inc(agent=agent_name)
             # Send error status
-            sync_send_status({
-                "agent": "System",
-                "task": "Error",
-                "output": f"Error in content creation: {str(e)}"
-            })
+            if report:
+                sync_send_status({
+                    "agent": agent_name,
+                    "task": "Error",
+                    "output": f"Error in {task_type.lower()} task: {str(e)}",
+                    "status": "Error"  # Add explicit status field
+                })
             raise
+        finally:
+            crew_metrics.TASK_DURATION.observe(time.monotonic() - started, agent=agent_name)
+            served_model.reset(model_token)
+            current_stream.reset(stream_id_token)
+            current_agent.reset(agent_token)
+    
+    def monitored_crew_kickoff(self, *args, **kwargs):
+        """Monitored version of Crew kickoff."""
+        # Profiled runs sample the kickoff thread between tasks too
+        with profiling.track("Crew kickoff"):
+            if not config["initialized"] or sub_crew.get() or run_active.get():
+                return original_crew_kickoff(self, *args, **kwargs)
+            with monitored_run():
+                return original_crew_kickoff(self, *args, **kwargs)
 
+    for wrapper in (monitored_execute_async, monitored_execute_sync, monitored_crew_kickoff):
+        wrapper._crewai_monitor_patched = True
+    
     # Patch the classes with the monitored versions
     Task.execute_async = monitored_execute_async
     Task.execute_sync = monitored_execute_sync
@@ -226,12 +522,20 @@ def patch_crewai():
     logger.info("Successfully patched CrewAI Task and Crew methods")
     return Task, Crew
 
-def init(ws_url: Optional[str] = None, topic: Optional[str] = None):
+def init(ws_url: Optional[str] = None, topic: Optional[str] = None,
+         stream_flush_interval: Optional[float] = None, wire_format: Optional[str] = None,
+         compression: Optional[str] = None):
     """Initialize the monitoring system."""
     if ws_url:
         config["ws_url"] = ws_url
     if topic:
         config["topic"] = topic
+    if stream_flush_interval is not None:
+        config["stream_flush_interval"] = stream_flush_interval
+    if wire_format:
+        config["wire_format"] = wire_format
+    if compression:
+        config["compression"] = None if compression == "none" else compression
     
     # Patch CrewAI classes
     patch_crewai()
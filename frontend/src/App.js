@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import './App.css';
 
 const AGENT_CONFIG = {
@@ -29,6 +29,20 @@ function App() {
   const [isRunning, setIsRunning] = useState(false);
   const [topic, setTopic] = useState('');
   const [agents, setAgents] = useState(AGENT_CONFIG);
+  const [streams, setStreams] = useState({});
+  // Offset of the last logged event seen, so a reconnect can resume from it
+  const lastOffset = useRef(null);
+  // Job whose agents the cards show (the most recently started one)
+  const currentJob = useRef(null);
+  const socketRef = useRef(null);
+
+  // Tell the server which job this dashboard shows; a job nobody watches is cancelled
+  const watchJob = (jobId) => {
+    const ws = socketRef.current;
+    if (jobId && ws && ws.readyState === WebSocket.OPEN) {
+      ws.send(JSON.stringify({ type: 'watch', job_id: jobId }));
+    }
+  };
 
   // Group messages by agent and phase
   const groupedMessages = messages.reduce((acc, msg) => {
@@ -49,79 +63,127 @@ function App() {
   }, {});
 
   useEffect(() => {
+    // Server agent states mapped to the labels the cards display
+    const displayStatus = (state) => {
+      if (state.status === 'Active') return state.activity || 'Active';
+      if (state.status === 'Done') return 'Completed';
+      return state.status;
+    };
+
+    const applyAgents = (agentStates, reset) => {
+      setAgents(prev => {
+        const newAgents = reset ? { ...AGENT_CONFIG } : { ...prev };
+        Object.entries(agentStates).forEach(([name, state]) => {
+          if (name in AGENT_CONFIG && state.status) {
+            newAgents[name] = { ...newAgents[name], status: displayStatus(state) };
+          }
+        });
+        return newAgents;
+      });
+    };
+
+    const appendStreams = (agentStates) => {
+      const deltas = Object.entries(agentStates).filter(([, state]) => state.delta);
+      if (deltas.length === 0) return;
+      setStreams(prev => {
+        const next = { ...prev };
+        deltas.forEach(([name, state]) => {
+          next[name] = (next[name] || '') + state.delta;
+        });
+        return next;
+      });
+    };
+
+    // The backend keeps the authoritative state; the first frame is a full snapshot
+    const applySnapshot = (snapshot) => {
+      const jobs = snapshot.jobs.filter(job => job.job_id !== '_global');
+      const job = jobs[jobs.length - 1];
+      if (!job) return;
+      if (job.job_id !== currentJob.current) {
+        currentJob.current = job.job_id;
+        watchJob(job.job_id);
+      }
+      applyAgents(job.agents, true);
+      setIsRunning(job.status === 'Running');
+    };
+
+    // Diffs carry only what changed since the previous tick
+    const applyDiff = (diff) => {
+      const entries = [];
+      Object.entries(diff.jobs).forEach(([jobId, job]) => {
+        if (jobId === '_global') return;
+        const isNewRun = job.output !== undefined && job.status === 'Running' &&
+          jobId !== currentJob.current;
+        if (isNewRun) {
+          currentJob.current = jobId;
+          watchJob(jobId);
+          setStreams({});
+        }
+        if (jobId !== currentJob.current) return;
+
+        if (job.output !== undefined) {
+          entries.push({ agent: 'System', task: job.status, output: job.output, timestamp: job.updated });
+        }
+        // Context budget savings between stages
+        Object.entries(job.context || {}).forEach(([stage, counts]) => {
+          entries.push({
+            agent: 'System',
+            task: 'Context',
+            output: `${stage} context: ${counts.tokens_before} -> ${counts.tokens_after} tokens (budget ${counts.budget})`,
+            timestamp: diff.timestamp
+          });
+        });
+        const agentStates = job.agents || {};
+        applyAgents(agentStates, isNewRun);
+        appendStreams(agentStates);
+        Object.entries(agentStates).forEach(([name, state]) => {
+          if (state.status) {
+            const output = state.model ? `${state.output} [${state.model}]` : state.output;
+            entries.push({ agent: name, task: displayStatus(state), output, timestamp: state.updated });
+          }
+        });
+        setIsRunning(job.status === 'Running');
+      });
+      lastOffset.current = Math.max(lastOffset.current || 0, diff.offset);
+      if (entries.length > 0) {
+        setMessages(prev => [...prev, ...entries]);
+      }
+    };
+
     const connectWebSocket = () => {
-      const ws = new WebSocket('ws://161.35.192.142:8000/ws');
+      const resume = lastOffset.current !== null ? `&after=${lastOffset.current}` : '';
+      const ws = new WebSocket(`ws://161.35.192.142:8000/ws?mode=state${resume}`);
       
       ws.onopen = () => {
         console.log('Connected to WebSocket');
         setConnectionStatus('Connected to monitoring server');
         setSocket(ws);
+        socketRef.current = ws;
+        watchJob(currentJob.current);
       };
 
       ws.onmessage = (event) => {
         const data = JSON.parse(event.data);
-        
-        // Skip acknowledgment messages
-        if (data.type === 'ack') return;
-        
-        // Update agent status based on the message
-        if (data.agent in AGENT_CONFIG) {
-          setAgents(prev => {
-            const newAgents = { ...prev };
-            
-            // Update the current agent's status
-            if (data.task === 'Starting' || data.task === 'Researching' || data.task === 'Writing' || data.task === 'Editing') {
-              newAgents[data.agent] = {
-                ...newAgents[data.agent],
-                status: data.task
-              };
-            } else if (data.task === 'Completed') {
-              newAgents[data.agent] = {
-                ...newAgents[data.agent],
-                status: 'Completed'
-              };
-              
-              // Set next agent to active if it exists
-              const agentOrder = ['Research Agent', 'Writer Agent', 'Editor Agent'];
-              const currentIndex = agentOrder.indexOf(data.agent);
-              if (currentIndex < agentOrder.length - 1) {
-                const nextAgent = agentOrder[currentIndex + 1];
-                newAgents[nextAgent] = {
-                  ...newAgents[nextAgent],
-                  status: 'Starting'
-                };
-              }
-            }
-            
-            return newAgents;
-          });
-          setIsRunning(true);
-        }
-        
-        // Handle system messages
-        if (data.agent === 'System') {
-          if (data.task === 'Starting') {
-            // Reset all agents to waiting except Research Agent
-            setAgents(prev => {
-              const newAgents = { ...prev };
-              Object.keys(newAgents).forEach(agent => {
-                newAgents[agent] = {
-                  ...newAgents[agent],
-                  status: agent === 'Research Agent' ? 'Starting' : 'Waiting'
-                };
-              });
-              return newAgents;
-            });
-            setIsRunning(true);
-          } else if (data.task === 'Completed' || data.task === 'Error') {
-            // Reset all agents to waiting
-            setAgents(AGENT_CONFIG);
-            setIsRunning(false);
+
+        if (data.type === 'snapshot') {
+          applySnapshot(data);
+        } else if (data.type === 'diff') {
+          applyDiff(data);
+        } else if (data.type === 'replay') {
+          // Log entries missed while disconnected; agent state comes from the snapshot
+          const missed = data.events.filter(e =>
+            e.type !== 'delta' && (lastOffset.current === null || e.offset > lastOffset.current));
+          if (missed.length > 0) {
+            lastOffset.current = missed[missed.length - 1].offset;
+            setMessages(prev => [...prev, ...missed]);
           }
+        } else if (data.task === 'Connection') {
+          // The connection notice carries the current log offset
+          if (lastOffset.current === null) {
+            lastOffset.current = data.log_offset || 0;
+          }
+          setMessages(prev => [...prev, data]);
         }
-        
-        // Add message to log
-        setMessages(prev => [...prev, data]);
       };
 
       ws.onerror = (error) => {
@@ -155,6 +217,7 @@ function App() {
     try {
       setIsRunning(true);
       setMessages([]);
+      setStreams({});
       const response = await fetch('http://161.35.192.142:8000/start', {
         method: 'POST',
         headers: {
@@ -166,6 +229,17 @@ function App() {
       if (!response.ok) {
         throw new Error('Failed to start CrewAI');
       }
+      // An identical topic that is already running (or just finished) is shared, not restarted
+      const data = await response.json();
+      currentJob.current = data.job_id;
+      watchJob(data.job_id);
+      if (data.status === 'attached') {
+        if (data.state === 'completed') {
+          const job = await (await fetch(`http://161.35.192.142:8000/jobs/${data.job_id}`)).json();
+          setMessages([{ agent: 'System', task: 'Completed', output: job.result, timestamp: job.finished_at }]);
+          setIsRunning(false);
+        }
+      }
     } catch (error) {
       console.error('Error starting CrewAI:', error);
       setIsRunning(false);
@@ -173,8 +247,18 @@ function App() {
     }
   };
 
+  const handleCancel = async () => {
+    if (!currentJob.current) return;
+    try {
+      await fetch(`http://161.35.192.142:8000/jobs/${currentJob.current}/cancel`, { method: 'POST' });
+    } catch (error) {
+      console.error('Error cancelling job:', error);
+    }
+  };
+
   const handleClearLogs = () => {
     setMessages([]);
+    setStreams({});
     setAgents(AGENT_CONFIG);
   };
 
@@ -226,6 +310,13 @@ function App() {
           >
             {isRunning ? 'Running...' : 'Start CrewAI'}
           </button>
+          <button
+            onClick={handleCancel}
+            disabled={!isRunning}
+            className="control-button clear"
+          >
+            Cancel
+          </button>
           <button
             onClick={handleClearLogs}
             disabled={isRunning || messages.length === 0}
@@ -243,7 +334,7 @@ function App() {
               const isActive = agent.status !== 'idle' && agent.status !== 'Waiting';
               const statusClass = 
                 agent.status === 'Completed' ? 'completed' :
-                agent.status === 'Error' ? 'error' :
+                agent.status === 'Error' || agent.status === 'Cancelled' ? 'error' :
                 isActive ? 'active' : '';
               
               return (
@@ -255,6 +346,9 @@ function App() {
                     <div className={`agent-status ${statusClass}`}>
                       {agent.status === 'idle' ? 'Waiting' : agent.status}
                     </div>
+                    {streams[name] && (
+                      <pre className="agent-stream">{streams[name].slice(-600)}</pre>
+                    )}
                   </div>
                   {index < Object.entries(agents).length - 1 && (
                     <div className={`workflow-arrow ${isActive ? 'active' : ''}`}>→</div>
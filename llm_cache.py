@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+import crew_metrics
+
+logger = logging.getLogger(__name__)
+
+# Cache modes
+OFF = "off"
+READ_THROUGH = "read_through"  # serve hits, call the API and store on misses
+RECORD = "record"              # always call the API, store every response
+REPLAY = "replay"              # serve hits only, fail on misses (offline demos)
+MODES = (OFF, READ_THROUGH, RECORD, REPLAY)
+
+# Message fields besides type and content that are part of the cache key
+_KEY_FIELDS = ("name", "tool_calls", "tool_call_id", "additional_kwargs")
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a prompt has no recorded response."""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Reduce a serialized message list to the parts that affect the response."""
+    try:
+        messages = json.loads(prompt)
+    except (TypeError, ValueError):
+        return prompt.strip()
+    if not isinstance(messages, list):
+        return json.dumps(messages, sort_keys=True)
+
+    normalized = []
+    for message in messages:
+        if not isinstance(message, dict) or "kwargs" not in message:
+            normalized.append(message)
+            continue
+        kwargs = message["kwargs"]
+        content = kwargs.get("content")
+        if isinstance(content, str):
+            content = "\n".join(line.rstrip() for line in content.strip().splitlines())
+        entry = [kwargs.get("type"), content]
+        # Tool calls and their results change the response as much as the text does
+        extra = {field: kwargs[field] for field in _KEY_FIELDS if kwargs.get(field)}
+        if extra:
+            entry.append(extra)
+        normalized.append(entry)
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """Content address for a request: model + parameters + normalized messages."""
+    digest = hashlib.sha256()
+    digest.update(llm_string.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_prompt(prompt).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SQLiteStore:
+    """Key/value store with TTL and size-bounded LRU eviction.
+
+    Any object with the same ``get``/``put``/``clear`` methods can be passed
+    to ``ResponseCache`` instead.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                   key TEXT PRIMARY KEY,
+                   value TEXT NOT NULL,
+                   size INTEGER NOT NULL,
+                   created_at REAL NOT NULL,
+                   accessed_at REAL NOT NULL
+               )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return value
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def _evict(self):
+        if self.ttl is not None:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self.evictions += cursor.rowcount
+        if self.max_bytes is None:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ).fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class ResponseCache(BaseCache):
+    """LangChain cache that stores chat completions in a local store.
+
+    Pass an instance as ``cache=`` to ``ChatOpenAI``. Hits and misses are
+    counted in ``stats``.
+    """
+
+    def __init__(self, store, mode: str = READ_THROUGH):
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM cache mode: {mode}")
+        self.store = store
+        self.mode = mode
+        self.stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Any]]:
+        if self.mode in (OFF, RECORD):
+            return None
+        value = self.store.get(cache_key(prompt, llm_string))
+        if value is None:
+            self.stats["misses"] += 1
+            crew_metrics.LLM_CACHE_MISSES.inc()
+            if self.mode == REPLAY:
+                raise CacheMiss("No recorded LLM response for this prompt (replay mode)")
+            return None
+        self.stats["hits"] += 1
+        crew_metrics.LLM_CACHE_HITS.inc()
+        return [loads(generation) for generation in json.loads(value)]
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Any]):
+        if self.mode in (OFF, REPLAY):
+            return
+        value = json.dumps([dumps(generation) for generation in return_val])
+        self.store.put(cache_key(prompt, llm_string), value)
+        self.stats["writes"] += 1
+
+    def clear(self, **kwargs: Any):
+        self.store.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "evictions": getattr(self.store, "evictions", 0),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "mode": self.mode,
+        }
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_llm_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache configured from the environment."""
+    global _cache
+    mode = os.environ.get("LLM_CACHE_MODE", READ_THROUGH)
+    if mode == OFF:
+        return None
+    if _cache is None or _cache.mode != mode:
+        ttl = os.environ.get("LLM_CACHE_TTL")
+        max_mb = os.environ.get("LLM_CACHE_MAX_MB")
+        store = SQLiteStore(
+            os.environ.get("LLM_CACHE_PATH", ".cache/llm_responses.sqlite"),
+            ttl=float(ttl) if ttl else None,
+            max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+        )
+        _cache = ResponseCache(store, mode=mode)
+        logger.info("LLM response cache enabled (%s) at %s", mode, store.path)
+    return _cache
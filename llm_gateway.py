@@ -0,0 +1,505 @@
+"""Process-wide gateway for OpenRouter / OpenAI-compatible chat completion calls.
+
+Every LLM client built by ``create_llm`` shares one ``LLMGateway``. Its HTTP
+transport sits under the openai SDK and provides:
+
+- one keep-alive connection pool shared by all agents and crews in the process
+- per-model token buckets for requests per minute and tokens per minute
+- a per-model cap on concurrent requests
+- coordinated retries. On 429/5xx or a connection error, the request is
+  retried with jittered exponential backoff. ``Retry-After`` is honoured, and
+  it also pauses every other request to the same model, so concurrent crews
+  back off together instead of retrying in a storm.
+- cancellation. Inside a cancelled job or past a deadline (see
+  ``cancellation``), a request stops waiting for admission or for the
+  response. It then frees its concurrency slot and reserved tokens, and
+  raises ``JobCancelled``. Per-request timeouts are capped at the time left
+  before the deadline.
+
+The SDK's own retries are disabled so there is exactly one retry policy.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import httpx
+
+import cancellation
+import crew_metrics
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Tokens reserved for the completion when a request does not set max_tokens
+DEFAULT_COMPLETION_ESTIMATE = 1000
+
+
+class TokenBucket:
+    """Thread-safe token bucket. ``rate`` is tokens per second; 0 disables it.
+
+    Reservations may push the balance below zero (a large request is let
+    through once and paid back over time). ``adjust`` settles the difference
+    once the real cost is known.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` tokens and return how long the caller must wait before using them."""
+        if not self.rate:
+            return max(0.0, self._paused_until - time.monotonic())
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Requests bigger than the bucket are allowed once it is full
+            needed = min(amount, self.capacity)
+            wait = 0.0 if self._tokens >= needed else (needed - self._tokens) / self.rate
+            self._tokens -= amount
+            return max(wait, self._paused_until - now)
+
+    def adjust(self, amount: float):
+        """Give back (positive) or charge (negative) tokens after the fact."""
+        if not self.rate:
+            return
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def pause(self, seconds: float):
+        """Hold every reservation until ``seconds`` from now (upstream said Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class ModelLimits:
+    """Request, token and concurrency limits for one model."""
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, concurrency: int = 0):
+        self.requests = TokenBucket(rpm / 60, max(1.0, rpm / 60 * 10)) if rpm else TokenBucket(0, 0)
+        self.tokens = TokenBucket(tpm / 60, tpm / 6) if tpm else TokenBucket(0, 0)
+        self.semaphore = threading.BoundedSemaphore(concurrency) if concurrency else None
+
+    def pause(self, seconds: float):
+        self.requests.pause(seconds)
+
+
+def estimate_tokens(body: Dict[str, Any]) -> int:
+    """Rough token cost of a chat completion request (about four characters per token)."""
+    chars = sum(len(str(message.get("content") or "")) for message in body.get("messages", []))
+    completion = body.get("max_tokens") or body.get("max_completion_tokens") or DEFAULT_COMPLETION_ESTIMATE
+    return chars // 4 + int(completion)
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), if any."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _cap_timeout(request: httpx.Request, seconds: float):
+    """Lower every timeout of ``request`` to ``seconds`` (the time left before a deadline)."""
+    seconds = max(seconds, 0.001)
+    timeouts = dict(request.extensions.get("timeout") or {})
+    for name in ("connect", "read", "write", "pool"):
+        value = timeouts.get(name)
+        timeouts[name] = seconds if value is None else min(value, seconds)
+    request.extensions["timeout"] = timeouts
+
+
+def _close_late_response(future):
+    """Close a response that arrived after its caller was cancelled."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _usage_tokens(data: bytes) -> Optional[int]:
+    """total_tokens from a JSON body or the last SSE chunk that carries usage."""
+    for line in reversed(data.splitlines()):
+        line = line.strip()
+        if line.startswith(b"data:"):
+            line = line[5:].strip()
+        if b'"usage"' not in line:
+            continue
+        try:
+            usage = json.loads(line).get("usage") or {}
+        except ValueError:
+            continue
+        if usage.get("total_tokens"):
+            return usage["total_tokens"]
+    return None
+
+
+class _Call:
+    """Bookkeeping for one logical request across retries."""
+
+    def __init__(self, gateway: "LLMGateway", request: httpx.Request):
+        self.gateway = gateway
+        body = {}
+        if request.method == "POST":
+            try:
+                body = json.loads(request.content or b"{}")
+            except ValueError:
+                pass
+        self.model = body.get("model", "unknown")
+        self.limits = gateway.limits(self.model)
+        self.estimate = estimate_tokens(body) if body.get("messages") else 0
+
+    def admission_delay(self) -> float:
+        """Reserve one request and the estimated tokens; return how long to wait."""
+        return max(self.limits.requests.reserve(1), self.limits.tokens.reserve(self.estimate))
+
+    def settle(self, actual: Optional[int]):
+        if actual is not None and self.estimate:
+            self.limits.tokens.adjust(self.estimate - actual)
+
+    def refund(self, sent: bool):
+        """Give back the reservation of an attempt abandoned by cancellation, or of a failed
+        attempt about to be retried (``sent=False``: the retry reserves again)."""
+        if not sent:
+            self.limits.requests.adjust(1)
+        self.limits.tokens.adjust(self.estimate)
+
+    def backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        gateway = self.gateway
+        delay = random.uniform(0, min(gateway.backoff_max, gateway.backoff_base * 2 ** attempt))
+        after = retry_after(response) if response is not None else None
+        if after is not None:
+            delay = max(delay, after * random.uniform(1.0, 1.1))
+        if response is not None and response.status_code == 429:
+            # Everyone talking to this model waits, not just this request
+            self.limits.pause(delay)
+        status = str(response.status_code) if response is not None else "connection"
+        crew_metrics.LLM_RETRIES.inc(model=self.model, reason=status)
+        logger.warning("LLM request to %s failed (%s), retry %s in %.1fs", self.model, status, attempt + 1, delay)
+        return delay
+
+
+class _TailStream(httpx.SyncByteStream):
+    """Passes a response body through, then settles token usage and frees the slot on close.
+
+    With a cancel ``token`` a streamed body stops at the next chunk once the job is cancelled.
+    """
+
+    def __init__(self, stream, on_close, token=None):
+        self._stream = stream
+        self._on_close = on_close
+        self._token = token
+        self._tail = b""
+
+    def __iter__(self):
+        for chunk in self._stream:
+            if self._token is not None and self._token.cancelled:
+                self.close()
+                raise cancellation.JobCancelled(self._token.reason)
+            self._tail = (self._tail + chunk)[-4096:]
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close(self._tail)
+
+
+class _AsyncTailStream(httpx.AsyncByteStream):
+    def __init__(self, stream, on_close, token=None):
+        self._stream = stream
+        self._on_close = on_close
+        self._token = token
+        self._tail = b""
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            if self._token is not None and self._token.cancelled:
+                await self.aclose()
+                raise cancellation.JobCancelled(self._token.reason)
+            self._tail = (self._tail + chunk)[-4096:]
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close(self._tail)
+
+
+class GatewayTransport(httpx.BaseTransport):
+    """Synchronous transport that applies the gateway's limits and retry policy."""
+
+    def __init__(self, gateway: "LLMGateway", transport: httpx.HTTPTransport):
+        self.gateway = gateway
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        call = _Call(self.gateway, request)
+        semaphore = call.limits.semaphore
+        token = cancellation.current_token.get()
+        for attempt in range(self.gateway.max_retries + 1):
+            delay = call.admission_delay()
+            try:
+                if delay > 0:
+                    crew_metrics.LLM_THROTTLE_SECONDS.inc(delay, model=call.model)
+                    cancellation.sleep(delay)
+                if semaphore is not None:
+                    self._acquire(semaphore, token)
+            except cancellation.JobCancelled:
+                call.refund(sent=False)
+                raise
+            try:
+                response = self._send(request, token)
+            except cancellation.JobCancelled:
+                if semaphore is not None:
+                    semaphore.release()
+                call.refund(sent=True)
+                raise
+            except httpx.TransportError:
+                if semaphore is not None:
+                    semaphore.release()
+                call.refund(sent=False)
+                if attempt == self.gateway.max_retries:
+                    raise
+                cancellation.sleep(call.backoff(attempt, None))
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.gateway.max_retries:
+                response.close()
+                if semaphore is not None:
+                    semaphore.release()
+                call.refund(sent=False)
+                cancellation.sleep(call.backoff(attempt, response))
+                continue
+
+            def on_close(tail: bytes):
+                call.settle(_usage_tokens(tail))
+                if semaphore is not None:
+                    semaphore.release()
+
+            response.stream = _TailStream(response.stream, on_close, token)
+            return response
+
+    @staticmethod
+    def _acquire(semaphore: threading.BoundedSemaphore, token):
+        if token is None:
+            semaphore.acquire()
+            return
+        while not semaphore.acquire(timeout=0.25):
+            token.check()
+
+    def _send(self, request: httpx.Request, token) -> httpx.Response:
+        """Send on the gateway's I/O pool so a cancelled caller can stop waiting for the response."""
+        if token is None:
+            return self._transport.handle_request(request)
+        remaining = token.remaining()
+        if remaining is not None:
+            _cap_timeout(request, remaining)
+        future = self.gateway.io_pool.submit(self._transport.handle_request, request)
+        try:
+            return token.wait_for(future)
+        except cancellation.JobCancelled:
+            if not future.cancel():
+                # The request is on the wire; drop its connection as soon as it answers
+                future.add_done_callback(_close_late_response)
+            raise
+        except httpx.TimeoutException:
+            # A timeout cut short by the deadline is the deadline, not a reason to retry
+            token.check()
+            raise
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncGatewayTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of ``GatewayTransport`` sharing the same buckets and caps."""
+
+    def __init__(self, gateway: "LLMGateway", transport: httpx.AsyncHTTPTransport):
+        self.gateway = gateway
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        call = _Call(self.gateway, request)
+        semaphore = call.limits.semaphore
+        token = cancellation.current_token.get()
+        for attempt in range(self.gateway.max_retries + 1):
+            delay = call.admission_delay()
+            try:
+                if delay > 0:
+                    crew_metrics.LLM_THROTTLE_SECONDS.inc(delay, model=call.model)
+                    await self._sleep(delay, token)
+                if semaphore is not None:
+                    # The cap is shared with sync callers, so wait for it off the event loop
+                    await asyncio.to_thread(GatewayTransport._acquire, semaphore, token)
+            except cancellation.JobCancelled:
+                call.refund(sent=False)
+                raise
+            try:
+                response = await self._send(request, token)
+            except cancellation.JobCancelled:
+                if semaphore is not None:
+                    semaphore.release()
+                call.refund(sent=True)
+                raise
+            except httpx.TransportError:
+                if semaphore is not None:
+                    semaphore.release()
+                call.refund(sent=False)
+                if attempt == self.gateway.max_retries:
+                    raise
+                await self._sleep(call.backoff(attempt, None), token)
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.gateway.max_retries:
+                await response.aclose()
+                if semaphore is not None:
+                    semaphore.release()
+                call.refund(sent=False)
+                await self._sleep(call.backoff(attempt, response), token)
+                continue
+
+            def on_close(tail: bytes):
+                call.settle(_usage_tokens(tail))
+                if semaphore is not None:
+                    semaphore.release()
+
+            response.stream = _AsyncTailStream(response.stream, on_close, token)
+            return response
+
+    async def _sleep(self, seconds: float, token):
+        if token is None:
+            await asyncio.sleep(seconds)
+            return
+        remaining = token.remaining()
+        await asyncio.sleep(seconds if remaining is None else min(seconds, remaining))
+        token.check()
+
+    async def _send(self, request: httpx.Request, token) -> httpx.Response:
+        """Send the request; cancelling the job cancels the pending request."""
+        if token is None:
+            return await self._transport.handle_async_request(request)
+        remaining = token.remaining()
+        if remaining is not None:
+            _cap_timeout(request, remaining)
+        loop = asyncio.get_running_loop()
+        pending = asyncio.ensure_future(self._transport.handle_async_request(request))
+        remove = token.add_callback(lambda _: loop.call_soon_threadsafe(pending.cancel))
+        try:
+            return await pending
+        except (asyncio.CancelledError, httpx.TimeoutException):
+            token.check()
+            raise
+        finally:
+            remove()
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class LLMGateway:
+    def __init__(self, rpm: float = 0, tpm: float = 0, concurrency: int = 8,
+                 model_limits: Optional[Dict[str, Dict[str, float]]] = None,
+                 max_connections: int = 20, max_keepalive: int = 10,
+                 max_retries: int = 5, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 timeout: float = 120.0):
+        self.defaults = {"rpm": rpm, "tpm": tpm, "concurrency": concurrency}
+        self.model_limits = model_limits or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._limits: Dict[str, ModelLimits] = {}
+        self._lock = threading.Lock()
+        # Sync requests of cancellable jobs wait for their response here, off the caller's thread
+        self.io_pool = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="llm-io")
+
+        pool = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.http_client = httpx.Client(
+            transport=GatewayTransport(self, httpx.HTTPTransport(limits=pool)), timeout=timeout
+        )
+        self.http_async_client = httpx.AsyncClient(
+            transport=AsyncGatewayTransport(self, httpx.AsyncHTTPTransport(limits=pool)), timeout=timeout
+        )
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        """Configure from LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY, LLM_MODEL_LIMITS (JSON of
+        per-model overrides), LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE, LLM_MAX_RETRIES,
+        LLM_BACKOFF_BASE and LLM_BACKOFF_MAX."""
+        model_limits = os.environ.get("LLM_MODEL_LIMITS")
+        return cls(
+            rpm=float(os.environ.get("LLM_RPM", "0")),
+            tpm=float(os.environ.get("LLM_TPM", "0")),
+            concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "8")),
+            model_limits=json.loads(model_limits) if model_limits else None,
+            max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", "20")),
+            max_keepalive=int(os.environ.get("LLM_MAX_KEEPALIVE", "10")),
+            max_retries=int(os.environ.get("LLM_MAX_RETRIES", "5")),
+            backoff_base=float(os.environ.get("LLM_BACKOFF_BASE", "0.5")),
+            backoff_max=float(os.environ.get("LLM_BACKOFF_MAX", "30")),
+        )
+
+    def limits(self, model: str) -> ModelLimits:
+        with self._lock:
+            limits = self._limits.get(model)
+            if limits is None:
+                limits = self._limits[model] = ModelLimits(
+                    **{**self.defaults, **self.model_limits.get(model, {})}
+                )
+            return limits
+
+    def set_limits(self, model: Optional[str] = None, **limits: float):
+        """Override one model's limits, or the defaults for all models, at runtime."""
+        with self._lock:
+            if model is None:
+                self.defaults.update(limits)
+                self._limits.clear()
+            else:
+                self.model_limits[model] = {**self.model_limits.get(model, {}), **limits}
+                self._limits.pop(model, None)
+
+    def client_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments that route a ChatOpenAI client through this gateway."""
+        return {
+            "http_client": self.http_client,
+            "http_async_client": self.http_async_client,
+            "max_retries": 0,
+        }
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """The process-wide gateway, built from the environment on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway.from_env()
+        return _gateway
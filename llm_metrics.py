@@ -0,0 +1,40 @@
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+import crew_metrics
+
+
+def _model_name(serialized: Dict[str, Any], kwargs: Dict[str, Any]) -> Optional[str]:
+    params = kwargs.get("invocation_params") or {}
+    return (params.get("model_name") or params.get("model")
+            or (serialized or {}).get("kwargs", {}).get("model_name"))
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Count LLM requests and prompt/completion tokens per model."""
+
+    def __init__(self, model: str = "unknown"):
+        self.model = model
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        crew_metrics.LLM_CALLS.inc(model=_model_name(serialized, kwargs) or self.model)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], **kwargs: Any) -> None:
+        crew_metrics.LLM_CALLS.inc(model=_model_name(serialized, kwargs) or self.model)
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+        prompt = usage.get("prompt_tokens", 0)
+        completion = usage.get("completion_tokens", 0)
+        if not usage:
+            # Streaming responses report usage on the message instead
+            for generations in getattr(response, "generations", []):
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt += metadata.get("input_tokens", 0)
+                    completion += metadata.get("output_tokens", 0)
+        if prompt:
+            crew_metrics.LLM_TOKENS.inc(prompt, model=self.model, kind="prompt")
+        if completion:
+            crew_metrics.LLM_TOKENS.inc(completion, model=self.model, kind="completion")
@@ -0,0 +1,22 @@
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+import crewai_monitor
+
+
+class MonitorStreamHandler(BaseCallbackHandler):
+    """Forward streamed LLM tokens to the monitor as coalesced ``delta`` messages.
+
+    Tokens are attributed to the agent whose task is running in the calling
+    context (see ``crewai_monitor.current_agent``).
+    """
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        crewai_monitor.stream_token(token)
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        crewai_monitor.flush_stream()
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        crewai_monitor.flush_stream()
@@ -0,0 +1,196 @@
+"""Per-stage model routing with cascades.
+
+Each pipeline stage (research, writing, editing) has a route: an ordered
+list of models and the checks its output must pass. The stage's agent starts
+on the first model. If the task output fails a check (too short, too few
+sections, a refusal), the task is run again with an agent on the next model.
+A route with a single model is plain routing.
+
+Routes come from MODEL_ROUTES, a JSON object or the path of a JSON file::
+
+    {
+      "research": {"models": ["openai/gpt-3.5-turbo", "openai/gpt-4-turbo"], "min_chars": 1500},
+      "writing": {"models": ["openai/gpt-4-turbo"]},
+      "editing": {"models": ["openai/gpt-3.5-turbo", "openai/gpt-4-turbo"], "min_sections": 3}
+    }
+
+MODEL_RESEARCH, MODEL_WRITING and MODEL_EDITING (comma-separated cascades)
+override the models of a single stage.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import cancellation
+import crew_metrics
+import crewai_monitor
+from checkpoints import output_text
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("research", "writing", "editing")
+
+# Minimum output length per stage before a cascade escalates
+DEFAULT_MIN_CHARS = {"research": 1500, "writing": 3000, "editing": 3000}
+
+DEFAULT_REJECT_PATTERNS = [
+    r"^\s*(I'm sorry|I am sorry|I apologi[sz]e|I cannot|I can't|As an AI)",
+    r"Agent stopped due to iteration limit",
+]
+
+_HEADING = re.compile(r"^\s*#{1,6}\s", re.MULTILINE)
+
+# Router of the run executing in the current thread / async context
+current_router = contextvars.ContextVar("model_routing_current_router", default=None)
+
+
+@dataclass
+class Route:
+    """Models to try for one stage, cheapest first, and the checks that trigger escalation."""
+
+    models: List[str]
+    min_chars: int = 0
+    min_sections: int = 0
+    reject_patterns: List[str] = field(default_factory=lambda: list(DEFAULT_REJECT_PATTERNS))
+
+    def validate(self, text: str, partial: bool = False) -> Optional[str]:
+        """Why ``text`` fails the route's checks, or None if it passes.
+
+        ``partial`` outputs (sub-tasks of a larger stage) only get the refusal checks.
+        """
+        for pattern in self.reject_patterns:
+            if re.search(pattern, text, re.IGNORECASE):
+                return "refusal"
+        if partial:
+            return None
+        if len(text.strip()) < self.min_chars:
+            return "too_short"
+        if len(_HEADING.findall(text)) < self.min_sections:
+            return "too_few_sections"
+        return None
+
+
+def _parse_routes(raw: str) -> Dict[str, Any]:
+    if raw.lstrip().startswith("{"):
+        return json.loads(raw)
+    with open(raw, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ModelRouter:
+    """Routes each stage's agent to its models and runs the cascade on failed outputs.
+
+    ``llm_factory`` builds a client for a model name; clients are created once
+    per model and shared by every stage that uses it.
+    """
+
+    def __init__(self, routes: Dict[str, Route], llm_factory: Callable[[str], Any]):
+        self.routes = routes
+        self.llm_factory = llm_factory
+        self.agent_factories: Dict[str, Callable[[Any], Any]] = {}
+        self._roles: Dict[str, str] = {}
+        self._llms: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_model: str, llm_factory: Callable[[str], Any]) -> "ModelRouter":
+        """Routes from MODEL_ROUTES and MODEL_<STAGE>; unset stages use ``default_model`` only."""
+        raw = os.environ.get("MODEL_ROUTES")
+        config = _parse_routes(raw) if raw else {}
+        routes = {}
+        for stage in STAGES:
+            spec = dict(config.get(stage) or {})
+            override = os.environ.get(f"MODEL_{stage.upper()}")
+            if override:
+                spec["models"] = [model.strip() for model in override.split(",") if model.strip()]
+            spec.setdefault("models", [default_model])
+            spec.setdefault("min_chars", DEFAULT_MIN_CHARS[stage] if len(spec["models"]) > 1 else 0)
+            routes[stage] = Route(**spec)
+        return cls(routes, llm_factory)
+
+    def llm(self, model: str):
+        with self._lock:
+            if model not in self._llms:
+                self._llms[model] = self.llm_factory(model)
+            return self._llms[model]
+
+    def create_agent(self, stage: str, factory: Callable[[Any], Any], model: Optional[str] = None):
+        """An agent for ``stage`` on ``model`` (the route's first model by default)."""
+        self.agent_factories[stage] = factory
+        agent = factory(self.llm(model or self.routes[stage].models[0]))
+        self._roles[getattr(agent, "role", None)] = stage
+        return agent
+
+    def stage_for(self, agent) -> Optional[str]:
+        return self._roles.get(getattr(agent, "role", None))
+
+    def config(self) -> Dict[str, Any]:
+        """Route settings that change what a run produces."""
+        return {stage: route.__dict__ for stage, route in self.routes.items()}
+
+    def run_task(self, task, execute: Callable[..., Any], agent=None, **kwargs):
+        """Run ``task`` through its stage's cascade; ``execute`` is the underlying Task.execute_sync."""
+        agent = agent or task.agent
+        stage = self.stage_for(agent)
+        route = self.routes.get(stage)
+        if route is None:
+            return execute(task, agent=agent, **kwargs)
+        partial = crewai_monitor.sub_crew.get()
+        agent_name, task_type = crewai_monitor.get_task_info(task)
+        # Callbacks (checkpoints, context budget) only see the output that is kept
+        callback = getattr(task, "callback", None)
+        task.callback = None
+        try:
+            for attempt, model in enumerate(route.models):
+                if attempt > 0:
+                    # A cancelled job does not escalate to a (usually pricier) model
+                    cancellation.check()
+                    crew = getattr(agent, "crew", None)
+                    agent = self.create_agent(stage, self.agent_factories[stage], model)
+                    if crew is not None:
+                        agent.crew = crew
+                crewai_monitor.served_model.set(model)
+                output = execute(task, agent=agent, **kwargs)
+                reason = route.validate(output_text(output), partial)
+                if reason is None:
+                    break
+                if attempt == len(route.models) - 1:
+                    logger.warning("%s output from %s failed validation (%s); no model left", stage, model, reason)
+                    break
+                following = route.models[attempt + 1]
+                crew_metrics.MODEL_ESCALATIONS.inc(stage=stage, reason=reason)
+                logger.info("Escalating %s from %s to %s (%s)", stage, model, following, reason)
+                crewai_monitor.sync_send_status({
+                    "agent": agent_name,
+                    "task": task_type,
+                    "output": f"Output from {model} failed validation ({reason}); retrying with {following}",
+                    "status": task_type,
+                    "model": following
+                })
+        finally:
+            task.callback = callback
+        if callback is not None:
+            callback(output)
+        return output
+
+
+def patch_task(Task):
+    """Route Task.execute_sync through the current run's router. Patch before the monitor does,
+    so the monitor reports one task with the model that finally served it."""
+    if getattr(Task.execute_sync, "_model_routing_patched", False):
+        return
+    original_execute_sync = Task.execute_sync
+
+    def routed_execute_sync(self, agent=None, context=None, tools=None):
+        router = current_router.get()
+        if router is None:
+            return original_execute_sync(self, agent=agent, context=context, tools=tools)
+        return router.run_task(self, original_execute_sync, agent=agent, context=context, tools=tools)
+
+    routed_execute_sync._model_routing_patched = True
+    Task.execute_sync = routed_execute_sync
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import random
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import websockets
+from websockets.protocol import State
+
+import crew_metrics
+from wire_format import JSON, WireEncoder, available_formats
+
+logger = logging.getLogger(__name__)
+
+
+class MonitorTransport:
+    """Long-lived WebSocket sender for monitor events.
+
+    A single background thread owns the event loop and the connection.
+    Callers hand messages to ``emit()``, which only appends to a bounded
+    in-memory queue and never blocks on the network, so it is safe to call
+    from agent threads and from inside a running event loop alike.
+    """
+
+    def __init__(
+        self,
+        ws_url: str,
+        max_queue: int = 1000,
+        batch_size: int = 50,
+        batch_interval: float = 0.05,
+        min_backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        wire_format: str = JSON,
+        compression: Optional[str] = "deflate",
+    ):
+        self.ws_url = ws_url
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        if wire_format != JSON and wire_format not in available_formats():
+            logger.warning("Wire format %s is not available, using JSON", wire_format)
+            wire_format = JSON
+        # Preferred encoding; the server may still answer with plain JSON
+        self.wire_format = wire_format
+        self.compression = compression
+
+        self.stats = {"sent": 0, "dropped": 0, "batches": 0, "reconnects": 0, "bytes": 0}
+
+        self._queue: deque = deque()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._stopping = False
+
+    def start(self):
+        """Start the background sender thread if it is not running yet."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._ready.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="crewai-monitor-transport", daemon=True
+            )
+            self._thread.start()
+        self._ready.wait(timeout=5)
+
+    def emit(self, message: Dict[str, Any]) -> bool:
+        """Queue a message for delivery. Returns False if it displaced an older one."""
+        accepted = True
+        with self._lock:
+            if self._stopping:
+                self.stats["dropped"] += 1
+                crew_metrics.MONITOR_EVENTS_DROPPED.inc()
+                return False
+            if len(self._queue) >= self.max_queue:
+                # Keep the freshest state: the dashboard cares about "now"
+                self._queue.popleft()
+                self.stats["dropped"] += 1
+                crew_metrics.MONITOR_EVENTS_DROPPED.inc()
+                accepted = False
+            self._queue.append(message)
+        self._notify()
+        return accepted
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued message has been sent (or the timeout expires)."""
+        self._notify()
+        with self._idle:
+            return self._idle.wait_for(
+                lambda: not self._queue and not self._in_flight, timeout=timeout
+            )
+
+    def close(self, timeout: float = 5.0):
+        """Flush pending messages, then stop the sender and close the connection."""
+        if not self._thread:
+            return
+        flushed = self.flush(timeout)
+        if not flushed:
+            logger.warning("Monitor transport closed with %s unsent messages", len(self._queue))
+        with self._lock:
+            self._stopping = True
+        self._notify()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def _notify(self):
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # Loop shut down between the check and the call
+                pass
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._ready.set()
+        try:
+            loop.run_until_complete(self._sender())
+        finally:
+            self._loop = None
+            loop.close()
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            self._in_flight = len(batch)
+            return batch
+
+    def _requeue(self, batch: List[Dict[str, Any]]):
+        with self._lock:
+            for message in reversed(batch):
+                if len(self._queue) >= self.max_queue:
+                    self.stats["dropped"] += 1
+                    crew_metrics.MONITOR_EVENTS_DROPPED.inc()
+                    continue
+                self._queue.appendleft(message)
+            self._in_flight = 0
+
+    def _done(self, count: int):
+        with self._idle:
+            self._in_flight = 0
+            self.stats["sent"] += count
+            self.stats["batches"] += 1
+            self._idle.notify_all()
+
+    async def _connect(self):
+        backoff = self.min_backoff
+        while True:
+            try:
+                websocket = await websockets.connect(
+                    self.ws_url,
+                    subprotocols=[self.wire_format] if self.wire_format != JSON else None,
+                    compression=self.compression,
+                )
+                logger.info("Monitor transport connected to %s (%s)", self.ws_url, websocket.subprotocol or JSON)
+                return websocket
+            except Exception as e:
+                if self._stopping:
+                    raise
+                delay = backoff * (0.5 + random.random() / 2)
+                logger.warning("Monitor connection failed (%s), retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, self.max_backoff)
+                self.stats["reconnects"] += 1
+
+    async def _discard_incoming(self, websocket):
+        # The server acks every frame; read them so its send buffer never fills
+        try:
+            async for _ in websocket:
+                pass
+        except Exception:
+            pass
+
+    async def _sender(self):
+        websocket = None
+        reader = None
+        encoder = None
+        try:
+            while True:
+                if not self._queue:
+                    if self._stopping:
+                        break
+                    self._wakeup.clear()
+                    if not self._queue and not self._stopping:
+                        await self._wakeup.wait()
+                    continue
+
+                # Give concurrent emitters a moment to add to this batch
+                if len(self._queue) < self.batch_size and self.batch_interval > 0:
+                    await asyncio.sleep(self.batch_interval)
+
+                batch = self._take_batch()
+                if not batch:
+                    continue
+
+                try:
+                    if websocket is None or websocket.state is not State.OPEN:
+                        websocket = await self._connect()
+                        reader = asyncio.ensure_future(self._discard_incoming(websocket))
+                        # Interned identifiers are per connection
+                        encoder = WireEncoder(websocket.subprotocol)
+                    payload = encoder.encode(batch)
+                    await websocket.send(payload)
+                    self.stats["bytes"] += len(payload)
+                    self._done(len(batch))
+                except Exception as e:
+                    logger.error("Failed to send status update batch: %s", e)
+                    self._requeue(batch)
+                    if websocket is not None:
+                        await websocket.close()
+                    websocket = None
+                    if self._stopping:
+                        break
+                    await asyncio.sleep(self.min_backoff)
+        finally:
+            if reader is not None:
+                reader.cancel()
+            if websocket is not None:
+                await websocket.close()
+            with self._idle:
+                self._in_flight = 0
+                self._idle.notify_all()
@@ -0,0 +1,75 @@
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import crewai_monitor
+from checkpoints import output_text
+
+logger = logging.getLogger(__name__)
+
+# How sub-task findings are reduced into one research summary
+MERGE_CONCAT = "concat"  # join the sections as-is, no extra LLM call
+MERGE_LLM = "llm"        # ask the research agent to write a combined summary
+MERGE_STRATEGIES = (MERGE_CONCAT, MERGE_LLM)
+
+
+def parallel_research_enabled() -> bool:
+    return os.environ.get("RESEARCH_MODE", "single") == "parallel"
+
+
+def concat_findings(focus_areas: List[str], findings: List[str]) -> str:
+    return "\n\n".join(
+        f"## {focus}\n\n{text.strip()}" for focus, text in zip(focus_areas, findings)
+    )
+
+
+def run_parallel_research(topic: str, llm, concurrency: Optional[int] = None,
+                          merge: Optional[str] = None) -> str:
+    """Research each focus area as its own crew, concurrently, then merge.
+
+    Every sub-task gets its own agent instance so no agent state is shared
+    between threads. Wall-clock time is roughly that of the slowest focus
+    area (plus the merge call with the ``llm`` strategy).
+    """
+    from crewai import Crew
+    from agents.research_agent import create_research_agent
+    from tasks.content_tasks import (
+        RESEARCH_FOCUS_AREAS,
+        create_research_subtask,
+        create_research_merge_task
+    )
+
+    concurrency = concurrency or int(os.environ.get("RESEARCH_CONCURRENCY", len(RESEARCH_FOCUS_AREAS)))
+    merge = merge or os.environ.get("RESEARCH_MERGE", MERGE_CONCAT)
+    if merge not in MERGE_STRATEGIES:
+        raise ValueError(f"Unknown research merge strategy: {merge}")
+
+    def run_sub_crew(agent, task) -> str:
+        token = crewai_monitor.sub_crew.set(True)
+        try:
+            return output_text(Crew(agents=[agent], tasks=[task]).kickoff())
+        finally:
+            crewai_monitor.sub_crew.reset(token)
+
+    agents = [create_research_agent(llm) for _ in RESEARCH_FOCUS_AREAS]
+    subtasks = [create_research_subtask(agent, topic, focus)
+                for agent, focus in zip(agents, RESEARCH_FOCUS_AREAS)]
+    agent_name, task_type = crewai_monitor.get_task_info(subtasks[0])
+
+    logger.info("Running %s research sub-tasks with concurrency %s", len(RESEARCH_FOCUS_AREAS), concurrency)
+    # The sub-tasks (and the merge) are reported as one research stage
+    with crewai_monitor.monitored_stage(agent_name, task_type):
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="research") as pool:
+            # Each sub-task runs in its own copy of this context, keeping the job id and cancel token
+            futures = [pool.submit(contextvars.copy_context().run, run_sub_crew, agent, task)
+                       for agent, task in zip(agents, subtasks)]
+            findings = [future.result() for future in futures]
+
+        combined = concat_findings(RESEARCH_FOCUS_AREAS, findings)
+        if merge == MERGE_CONCAT:
+            return combined
+
+        agent = create_research_agent(llm)
+        return run_sub_crew(agent, create_research_merge_task(agent, topic, combined))
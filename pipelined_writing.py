@@ -0,0 +1,142 @@
+import contextvars
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Callable, List, Optional
+
+import crewai_monitor
+from checkpoints import output_text
+
+logger = logging.getLogger(__name__)
+
+# How the separately edited sections are joined into the final post
+STITCH_CONCAT = "concat"  # join the sections as-is, no extra LLM call
+STITCH_LLM = "llm"        # ask the editor for new section openings where the flow breaks
+STITCH_STRATEGIES = (STITCH_CONCAT, STITCH_LLM)
+
+# Used when the writer's outline cannot be parsed
+DEFAULT_SECTIONS = [
+    "Introduction",
+    "Where Things Stand Today",
+    "Emerging Trends",
+    "Impact and Implications",
+    "Challenges Ahead",
+    "Conclusion",
+]
+
+_OUTLINE_LINE = re.compile(r"^\s*(?:#{1,6}|[-*+]|\d+[.)])\s*(.+?)\s*$")
+_TRANSITION = re.compile(r"^\s*(\d+)\s*[:.)-]\s*(.+?)\s*$")
+_SENTENCE = re.compile(r"^(.+?[.!?])(\s+|$)", re.DOTALL)
+
+
+def pipelined_writing_enabled() -> bool:
+    return os.environ.get("WRITING_MODE", "sequential") == "pipelined"
+
+
+def parse_outline(text: str, max_sections: int = 8) -> List[str]:
+    """Section headings from the writer's outline, falling back to a default structure."""
+    headings = []
+    for line in text.splitlines():
+        match = _OUTLINE_LINE.match(line)
+        if match:
+            heading = match.group(1).strip("*# ").strip()
+            if heading and heading not in headings:
+                headings.append(heading)
+    return headings[:max_sections] if len(headings) >= 2 else list(DEFAULT_SECTIONS)
+
+
+def _split_heading(section: str):
+    lines = section.strip().split("\n", 1)
+    if lines[0].lstrip().startswith("#"):
+        return lines[0], lines[1].lstrip() if len(lines) > 1 else ""
+    return None, section.strip()
+
+
+def apply_transitions(sections: List[str], answer: str) -> List[str]:
+    """Replace the first sentence of the sections named in the stitching answer."""
+    sections = list(sections)
+    for line in answer.splitlines():
+        match = _TRANSITION.match(line)
+        if not match:
+            continue
+        index = int(match.group(1)) - 1
+        if not 0 < index < len(sections):
+            continue
+        heading, body = _split_heading(sections[index])
+        body = _SENTENCE.sub(lambda _: match.group(2) + " ", body, count=1).strip()
+        sections[index] = f"{heading}\n\n{body}" if heading else body
+    return sections
+
+
+def run_pipelined_writing(topic: str, research: str, writer, create_editor: Callable[[], object],
+                          concurrency: Optional[int] = None, stitch: Optional[str] = None) -> str:
+    """Write the post section by section and edit each section as soon as it is written.
+
+    The writer first outlines the post, then writes the sections in order,
+    each seeing the end of the one before. Every finished section goes
+    straight to a pool of editors (``create_editor`` builds one agent per
+    section, so no agent state is shared between threads). Time to the final
+    post is roughly the writer's time plus one section's edit, plus the
+    stitching call with the ``llm`` strategy.
+    """
+    from crewai import Crew
+    from tasks.content_tasks import (
+        POST_WORDS,
+        create_outline_task,
+        create_section_editing_task,
+        create_section_writing_task,
+        create_stitching_task
+    )
+
+    concurrency = concurrency or int(os.environ.get("WRITING_EDIT_CONCURRENCY", "4"))
+    stitch = stitch or os.environ.get("WRITING_STITCH", STITCH_LLM)
+    if stitch not in STITCH_STRATEGIES:
+        raise ValueError(f"Unknown writing stitch strategy: {stitch}")
+
+    def run_sub_crew(agent, task) -> str:
+        token = crewai_monitor.sub_crew.set(True)
+        try:
+            return output_text(Crew(agents=[agent], tasks=[task]).kickoff())
+        finally:
+            crewai_monitor.sub_crew.reset(token)
+
+    def edit(editor, task) -> str:
+        return run_sub_crew(editor, task).strip()
+
+    outline_task = create_outline_task(writer, research)
+    edits = []
+    previous = None
+    # One stage per agent rather than a Done per section: the writer's stage ends with the
+    # last section, the editors' stage starts with the first edit and ends after stitching
+    with ExitStack() as editing, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="section-edit") as pool:
+        with crewai_monitor.monitored_stage(*crewai_monitor.get_task_info(outline_task)):
+            outline = run_sub_crew(writer, outline_task)
+            headings = parse_outline(outline)
+            words = max(100, POST_WORDS // len(headings))
+            logger.info("Writing %s sections for '%s', editing up to %s at once", len(headings), topic, concurrency)
+
+            for heading in headings:
+                task = create_section_writing_task(writer, research, outline, heading, previous, words)
+                section = run_sub_crew(writer, task).strip()
+                if not section.lstrip().startswith("#"):
+                    section = f"## {heading}\n\n{section}"
+                editor = create_editor()
+                edit_task = create_section_editing_task(editor, section)
+                if not edits:
+                    editing.enter_context(crewai_monitor.monitored_stage(*crewai_monitor.get_task_info(edit_task)))
+                # Each edit runs in its own copy of this context so events keep the job id
+                edits.append(pool.submit(contextvars.copy_context().run, edit, editor, edit_task))
+                previous = section
+        sections = [future.result() for future in edits]
+
+        post = "\n\n".join(sections)
+        if stitch == STITCH_CONCAT or len(sections) < 2:
+            return post
+        editor = create_editor()
+        answer = run_sub_crew(editor, create_stitching_task(editor, post))
+        if answer.strip().upper().startswith("NONE"):
+            return post
+        return "\n\n".join(apply_transitions(sections, answer))
@@ -0,0 +1,207 @@
+"""On-demand sampling profiler for individual crew runs.
+
+A run started with profiling on (``--profile`` on the CLI, ``"profile": true``
+on ``POST /start``) gets a ``Profile`` carried in a contextvar. While a crew
+kickoff or a task runs, its thread is registered with the profile and tagged
+with the task's agent and type. A background thread samples the registered
+threads' stacks every ``PROFILE_INTERVAL`` seconds with
+``sys._current_frames()``. Each sample is also put in one category: llm
+(waiting on the model), monitor, prompt, langchain, crewai or other.
+
+When the run ends, two files are written to ``PROFILE_DIR``:
+
+- ``<name>.collapsed``: collapsed stacks, one ``tag;outer;...;inner count``
+  line per stack. Use it with flamegraph.pl or speedscope.
+- ``<name>.json``: sample counts per tag and category, and the sampler's own
+  overhead.
+
+Runs without profiling only pay a contextvar lookup per task.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Deepest stack recorded per sample; deeper frames are cut at the root side
+MAX_DEPTH = 200
+
+# Sample categories, matched against frame modules from the innermost frame outwards;
+# the first frame that matches decides (standard library frames never match)
+CATEGORIES = [
+    ("llm", ("llm_gateway", "llm_cache", "httpx", "httpcore", "openai", "h11", "anyio")),
+    ("monitor", ("crewai_monitor", "monitor_transport", "llm_streaming", "llm_metrics", "telemetry")),
+    ("prompt", ("context_budget", "tasks.", "langchain_core.prompts", "crewai.utilities.prompts",
+                "crewai.utilities.i18n", "tiktoken")),
+    ("langchain", ("langchain", "langchain_core", "langchain_openai")),
+    ("crewai", ("crewai",)),
+]
+
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+# Profile of the run executing in the current thread / async context
+current_profile = contextvars.ContextVar("profiling_current_profile", default=None)
+
+
+def categorize(modules: List[str]) -> str:
+    """Category of a sample from its frame modules, innermost first."""
+    for module in modules:
+        for category, prefixes in CATEGORIES:
+            if module.startswith(prefixes):
+                return category
+    return "other"
+
+
+class Profile:
+    """Samples the stacks of the threads registered with it until stopped."""
+
+    def __init__(self, name: str, interval: float = 0.01):
+        self.name = name
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.tags: Counter = Counter()
+        self.categories: Counter = Counter()
+        self.samples = 0
+        self.sampler_seconds = 0.0
+        self.started: Optional[float] = None
+        self.duration = 0.0
+        self._threads: Dict[int, List[str]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "Profile":
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.monotonic() - self.started if self.started else 0.0
+
+    def enter(self, tag: str):
+        """Register the calling thread under ``tag`` (nested registrations stack)."""
+        with self._lock:
+            self._threads.setdefault(threading.get_ident(), []).append(tag)
+
+    def exit(self):
+        ident = threading.get_ident()
+        with self._lock:
+            tags = self._threads.get(ident)
+            if tags:
+                tags.pop()
+                if not tags:
+                    del self._threads[ident]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            started = time.perf_counter()
+            self.sample()
+            self.sampler_seconds += time.perf_counter() - started
+
+    def sample(self):
+        """Record one stack per registered thread, tagged with its innermost tag."""
+        with self._lock:
+            threads = {ident: tags[-1] for ident, tags in self._threads.items()}
+        if not threads:
+            return
+        frames = sys._current_frames()
+        for ident, tag in threads.items():
+            frame = frames.get(ident)
+            names, modules = [], []
+            while frame is not None and len(names) < MAX_DEPTH:
+                code = frame.f_code
+                module = frame.f_globals.get("__name__", "?")
+                names.append(f"{module}.{getattr(code, 'co_qualname', code.co_name)}")
+                modules.append(module)
+                frame = frame.f_back
+            if not names:
+                continue
+            self.stacks[";".join([tag, *reversed(names)])] += 1
+            self.tags[tag] += 1
+            self.categories[categorize(modules)] += 1
+        self.samples += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "duration": round(self.duration, 3),
+            "samples": self.samples,
+            "sampler_seconds": round(self.sampler_seconds, 4),
+            "tags": dict(self.tags.most_common()),
+            "categories": dict(self.categories.most_common()),
+            "created_at": datetime.now().isoformat(),
+        }
+
+    def write(self, directory: Path) -> Path:
+        """Write the collapsed stacks and the summary; returns the collapsed-stack path."""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.name}.collapsed"
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        with open(directory / f"{self.name}.json", "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+
+def profile_dir() -> Path:
+    return Path(os.environ.get("PROFILE_DIR", ".cache/profiles"))
+
+
+def artifact_path(name: str, kind: str = "collapsed") -> Optional[Path]:
+    """Path of a stored profile artifact (``collapsed`` or ``json``), if it exists."""
+    if not _SAFE_NAME.match(name):
+        return None
+    path = profile_dir() / f"{name}.{kind}"
+    return path if path.exists() else None
+
+
+@contextmanager
+def profile(name: Optional[str] = None, enabled: bool = True):
+    """Profile the crew kickoffs and tasks run inside the block and store the artifact."""
+    if not enabled:
+        yield None
+        return
+    name = name or datetime.now().strftime("run-%Y%m%d-%H%M%S")
+    session = Profile(name, float(os.environ.get("PROFILE_INTERVAL", "0.01"))).start()
+    token = current_profile.set(session)
+    try:
+        yield session
+    finally:
+        current_profile.reset(token)
+        session.stop()
+        try:
+            path = session.write(profile_dir())
+            logger.info("Profile of %s: %s samples in %.1fs %s written to %s",
+                        name, session.samples, session.duration, dict(session.categories), path)
+        except OSError as e:
+            logger.error("Failed to write profile %s: %s", name, e)
+
+
+@contextmanager
+def track(tag: str):
+    """Sample the calling thread under ``tag`` while the current run is being profiled."""
+    session = current_profile.get()
+    if session is None:
+        yield
+        return
+    session.enter(tag)
+    try:
+        yield
+    finally:
+        session.exit()
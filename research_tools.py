@@ -0,0 +1,384 @@
+"""Web research tool for the research agent.
+
+One tool call searches for several queries and reads the top result pages,
+all concurrently, through one pooled async HTTP client running on a
+background event loop. Page text is extracted while the body streams in;
+reading stops once enough main text has been collected. Fetched pages are
+kept in an on-disk cache. Within ``PAGE_CACHE_TTL`` they are served as-is.
+After that they are revalidated with ``If-None-Match`` / ``If-Modified-Since``,
+so an unchanged page costs a 304 instead of a download.
+
+Search uses DuckDuckGo (``duckduckgo-search``), or any SearxNG-compatible
+JSON endpoint set in ``SEARCH_URL``. The latter also covers offline runs
+against ``benchmarks/web_fixture_server.py``.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+import cancellation
+import crew_metrics
+
+try:
+    from duckduckgo_search import DDGS
+except ImportError:  # optional; SEARCH_URL works without it
+    DDGS = None
+
+logger = logging.getLogger(__name__)
+
+# Elements whose text is never main content
+SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg",
+             "button", "iframe", "template"}
+# Elements that hold main content when the page marks it up
+MAIN_TAGS = {"article", "main"}
+BLOCK_TAGS = {"p", "li", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "td", "dd",
+              "div", "section", "br", "tr"}
+VOID_TAGS = {"br", "img", "hr", "input", "meta", "link", "source", "wbr", "area", "col", "embed"}
+
+# Blocks shorter than this outside <article>/<main> are treated as boilerplate
+MIN_BLOCK_CHARS = 40
+
+_SPACE = re.compile(r"\s+")
+
+
+class MainTextExtractor(HTMLParser):
+    """Incremental HTML to main-text extractor; ``feed`` it chunks as they arrive.
+
+    Text inside <article>/<main> is preferred when the page has any. Otherwise
+    paragraph-sized blocks outside navigation, headers, footers and scripts are
+    kept. ``done`` turns True once ``max_chars`` of text have been collected.
+    """
+
+    def __init__(self, max_chars: int = 2500):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.title = ""
+        self._skip = 0
+        self._main = 0
+        self._in_title = False
+        self._block: List[str] = []
+        self._main_blocks: List[str] = []
+        self._other_blocks: List[str] = []
+        self._main_chars = 0
+        self._other_chars = 0
+
+    @property
+    def done(self) -> bool:
+        return self._main_chars >= self.max_chars or (not self._main_blocks and self._other_chars >= self.max_chars)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag == "br":
+                self._end_block()
+            return
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag in MAIN_TAGS:
+            self._end_block()
+            self._main += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in BLOCK_TAGS:
+            self._end_block()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in MAIN_TAGS:
+            self._end_block()
+            self._main = max(0, self._main - 1)
+        elif tag == "title":
+            self._in_title = False
+        elif tag in BLOCK_TAGS:
+            self._end_block()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip:
+            self._block.append(data)
+
+    def _end_block(self):
+        text = _SPACE.sub(" ", "".join(self._block)).strip()
+        self._block = []
+        if not text:
+            return
+        if self._main:
+            self._main_blocks.append(text)
+            self._main_chars += len(text)
+        elif len(text) >= MIN_BLOCK_CHARS:
+            self._other_blocks.append(text)
+            self._other_chars += len(text)
+
+    def text(self) -> str:
+        self._end_block()
+        blocks = self._main_blocks or self._other_blocks
+        return "\n".join(blocks)[: self.max_chars]
+
+
+class PageCache:
+    """Fetched pages as sharded JSON files: text plus the validators for revalidation."""
+
+    def __init__(self, root: str = ".cache/pages", ttl: float = 86400):
+        self.root = Path(root)
+        self.ttl = ttl
+
+    def _path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.root / digest[:2] / f"{digest}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def fresh(self, entry: Dict[str, Any], ttl: Optional[float] = None) -> bool:
+        return time.time() - entry["fetched_at"] <= (self.ttl if ttl is None else ttl)
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**entry, "fetched_at": time.time()}, f)
+        os.replace(tmp, path)
+
+
+class WebResearcher:
+    """Concurrent search and page fetching over one pooled async HTTP client.
+
+    All requests run on a private event loop thread, so the connection pool is
+    reused across tool calls from any number of agent threads.
+    """
+
+    def __init__(self, cache: Optional[PageCache] = None, search_url: Optional[str] = None,
+                 results_per_query: int = 4, max_pages: int = 8, concurrency: int = 8,
+                 page_chars: int = 2500, max_bytes: int = 2 * 1024 * 1024, timeout: float = 10.0,
+                 search_ttl: float = 3600):
+        self.cache = cache
+        self.search_url = search_url
+        self.results_per_query = results_per_query
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.page_chars = page_chars
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.search_ttl = search_ttl
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "WebResearcher":
+        """Configure from SEARCH_URL, RESEARCH_RESULTS_PER_QUERY, RESEARCH_MAX_PAGES,
+        RESEARCH_PAGE_CHARS, RESEARCH_FETCH_CONCURRENCY, PAGE_CACHE (off disables),
+        PAGE_CACHE_DIR and PAGE_CACHE_TTL."""
+        cache = None
+        if os.environ.get("PAGE_CACHE", "on") != "off":
+            cache = PageCache(
+                os.environ.get("PAGE_CACHE_DIR", ".cache/pages"),
+                ttl=float(os.environ.get("PAGE_CACHE_TTL", "86400")),
+            )
+        return cls(
+            cache=cache,
+            search_url=os.environ.get("SEARCH_URL") or None,
+            results_per_query=int(os.environ.get("RESEARCH_RESULTS_PER_QUERY", "4")),
+            max_pages=int(os.environ.get("RESEARCH_MAX_PAGES", "8")),
+            page_chars=int(os.environ.get("RESEARCH_PAGE_CHARS", "2500")),
+            concurrency=int(os.environ.get("RESEARCH_FETCH_CONCURRENCY", "8")),
+        )
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="web-research", daemon=True).start()
+                self._client = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    follow_redirects=True,
+                    limits=httpx.Limits(max_connections=self.concurrency * 2,
+                                        max_keepalive_connections=self.concurrency),
+                    headers={"User-Agent": "Mozilla/5.0 (compatible; crewai-research/1.0)"},
+                )
+            return self._loop
+
+    def research(self, queries: List[str]) -> str:
+        """Blocking entry point for agent tools: search, read and summarize sources as text."""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self.gather(queries), loop)
+        token = cancellation.current_token.get()
+        if token is None:
+            return future.result()
+        try:
+            return token.wait_for(future)
+        except cancellation.JobCancelled:
+            # Cancels the searches and page reads still running on the research loop
+            future.cancel()
+            raise
+
+    async def gather(self, queries: List[str]) -> str:
+        results = await asyncio.gather(*(self.search(query) for query in queries))
+        seen = set()
+        hits = []
+        for hit in (hit for query_hits in results for hit in query_hits):
+            if hit["url"] not in seen:
+                seen.add(hit["url"])
+                hits.append(hit)
+        hits = hits[: self.max_pages]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def read(hit):
+            async with semaphore:
+                return await self.fetch(hit["url"])
+
+        pages = await asyncio.gather(*(read(hit) for hit in hits))
+        sections = []
+        for hit, page in zip(hits, pages):
+            text = (page or {}).get("text") or hit.get("snippet", "")
+            if text:
+                title = (page or {}).get("title") or hit.get("title") or hit["url"]
+                sections.append(f"### {title.strip()}\nSource: {hit['url']}\n{text}")
+        if not sections:
+            return "No results found."
+        return "\n\n".join(sections)
+
+    async def search(self, query: str) -> List[Dict[str, str]]:
+        key = f"search:{self.search_url or 'ddg'}:{query}"
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None and self.cache.fresh(cached, self.search_ttl):
+            return cached["results"]
+        try:
+            if self.search_url:
+                response = await self._client.get(self.search_url, params={"q": query, "format": "json"})
+                response.raise_for_status()
+                results = [
+                    {"url": r["url"], "title": r.get("title", ""), "snippet": r.get("content", "")}
+                    for r in response.json().get("results", [])
+                ]
+            elif DDGS is not None:
+                raw = await asyncio.to_thread(lambda: list(DDGS().text(query, max_results=self.results_per_query)))
+                results = [{"url": r["href"], "title": r.get("title", ""), "snippet": r.get("body", "")} for r in raw]
+            else:
+                raise RuntimeError("no search backend (install duckduckgo-search or set SEARCH_URL)")
+        except Exception as e:
+            logger.warning("Search for '%s' failed: %s", query, e)
+            return cached["results"] if cached is not None else []
+        results = results[: self.results_per_query]
+        if self.cache is not None:
+            self.cache.put(key, {"results": results})
+        return results
+
+    async def fetch(self, url: str) -> Optional[Dict[str, Any]]:
+        """Main text of a page, from the cache when fresh or confirmed unchanged."""
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and self.cache.fresh(cached):
+            crew_metrics.RESEARCH_FETCHES.inc(result="cache_hit")
+            return cached
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            async with self._client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached is not None:
+                    crew_metrics.RESEARCH_FETCHES.inc(result="revalidated")
+                    self.cache.put(url, cached)
+                    return cached
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "")
+                if "html" not in content_type and "text" not in content_type:
+                    crew_metrics.RESEARCH_FETCHES.inc(result="skipped")
+                    return None
+                extractor = MainTextExtractor(self.page_chars)
+                received = 0
+                async for chunk in response.aiter_text():
+                    extractor.feed(chunk)
+                    received += len(chunk)
+                    # Stop downloading once there is enough text (or the page is huge)
+                    if extractor.done or received >= self.max_bytes:
+                        break
+                page = {
+                    "title": extractor.title.strip(),
+                    "text": extractor.text(),
+                    "etag": response.headers.get("etag"),
+                    "last_modified": response.headers.get("last-modified"),
+                }
+        except Exception as e:
+            crew_metrics.RESEARCH_FETCHES.inc(result="error")
+            logger.warning("Fetching %s failed: %s", url, e)
+            # A stale page beats no page
+            return cached
+        crew_metrics.RESEARCH_FETCHES.inc(result="fetched")
+        if self.cache is not None:
+            self.cache.put(url, page)
+        return page
+
+
+_researcher: Optional[WebResearcher] = None
+_tools: Optional[List[Any]] = None
+_tools_lock = threading.Lock()
+
+
+def get_researcher() -> WebResearcher:
+    """Process-wide researcher (and its connection pool), configured from the environment."""
+    global _researcher
+    with _tools_lock:
+        if _researcher is None:
+            _researcher = WebResearcher.from_env()
+        return _researcher
+
+
+def split_queries(query: str) -> List[str]:
+    return [q.strip() for q in re.split(r"[\n;]+", query or "") if q.strip()][:8]
+
+
+def research_tools_enabled() -> bool:
+    return os.environ.get("RESEARCH_TOOLS", "on") != "off"
+
+
+def create_research_tools() -> List[Any]:
+    """Tools for the research agent; empty when disabled or crewai's tool base is unavailable."""
+    global _tools
+    if not research_tools_enabled():
+        return []
+    if _tools is not None:
+        return _tools
+    try:
+        from crewai.tools import BaseTool
+    except ImportError:
+        try:
+            from crewai_tools import BaseTool
+        except ImportError:
+            logger.warning("No crewai tool base class available; research agent runs without web tools")
+            _tools = []
+            return _tools
+
+    class WebResearchTool(BaseTool):
+        name: str = "Web research"
+        description: str = (
+            "Search the web and read the top result pages. Input: one or more search "
+            "queries separated by ';'. Returns the main text of each page with its source URL."
+        )
+
+        def _run(self, query: str) -> str:
+            queries = split_queries(query)
+            if not queries:
+                return "Provide at least one search query."
+            return get_researcher().research(queries)
+
+    _tools = [WebResearchTool()]
+    return _tools
@@ -3,7 +3,15 @@
 # Start the backend
 cd backend
 pip install -r requirements.txt
-uvicorn app.main:app --host 161.35.192.142 --port 8000 --reload &
+# BACKEND_WORKERS > 1 runs several processes that share broadcasts through the socket broker.
+# Jobs stay per worker, so job control (/jobs, cancel, dedupe) needs a single worker.
+BACKEND_WORKERS=${BACKEND_WORKERS:-1}
+if [ "$BACKEND_WORKERS" -gt 1 ]; then
+  echo "BACKEND_WORKERS=$BACKEND_WORKERS: job endpoints only see the jobs of the worker that serves them"
+  BROKER=socket uvicorn app.main:app --host 161.35.192.142 --port 8000 --workers "$BACKEND_WORKERS" &
+else
+  uvicorn app.main:app --host 161.35.192.142 --port 8000 --reload &
+fi
 
 # Start the frontend
 cd ../frontend
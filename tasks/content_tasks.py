@@ -1,5 +1,66 @@
+import os
 from textwrap import dedent
+from typing import Optional
 from crewai import Task
+from checkpoints import output_text
+from context_budget import ContextBudget
+
+# Seconds one task of each kind may run before it is cancelled (0 = no limit).
+# Keys are the monitor's task types; TASK_DEADLINE_<TYPE> overrides one of them.
+# A parallel research subtask or a single section counts as one task.
+TASK_DEADLINES = {
+    "Researching": 600,
+    "Writing": 600,
+    "Editing": 600,
+    "Processing": 600,
+}
+
+# Seconds a whole job may run, queue time excluded (JOB_DEADLINE overrides; 0 = no limit)
+JOB_DEADLINE = 1800
+
+def task_deadline(task_type: str) -> float:
+    """Deadline in seconds for one task of ``task_type``."""
+    default = TASK_DEADLINES.get(task_type, TASK_DEADLINES["Processing"])
+    return float(os.environ.get(f"TASK_DEADLINE_{task_type.upper()}", str(default)))
+
+def job_deadline() -> float:
+    return float(os.environ.get("JOB_DEADLINE", str(JOB_DEADLINE)))
+
+def budget_context(text: str, stage: str) -> str:
+    """Fit the context handed to ``stage`` into its token budget (CONTEXT_BUDGET_*)."""
+    budget = ContextBudget.from_env()
+    return budget.apply(stage, text) if budget is not None else text
+
+def attach_context_budget(task, next_stage: str):
+    """Budget a task's output before the crew hands it to ``next_stage`` as context.
+
+    Attach before any checkpoint callback, so checkpoints keep the full output.
+    """
+    previous_callback = getattr(task, "callback", None)
+
+    def apply_budget(output):
+        if previous_callback is not None:
+            previous_callback(output)
+        text = output_text(output)
+        budgeted = budget_context(text, next_stage)
+        if budgeted is not text:
+            # The crew builds the next task's context from the stored output
+            for attr in ("raw", "raw_output"):
+                if isinstance(getattr(output, attr, None), str):
+                    setattr(output, attr, budgeted)
+
+    task.callback = apply_budget
+
+def with_previous_output(description: str, previous_output: Optional[str],
+                         stage: Optional[str] = None) -> str:
+    """Embed a checkpointed output from the previous stage into a task description."""
+    if not previous_output:
+        return description
+    if stage is not None:
+        previous_output = budget_context(previous_output, stage)
+    return description + dedent("""
+        Output of the previous stage:
+        """) + previous_output
 
 def create_research_task(agent, topic: str) -> Task:
     return Task(
@@ -11,6 +72,8 @@ def create_research_task(agent, topic: str) -> Task:
             3. Potential impact and implications
             4. Challenges and considerations
             
+            When a web research tool is available, search for several angles at once
+            and cite the sources you rely on.
             Provide a comprehensive research summary with key points and statistics.
         """),
         expected_output=f"[Research Summary] Comprehensive analysis of {topic}, including current state, trends, impacts, and challenges.",
@@ -18,9 +81,44 @@ def create_research_task(agent, topic: str) -> Task:
         async_execution=False  # Run synchronously to maintain order
     )
 
-def create_writing_task(agent) -> Task:
+# Independent research questions used by the parallel research mode
+RESEARCH_FOCUS_AREAS = [
+    "Current applications and state of the art",
+    "Emerging trends and technologies",
+    "Potential impact and implications",
+    "Challenges and considerations",
+]
+
+def create_research_subtask(agent, topic: str, focus: str) -> Task:
     return Task(
-        description=dedent("""
+        description=dedent(f"""
+            Research the topic '{topic}'
+            Focus only on: {focus}
+            
+            Provide concise findings with key points and statistics.
+        """),
+        expected_output=f"[Research Findings] {focus} for {topic}.",
+        agent=agent,
+        async_execution=False
+    )
+
+def create_research_merge_task(agent, topic: str, findings: str) -> Task:
+    return Task(
+        description=dedent(f"""
+            Combine the research findings below on the topic '{topic}' into one
+            comprehensive research summary. Remove overlap, keep key points and
+            statistics, and keep one section per focus area.
+            
+            Findings:
+            """) + findings,
+        expected_output=f"[Research Summary] Comprehensive analysis of {topic}, including current state, trends, impacts, and challenges.",
+        agent=agent,
+        async_execution=False
+    )
+
+def create_writing_task(agent, previous_output: Optional[str] = None) -> Task:
+    return Task(
+        description=with_previous_output(dedent("""
             Using the research provided, create a compelling blog post.
             The post should:
             1. Have an engaging introduction
@@ -29,15 +127,15 @@ def create_writing_task(agent) -> Task:
             4. Be approximately 1000 words
             
             Focus on making complex information accessible to a general audience.
-        """),
+        """), previous_output, "writing"),
         expected_output="[Blog Post Draft] A well-structured, engaging blog post based on the research findings.",
         agent=agent,
         async_execution=False  # Run synchronously to maintain order
     )
 
-def create_editing_task(agent) -> Task:
+def create_editing_task(agent, previous_output: Optional[str] = None) -> Task:
     return Task(
-        description=dedent("""
+        description=with_previous_output(dedent("""
             Review and optimize the blog post. Focus on:
             1. Grammar and clarity
             2. Content structure and flow
@@ -46,8 +144,91 @@ def create_editing_task(agent) -> Task:
             
             Provide the final, polished version of the blog post with any necessary
             improvements.
-        """),
+        """), previous_output, "editing"),
         expected_output="[Final Post] A polished, SEO-optimized blog post with improved clarity and engagement.",
         agent=agent,
         async_execution=False  # Run synchronously to maintain order
-    ) 
\ No newline at end of file
+    )
+
+
+# Target length of the whole post; the pipelined mode splits it across sections
+POST_WORDS = 1000
+
+
+def create_outline_task(agent, research: str) -> Task:
+    return Task(
+        description=dedent("""
+            Using the research provided, plan a compelling blog post of about
+            1000 words. Output only the outline: 4 to 6 section headings, one per
+            line, each starting with '## '. The first section is the introduction
+            and the last one the conclusion.
+            
+            Research:
+            """) + research,
+        expected_output="[Outline] Markdown section headings for the blog post, one per line.",
+        agent=agent,
+        async_execution=False
+    )
+
+
+def create_section_writing_task(agent, research: str, outline: str, heading: str,
+                                previous_section: Optional[str] = None, words: int = 200) -> Task:
+    continuity = ""
+    if previous_section:
+        continuity = dedent("""
+            The section before this one ends with:
+            """) + previous_section[-600:]
+    return Task(
+        description=dedent(f"""
+            You are writing one section of a blog post, following the outline below.
+            Write only the section '{heading}', about {words} words, starting with
+            the heading line '## {heading}'. Cover the relevant key points from the
+            research with examples and statistics, and make complex information
+            accessible to a general audience.
+            
+            Outline:
+            """) + outline + continuity + dedent("""
+            
+            Research:
+            """) + research,
+        expected_output=f"[Blog Post Section] The '{heading}' section of the blog post.",
+        agent=agent,
+        async_execution=False
+    )
+
+
+def create_section_editing_task(agent, section: str) -> Task:
+    return Task(
+        description=dedent("""
+            Review and optimize this section of a blog post. Focus on:
+            1. Grammar and clarity
+            2. Structure and flow within the section
+            3. SEO optimization
+            4. Engagement factors
+            
+            Keep the heading line. Provide only the final, polished section.
+            
+            Section:
+            """) + section,
+        expected_output="[Edited Section] The polished section, starting with its heading.",
+        agent=agent,
+        async_execution=False
+    )
+
+
+def create_stitching_task(agent, post: str) -> Task:
+    return Task(
+        description=dedent("""
+            The sections of the blog post below were edited separately. Check the
+            flow between consecutive sections. Do not rewrite the post. For each
+            section whose opening reads abruptly after the previous one, give a
+            replacement for its first sentence on its own line as
+            '<section number>: <new first sentence>' (sections are numbered from 1).
+            Answer NONE if the transitions already read well.
+            
+            Post:
+            """) + post,
+        expected_output="[Transitions] Lines of '<section number>: <sentence>', or NONE.",
+        agent=agent,
+        async_execution=False
+    )
@@ -0,0 +1,143 @@
+"""Low-overhead logging and an in-memory ring of recent debug events.
+
+Logging: ``configure_logging`` puts one ``QueueHandler`` on the root logger.
+A log call on the agent's hot path then only enqueues the record. Unlike the
+stdlib handler, records are not formatted before they are queued. A
+background ``QueueListener`` formats them and does the I/O.
+
+Debug events: ``debug(event, **fields)`` appends the event and a reference
+to its fields to a bounded ring buffer, and nothing is formatted. The fields
+are only rendered when the ring is read: through ``recent`` (the backend's
+``GET /debug/events``) or through ``dump``, which logs a failed job's recent
+events. With LOG_LEVEL=DEBUG each event is also logged as it happens. That
+output is pretty-printed on the listener thread, not by the caller.
+"""
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("telemetry")
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+class _Lazy:
+    """Defers building a log argument until a handler formats the record."""
+
+    def __init__(self, build: Callable[[], str]):
+        self._build = build
+
+    def __str__(self):
+        return self._build()
+
+
+def _pretty(value: Any) -> str:
+    return json.dumps(value, indent=2, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    Records cross threads only, so there is no need to pre-render them for
+    pickling. Log arguments must not be mutated after the call.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class DebugRing:
+    """Bounded buffer of recent debug events; appending is one deque append."""
+
+    def __init__(self, size: int = 2000):
+        self.size = size
+        self._events: deque = deque(maxlen=size)
+        self._seq = itertools.count(1)
+
+    def append(self, event: str, fields: Dict[str, Any]):
+        self._events.append((next(self._seq), time.time(), threading.current_thread().name, event, fields))
+
+    def recent(self, limit: Optional[int] = None, job_id: Optional[str] = None,
+               after: int = 0) -> List[Dict[str, Any]]:
+        """Events newer than sequence number ``after``, oldest first, rendered to plain dicts."""
+        events = [
+            entry for entry in self._events.copy()
+            if entry[0] > after and (job_id is None or entry[4].get("job_id") == job_id)
+        ]
+        if limit is not None:
+            events = events[-limit:]
+        return [
+            {
+                "seq": seq,
+                "timestamp": datetime.fromtimestamp(created).isoformat(),
+                "thread": thread,
+                "event": event,
+                # Render now, so the caller gets a stable copy of fields that may still be shared
+                **json.loads(json.dumps(fields, default=str)),
+            }
+            for seq, created, thread, event, fields in events
+        ]
+
+    def clear(self):
+        self._events.clear()
+
+
+ring = DebugRing(int(os.environ.get("TELEMETRY_RING_SIZE", "2000")))
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+def debug(event: str, **fields: Any):
+    """Record a debug event. Pass ``job_id`` so it can be found per job.
+    ``fields`` are kept by reference and must not be mutated afterwards."""
+    ring.append(event, fields)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s %s", event, _Lazy(lambda: _pretty(fields)))
+
+
+def recent(limit: Optional[int] = None, job_id: Optional[str] = None, after: int = 0) -> List[Dict[str, Any]]:
+    return ring.recent(limit, job_id, after)
+
+
+def dump(reason: str, job_id: Optional[str] = None, limit: int = 200):
+    """Log the recent debug events (of one job) at ERROR; used when a run fails."""
+    events = ring.recent(limit, job_id)
+    if events:
+        logger.error("Recent debug events for job %s (%s):\n%s", job_id, reason, _Lazy(lambda: _pretty(events)))
+
+
+def configure_logging(level: Optional[str] = None):
+    """Set up root logging once per process (replaces ``logging.basicConfig``).
+
+    LOG_LEVEL sets the level (INFO by default). LOG_QUEUE=off writes records
+    synchronously from the calling thread, for debugging the logging itself.
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(level or os.environ.get("LOG_LEVEL", "INFO").upper())
+    with _configure_lock:
+        if _listener is not None:
+            return
+        handlers = root.handlers[:]
+        if not handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers = [handler]
+        if os.environ.get("LOG_QUEUE", "on") == "off":
+            root.handlers = handlers
+            return
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        root.handlers = [DeferredQueueHandler(records)]
+        atexit.register(_listener.stop)
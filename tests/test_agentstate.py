@@ -0,0 +1,69 @@
+"""Agent state machine of the backend (backend/app/agentstate.py)."""
+from datetime import datetime
+
+import pytest
+
+from app.agentstate import ACTIVE, CANCELLED, DONE, ERROR, AgentStateStore
+
+
+def status(agent, task, job_id="job-1", **fields):
+    return {"type": "status", "agent": agent, "task": task, "status": task, "job_id": job_id,
+            "timestamp": datetime.now().isoformat(), "output": f"{agent} {task}", **fields}
+
+
+@pytest.fixture
+def running():
+    store = AgentStateStore()
+    store.apply(status("System", "Starting"))
+    store.apply(status("Research Agent", "Researching"))
+    store.apply(status("Research Agent", "Done"))
+    store.apply(status("Writer Agent", "Writing"))
+    return store
+
+
+def job(store):
+    return store.snapshot()["jobs"][-1]
+
+
+@pytest.mark.parametrize("spelling", ["Error", "error"])
+def test_backend_error_broadcast_fails_the_job(running, spelling):
+    # What run_crewai_task broadcasts when the crew fails outside the monitored run
+    assert running.apply({
+        "timestamp": datetime.now().isoformat(),
+        "agent": "System",
+        "task": "Error",
+        "output": "Error in content creation: no model",
+        "type": "status",
+        "status": spelling,
+        "job_id": "job-1"
+    })
+
+    state = job(running)
+    assert state["status"] == ERROR
+    assert state["agents"]["Writer Agent"]["status"] == ERROR
+    assert state["agents"]["Research Agent"]["status"] == DONE
+
+
+@pytest.mark.parametrize("spelling", ["Cancelled", "cancelled"])
+def test_cancel_broadcast_cancels_active_agents(running, spelling):
+    assert running.apply(status("System", "Cancelled", status=spelling))
+
+    state = job(running)
+    assert state["status"] == CANCELLED
+    assert state["agents"]["Writer Agent"]["status"] == CANCELLED
+
+
+def test_completed_maps_to_done(running):
+    running.apply(status("Writer Agent", "Completed"))
+    running.apply(status("System", "Completed"))
+
+    state = job(running)
+    assert state["status"] == DONE
+    assert state["agents"]["Writer Agent"]["status"] == DONE
+    assert state["agents"]["Writer Agent"]["activity"] is None
+
+
+def test_active_agent_keeps_its_activity(running):
+    writer = job(running)["agents"]["Writer Agent"]
+    assert writer["status"] == ACTIVE
+    assert writer["activity"] == "Writing"
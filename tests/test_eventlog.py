@@ -0,0 +1,83 @@
+"""Event log of the backend (backend/app/eventlog.py)."""
+import threading
+import time
+
+import pytest
+
+from app.eventlog import EventLog
+
+
+@pytest.fixture
+def log(tmp_path):
+    event_log = EventLog(str(tmp_path / "events"), ring_size=5, segment_bytes=256, max_jobs=3)
+    yield event_log
+    event_log.close()
+
+
+def test_reads_history_older_than_the_ring_from_disk(log):
+    for i in range(50):
+        log.append({"job_id": "job-1", "n": i})
+
+    events = log.read(0, "job-1")
+
+    assert [e["n"] for e in events] == list(range(50))
+    assert [e["offset"] for e in events] == list(range(1, 51))
+
+
+def test_merges_jobs_in_offset_order(log):
+    for i in range(30):
+        log.append({"job_id": f"job-{i % 2}", "n": i})
+
+    assert [e["n"] for e in log.read(20)] == list(range(20, 30))
+    assert [e["n"] for e in log.read(0, limit=4)] == [0, 1, 2, 3]
+
+
+def test_history_survives_a_restart(tmp_path, log):
+    for i in range(20):
+        log.append({"job_id": "job-1", "n": i})
+    log.close()
+
+    reopened = EventLog(str(tmp_path / "events"), ring_size=5)
+    try:
+        assert reopened.offset == 20
+        assert len(reopened.read(0, "job-1")) == 20
+        assert reopened.append({"job_id": "job-1"})["offset"] == 21
+    finally:
+        reopened.close()
+
+
+def test_disk_reads_do_not_block_appends(log):
+    for i in range(50):
+        log.append({"job_id": "job-1", "n": i})
+    release = threading.Event()
+    sync = log.writer.sync
+
+    def slow_sync(timeout=None):
+        release.wait(5)
+        sync(timeout)
+
+    log.writer.sync = slow_sync
+    result = []
+    reader = threading.Thread(target=lambda: result.append(log.read(0, "job-1")))
+    reader.start()
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    log.append({"job_id": "job-1", "n": 50})
+    assert time.monotonic() - started < 1
+    release.set()
+    reader.join(5)
+
+    assert [e["n"] for e in result[0]][:50] == list(range(50))
+
+
+def test_recreating_an_evicted_job_starts_afresh(log):
+    for i in range(20):
+        log.append({"job_id": "job-0", "n": i})
+    for job in ("job-1", "job-2", "job-3"):
+        log.append({"job_id": job})
+    assert "job-0" not in log.jobs()
+
+    log.append({"job_id": "job-0", "n": "again"})
+
+    assert [e["n"] for e in log.read(0, "job-0")] == ["again"]
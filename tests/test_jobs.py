@@ -0,0 +1,63 @@
+"""Job scheduler of the backend (backend/app/jobs.py)."""
+import asyncio
+
+from app.jobs import CANCELLED, COMPLETED, FAILED, RUNNING, JobScheduler
+
+
+def run_job(handler, cancel_reason=None):
+    """Run one job through a scheduler; cancel it while it runs if ``cancel_reason`` is given."""
+    async def scenario():
+        started = asyncio.Event()
+
+        async def wrapped(job, executor):
+            started.set()
+            return await handler(job, executor)
+
+        scheduler = JobScheduler(wrapped, workers=1)
+        scheduler.start()
+        try:
+            job = scheduler.submit("topic")
+            await started.wait()
+            assert job.state == RUNNING
+            if cancel_reason is not None:
+                scheduler.cancel(job.id, cancel_reason)
+            await scheduler._queue.join()
+            return job
+        finally:
+            await scheduler.stop()
+
+    return asyncio.run(scenario())
+
+
+async def finish(job, executor):
+    await asyncio.sleep(0.05)
+    return "post"
+
+
+async def fail(job, executor):
+    await asyncio.sleep(0.05)
+    raise RuntimeError("boom")
+
+
+def test_job_completes():
+    job = run_job(finish)
+    assert job.state == COMPLETED
+    assert job.result == "post"
+
+
+def test_job_fails():
+    job = run_job(fail)
+    assert job.state == FAILED
+    assert job.error == "boom"
+
+
+def test_cancelled_job_that_finishes_anyway_ends_cancelled():
+    # A process worker cannot be interrupted, so its handler returns normally
+    job = run_job(finish, "Cancelled by request")
+    assert job.state == CANCELLED
+    assert job.error == "Cancelled by request"
+
+
+def test_cancelled_job_that_gives_up_ends_cancelled():
+    job = run_job(fail, "Cancelled by request")
+    assert job.state == CANCELLED
@@ -0,0 +1,108 @@
+"""Offline tests of the web research tool against benchmarks/web_fixture_server.py."""
+import asyncio
+import time
+
+import pytest
+
+from research_tools import MainTextExtractor, PageCache, WebResearcher
+from web_fixture_server import WebFixtureServer
+
+
+@pytest.fixture
+def fixture_server():
+    server = WebFixtureServer(latency=0.3).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PageCache(str(tmp_path / "pages"), ttl=60)
+
+
+def fetch(researcher: WebResearcher, url: str):
+    loop = researcher._ensure_loop()
+    return asyncio.run_coroutine_threadsafe(researcher.fetch(url), loop).result()
+
+
+def test_searches_and_fetches_concurrently(fixture_server, cache):
+    researcher = WebResearcher(cache=cache, search_url=fixture_server.search_url,
+                               results_per_query=5, max_pages=8, concurrency=8)
+
+    started = time.monotonic()
+    text = researcher.research(["solar power", "wind power", "battery storage"])
+    elapsed = time.monotonic() - started
+
+    pages = fixture_server.stats["pages"]
+    assert fixture_server.stats["searches"] == 3
+    assert pages >= 5
+    assert text.count("Source: ") == pages
+    # One page takes 0.3s; fetched one after another they would take pages * 0.3s
+    assert elapsed < 2 * fixture_server.latency + 0.5 < pages * fixture_server.latency
+
+
+def test_extracts_main_text_while_streaming(fixture_server, cache):
+    researcher = WebResearcher(cache=cache, search_url=fixture_server.search_url, page_chars=300)
+
+    page = fetch(researcher, f"{fixture_server.base_url}/page/1")
+
+    assert page["title"] == "Report 1"
+    assert page["text"].startswith("Report 1\nRecent studies on subject 1")
+    assert len(page["text"]) <= 300
+    for boilerplate in ("Home", "Site header", "Copyright", "tracking"):
+        assert boilerplate not in page["text"]
+
+
+def test_extractor_is_done_before_the_end_of_the_page():
+    html = WebFixtureServer(paragraphs=40).page(2)
+    extractor = MainTextExtractor(max_chars=500)
+    consumed = 0
+    for offset in range(0, len(html), 64):
+        extractor.feed(html[offset:offset + 64])
+        consumed = offset + 64
+        if extractor.done:
+            break
+
+    assert extractor.done
+    assert consumed < len(html) // 2
+    assert len(extractor.text()) == 500
+
+
+def test_serves_fresh_pages_from_the_cache(fixture_server, cache):
+    researcher = WebResearcher(cache=cache, search_url=fixture_server.search_url)
+    url = f"{fixture_server.base_url}/page/3"
+
+    first = fetch(researcher, url)
+    second = fetch(researcher, url)
+
+    assert second == {**first, "fetched_at": second["fetched_at"]}
+    assert fixture_server.stats["pages"] == 1
+    assert fixture_server.stats["not_modified"] == 0
+
+
+def test_revalidates_expired_pages_with_304(fixture_server, cache):
+    researcher = WebResearcher(cache=cache, search_url=fixture_server.search_url)
+    url = f"{fixture_server.base_url}/page/4"
+    first = fetch(researcher, url)
+    stored = cache.get(url)
+    assert stored["etag"]
+
+    # Past the TTL the page is revalidated instead of being served or downloaded again
+    cache.ttl = 0
+    time.sleep(0.01)
+    revalidated = fetch(researcher, url)
+
+    assert fixture_server.stats["pages"] == 1
+    assert fixture_server.stats["not_modified"] == 1
+    assert revalidated["text"] == first["text"]
+    # A 304 renews the entry
+    assert cache.get(url)["fetched_at"] > stored["fetched_at"]
+
+
+def test_search_results_are_cached(fixture_server, cache):
+    researcher = WebResearcher(cache=cache, search_url=fixture_server.search_url, max_pages=0)
+
+    researcher.research(["solar power"])
+    researcher.research(["solar power"])
+
+    assert fixture_server.stats["searches"] == 1
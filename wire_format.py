@@ -0,0 +1,183 @@
+"""Wire formats for monitor and dashboard WebSocket traffic.
+
+Plain JSON (one message per frame, or a ``{"type": "batch"}`` wrapper) stays
+the default and the fallback. Clients can negotiate a compact encoding with
+the WebSocket subprotocol header instead:
+
+- ``crew-compact-json.v1``: text frames, works in any browser without a library
+- ``crew-msgpack.v1``: binary MessagePack frames (needs the ``msgpack`` package)
+
+Both compact encodings share one schema. A frame is ``[definitions, items]``.
+Status and delta messages become positional arrays. Agent, task and job id
+strings are interned per connection, and sent once as ``[id, string]``
+definitions in the frame that first uses them. ISO timestamps become epoch
+microseconds. ``agent_state`` is dropped when it only repeats agent and task,
+and rebuilt on decode. Any other message type is carried as-is.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+JSON = "json"
+COMPACT_JSON = "crew-compact-json.v1"
+MSGPACK = "crew-msgpack.v1"
+
+# Item type codes and the fields stored positionally for each
+STATUS, DELTA, OTHER = 0, 1, 2
+SCHEMAS = {
+    STATUS: ("agent", "task", "output", "timestamp", "job_id", "offset"),
+    DELTA: ("agent", "delta", "seq", "timestamp", "job_id", "offset"),
+}
+TYPE_CODES = {"status": STATUS, "delta": DELTA}
+INTERNED = {"agent", "task", "job_id"}
+
+# Strings interned per connection before new ones are sent inline
+MAX_INTERNED = 4096
+
+
+def available_formats() -> List[str]:
+    """Compact subprotocols this process can speak, most preferred first."""
+    return ([MSGPACK] if msgpack is not None else []) + [COMPACT_JSON]
+
+
+def negotiate(offered: List[str]) -> Optional[str]:
+    """Pick the first subprotocol the client offered that we support (None means JSON)."""
+    supported = available_formats()
+    for protocol in offered:
+        if protocol in supported:
+            return protocol
+    return None
+
+
+def _to_micros(timestamp: Any) -> Optional[int]:
+    if not isinstance(timestamp, str):
+        return None
+    try:
+        return round(datetime.fromisoformat(timestamp).timestamp() * 1_000_000)
+    except ValueError:
+        return None
+
+
+def _from_micros(micros: int) -> str:
+    return datetime.fromtimestamp(micros / 1_000_000).isoformat()
+
+
+class WireEncoder:
+    """Encodes outgoing messages for one connection; interning state lives here."""
+
+    def __init__(self, fmt: Optional[str] = JSON):
+        self.format = fmt or JSON
+        if self.format == MSGPACK and msgpack is None:
+            raise ValueError("The msgpack wire format needs the msgpack package")
+        self._ids: Dict[str, int] = {}
+
+    @property
+    def binary(self) -> bool:
+        return self.format == MSGPACK
+
+    def encode(self, messages: List[Dict[str, Any]]) -> Union[str, bytes]:
+        """One frame carrying all ``messages``."""
+        if self.format == JSON:
+            payload = messages[0] if len(messages) == 1 else {"type": "batch", "messages": messages}
+            return json.dumps(payload)
+        definitions: List[Any] = []
+        items = [self._encode_item(message, definitions) for message in messages]
+        if self.format == MSGPACK:
+            return msgpack.packb([definitions, items], use_bin_type=True)
+        return json.dumps([definitions, items], separators=(",", ":"), ensure_ascii=False)
+
+    def _intern(self, value: Any, definitions: List[Any]) -> Any:
+        if not isinstance(value, str):
+            return value
+        index = self._ids.get(value)
+        if index is None:
+            if len(self._ids) >= MAX_INTERNED:
+                return value
+            index = self._ids[value] = len(self._ids)
+            definitions.append([index, value])
+        return index
+
+    def _encode_item(self, message: Dict[str, Any], definitions: List[Any]) -> List[Any]:
+        code = TYPE_CODES.get(message.get("type"))
+        if code is None:
+            return [OTHER, message]
+        extras = dict(message)
+        extras.pop("type")
+        values = []
+        for field in SCHEMAS[code]:
+            value = extras.pop(field, None)
+            if field == "timestamp" and value is not None:
+                micros = _to_micros(value)
+                if micros is None:
+                    extras[field] = value
+                value = micros
+            elif field in INTERNED:
+                value = self._intern(value, definitions)
+            values.append(value)
+        # agent_state and status only repeat agent/task for monitor events
+        if "agent_state" not in extras:
+            extras["agent_state"] = None
+        elif extras["agent_state"] == {"name": message.get("agent"), "status": message.get("task"),
+                                       "role": message.get("agent")}:
+            extras.pop("agent_state")
+        if "status" in extras and extras["status"] == message.get("task"):
+            extras["status"] = True
+        return [code, *values, extras or None]
+
+
+class WireDecoder:
+    """Decodes incoming frames for one connection into a list of plain messages."""
+
+    def __init__(self, fmt: Optional[str] = JSON):
+        self.format = fmt or JSON
+        self._strings: Dict[int, str] = {}
+
+    def decode(self, data: Union[str, bytes]) -> List[Dict[str, Any]]:
+        if self.format == JSON:
+            message = json.loads(data)
+            if message.get("type") == "batch":
+                return message.get("messages", [])
+            return [message]
+        if isinstance(data, bytes):
+            frame = msgpack.unpackb(data, raw=False)
+        else:
+            frame = json.loads(data)
+        definitions, items = frame
+        for index, value in definitions:
+            self._strings[index] = value
+        return [self._decode_item(item) for item in items]
+
+    def _decode_item(self, item: List[Any]) -> Dict[str, Any]:
+        code = item[0]
+        if code == OTHER:
+            return item[1]
+        fields = SCHEMAS[code]
+        message: Dict[str, Any] = {"type": "status" if code == STATUS else "delta"}
+        for field, value in zip(fields, item[1:1 + len(fields)]):
+            if value is None:
+                continue
+            if field == "timestamp":
+                value = _from_micros(value)
+            elif field in INTERNED and isinstance(value, int):
+                value = self._strings.get(value, value)
+            message[field] = value
+        extras = item[1 + len(fields)] or {}
+        if extras.get("status") is True:
+            extras["status"] = message.get("task")
+        message.update(extras)
+        if message.get("agent_state", False) is None:
+            # The original message had no agent_state at all
+            del message["agent_state"]
+        elif code == STATUS and "agent_state" not in message and "agent" in message:
+            message["agent_state"] = {
+                "name": message["agent"], "status": message.get("task"), "role": message["agent"]
+            }
+        return message